@@ -202,4 +202,7 @@ def main():
         print("程序已退出")
 
 if __name__ == "__main__":
+    # 打包后的程序中 PDF 提取进程池的子进程需要此调用才能正确启动
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
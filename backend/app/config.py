@@ -33,7 +33,100 @@ class Settings(BaseSettings):
     
     # OpenAI默认设置
     default_model: str = "gpt-3.5-turbo"
-    
+
+    # LLM客户端连接池设置
+    llm_http2: bool = True  # 需要安装 h2，未安装时自动退回 HTTP/1.1
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 120.0  # 空闲连接保活时间（秒）
+    llm_connect_timeout: float = 10.0
+    llm_request_timeout: float = 600.0
+    llm_max_cached_clients: int = 8  # 按 (base_url, api_key) 缓存的客户端数量上限
+    llm_models_cache_ttl: int = 300  # 模型列表缓存时间（秒）
+
+    # LLM上游自适应并发（AIMD）与重试设置
+    llm_limiter_initial: int = 4  # 初始并发窗口
+    llm_limiter_min: int = 1
+    llm_limiter_max: int = 32
+    llm_limiter_slow_ttft: float = 30.0  # 首 token 超过该秒数视为不健康，不再扩大窗口
+    llm_limiter_ttft_degradation: float = 3.0  # 首 token 延迟超过历史均值的倍数视为不健康
+    llm_limiter_decrease_cooldown: float = 2.0  # 两次窗口减半之间的最短间隔（秒）
+    llm_max_retries: int = 2  # 首 token 前遇到 429/5xx/超时时的重试次数
+    llm_retry_backoff: float = 1.0  # 无 Retry-After 时的基础退避时间（秒），按指数增长
+    llm_max_retry_after: float = 60.0  # Retry-After 的最长等待时间（秒）
+
+    # 按模型的 RPM/TPM 预算（可在用户配置 model_limits 中按模型覆盖，0 表示不限制）
+    llm_default_rpm: int = 0
+    llm_default_tpm: int = 0
+    llm_budget_completion_reserve: int = 1024  # 调度前为输出预留的 token 数，完成后按实际用量结算
+    llm_stream_include_usage: bool = True  # 流式请求携带 stream_options.include_usage 以获取实际用量
+
+    # 多端点池设置
+    llm_endpoint_eject_failures: int = 2  # 端点连续失败多少次后摘除
+    llm_endpoint_eject_cooldown: float = 30.0  # 首次摘除的冷却时间（秒），再次摘除时翻倍
+    llm_endpoint_max_eject: float = 300.0  # 摘除冷却时间上限（秒）
+    llm_endpoint_latency_alpha: float = 0.3  # 首 token 延迟 EWMA 的平滑系数
+
+    # 对冲请求设置（用于提纲扇出等并行调用）
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 0.9  # 超过该分位数的首 token 延迟/总耗时时发起对冲
+    llm_hedge_min_samples: int = 5  # 调用点样本数不足时不对冲
+    llm_hedge_window: int = 100  # 计算分位数的最近样本数
+    llm_hedge_budget_ratio: float = 0.1  # 对冲副本数占请求数的上限
+    llm_hedge_check_interval: float = 0.5  # 检查对冲条件的间隔（秒）
+
+    # 招标文件分块分析（map-reduce）设置
+    analysis_chunk_context_ratio: float = 0.5  # 每个分块占模型上下文长度的比例（其余留给提示词与输出）
+    analysis_max_chunk_tokens: int = 48000  # 分块上限，过大的分块首 token 延迟过长
+    analysis_min_chunk_tokens: int = 2000
+    analysis_map_concurrency: int = 4  # 分块并发分析数
+
+    # 离线批量生成设置
+    batch_poll_interval: float = 60.0  # Batch API 状态轮询间隔（秒）
+    content_job_poll_interval: float = 1.0  # 订阅不在本进程运行的内容生成任务时轮询数据库的间隔（秒）
+    content_job_lease_seconds: float = 60.0  # 内容生成任务的租约时长（秒），运行期间每 1/3 时长续约一次，过期后其他进程可接管
+
+    # PDF 提取：按页分片在进程池中并行执行版面分析
+    pdf_extract_workers: int = 0  # 进程池大小，0 表示按 CPU 核数（最多 4 个），1 表示不使用进程池
+    pdf_extract_shard_pages: int = 20  # 每个分片的页数
+
+    # 文档图片上传
+    image_upload_url: str = "https://mt.agnet.top/image/upload"
+    image_upload_timeout: float = 30  # 单张图片上传超时（秒）
+    image_upload_concurrency: int = 8  # 同时上传的图片数（共享连接池的连接上限）
+    image_upload_cache_enabled: bool = True  # 按图片内容哈希持久化缓存上传后的URL，相同图片不重复上传
+
+    # JSON 输出设置
+    llm_json_repair: bool = True  # 校验失败时先在本地修复，修复成功则不再重试
+    llm_strict_json_schema: bool = False  # 根据模板自动生成 strict json_schema（需模型服务商支持）
+
+    # LLM 录制/回放：record 时把上游调用写入录制文件，replay 时从录制文件回放、不访问上游
+    llm_cassette_mode: str = ""  # 空字符串（关闭）/ record / replay
+    llm_cassette_path: str = ""  # 录制文件路径，默认为配置目录下的 cassettes/llm_cassette.jsonl
+    llm_cassette_replay_speed: float = 0.0  # 回放速度：0 尽快回放，1 按录制时的节奏
+
+    # 相同请求合并：进行中的相同请求共享同一个上游流
+    llm_singleflight_enabled: bool = True
+
+    # LLM补全缓存设置（仅对显式开启缓存的调用点生效）
+    llm_cache_enabled: bool = True
+    llm_cache_ttl: int = 24 * 3600  # 缓存有效期（秒）
+    llm_cache_memory_entries: int = 256  # 内存 LRU 条目上限
+    llm_cache_disk_enabled: bool = True  # 是否启用 SQLite 磁盘层（多 worker 共享）
+    llm_cache_max_disk_entries: int = 5000
+
+    # 全量内容生成设置
+    content_generation_concurrency: int = 5  # 默认同时生成的章节数
+    content_generation_max_concurrency: int = 20  # 请求可指定的并发上限
+    chapter_stream_checkpoint_interval: int = 32  # v2 章节流协议每隔多少个 delta 发送一次校验点
+    sse_disconnect_poll_interval: float = 1.0  # SSE 客户端断开检测的轮询间隔（秒）
+
+    # 章节上下文检索：每个章节额外携带（或在项目概述超过预算时改为携带）与其相关的资料段落。
+    # 检索结果随章节变化，会缩短各章节共享的提示词前缀、降低前缀缓存命中，因此默认关闭
+    chapter_context_retrieval: bool = False
+    chapter_context_max_tokens: int = 1500  # 每个章节携带的项目资料 token 上限
+    chapter_context_passage_tokens: int = 200  # 检索段落的 token 上限
+
     class Config:
         env_file = ".env"
 
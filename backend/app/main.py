@@ -3,25 +3,51 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import fastapi.middleware.cors
 import starlette.middleware.cors
 
 from .config import settings
 from .services.duplicate_service import DuplicateService
+from .services.llm_client_registry import client_registry
+from .services.llm_batch import batch_job_manager
+from .services.content_jobs import content_job_manager
+from .services.pdf_extractor import pdf_extractor
+from .services.image_uploader import image_uploader
+from .services.openai_service import OpenAIService
 
 # 创建全局查重服务实例
 duplicate_service = DuplicateService()
 
 # 导入路由模块（在创建服务实例之后）
-from .routers import config, document, outline, content, search, expand
+from .routers import config, document, outline, content, search, expand, metrics, batch
 from .routers.duplicate import create_router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时后台预热LLM连接并恢复未完成的批量任务与内容生成任务，关闭时释放共享连接池"""
+    warm_up_task = asyncio.create_task(OpenAIService().warm_up())
+    await batch_job_manager.resume()
+    await content_job_manager.resume()
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        await batch_job_manager.aclose()
+        await content_job_manager.aclose()
+        pdf_extractor.shutdown()
+        await image_uploader.aclose()
+        await client_registry.aclose()
+
+
 # 创建FastAPI应用实例
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    description="基于FastAPI的AI写标书助手后端API"
+    description="基于FastAPI的AI写标书助手后端API",
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -40,6 +66,8 @@ app.include_router(outline.router)
 app.include_router(content.router)
 app.include_router(search.router)
 app.include_router(expand.router)
+app.include_router(metrics.router)
+app.include_router(batch.router)
 
 # 为duplicate路由提供全局服务实例
 duplicate_router = create_router(duplicate_service)
@@ -13,6 +13,48 @@ class ConfigRequest(BaseModel):
     model_name: str = Field("gpt-3.5-turbo", description="模型名称")
 
 
+class ModelLimitsRequest(BaseModel):
+    """模型限额配置请求"""
+    model_config = {"protected_namespaces": ()}
+
+    model_name: str = Field(..., description="模型名称")
+    rpm: int = Field(0, ge=0, description="每分钟请求数上限，0 表示不限制")
+    tpm: int = Field(0, ge=0, description="每分钟 token 数上限，0 表示不限制")
+    context_tokens: int = Field(0, ge=0, description="模型上下文长度，0 表示按模型名自动判断")
+    input_price: float = Field(0, ge=0, description="输入单价（元 / 百万 token），0 表示不统计费用")
+    output_price: float = Field(0, ge=0, description="输出单价（元 / 百万 token），0 表示不统计费用")
+
+
+class EndpointConfig(BaseModel):
+    """额外的 LLM 端点配置"""
+    model_config = {"protected_namespaces": ()}
+
+    name: Optional[str] = Field(None, description="端点名称，用于日志与指标")
+    api_key: str = Field(..., description="API密钥")
+    base_url: Optional[str] = Field(None, description="Base URL")
+    model_name: Optional[str] = Field(None, description="模型名称，留空时使用主配置的模型")
+    weight: float = Field(1.0, gt=0, description="路由权重，越大分到的请求越多")
+    rpm: int = Field(0, ge=0, description="该端点每分钟请求数上限，0 表示使用模型限额")
+    tpm: int = Field(0, ge=0, description="该端点每分钟 token 数上限，0 表示使用模型限额")
+
+
+class EndpointsRequest(BaseModel):
+    """额外 LLM 端点列表保存请求"""
+    endpoints: List[EndpointConfig] = Field(default_factory=list, description="端点列表")
+
+
+class ModelRouteRule(BaseModel):
+    """按调用点的模型路由规则"""
+    call_site: str = Field(..., min_length=1, description="调用点名称，支持通配符，如 outline-*、chapter、chapter-draft")
+    model: Optional[str] = Field(None, description="使用的模型，留空时使用端点自身的模型")
+    endpoint: Optional[str] = Field(None, description="限定使用的端点名称（default 为主配置），留空时在全部端点间路由")
+
+
+class ModelRoutesRequest(BaseModel):
+    """模型路由规则保存请求（按顺序匹配，第一条匹配的规则生效）"""
+    routes: List[ModelRouteRule] = Field(default_factory=list, description="路由规则列表")
+
+
 class ConfigResponse(BaseModel):
     """配置响应"""
     success: bool
@@ -40,10 +82,18 @@ class AnalysisType(str, Enum):
     REQUIREMENTS = "requirements"
 
 
+class AnalysisMode(str, Enum):
+    """文档分析模式"""
+    AUTO = "auto"
+    SINGLE = "single"
+    CHUNKED = "chunked"
+
+
 class AnalysisRequest(BaseModel):
     """文档分析请求"""
     file_content: str = Field(..., description="文档内容")
     analysis_type: AnalysisType = Field(..., description="分析类型")
+    mode: AnalysisMode = Field(AnalysisMode.AUTO, description="分析模式：auto 时超过模型上下文的文档自动分块分析")
 
 
 class OutlineItem(BaseModel):
@@ -76,6 +126,34 @@ class ContentGenerationRequest(BaseModel):
     """内容生成请求"""
     outline: Dict[str, Any] = Field(..., description="目录结构")
     project_overview: str = Field("", description="项目概述")
+    concurrency: Optional[int] = Field(None, ge=1, description="同时生成的章节数，默认使用服务端配置")
+    requirements: str = Field("", description="技术评分要求，资料较多时与项目概述一起按章节检索相关段落")
+    tender_text: str = Field("", description="招标文件原文（可选），资料较多时与项目概述一起按章节检索相关段落")
+    draft: bool = Field(False, description="草稿模式：先用 chapter-draft 路由的快速模型生成全部章节供预览，再逐章升级为正式内容")
+
+
+class ContentJobRequest(BaseModel):
+    """可恢复的全文内容生成任务请求"""
+    outline: List[OutlineItem] = Field(..., description="目录结构")
+    project_overview: str = Field("", description="项目概述")
+    requirements: str = Field("", description="技术评分要求，资料较多时与项目概述一起按章节检索相关段落")
+    tender_text: str = Field("", description="招标文件原文（可选），资料较多时与项目概述一起按章节检索相关段落")
+    concurrency: Optional[int] = Field(None, ge=1, description="同时生成的章节数，默认使用服务端配置")
+
+
+class BatchBackendType(str, Enum):
+    """批量生成后端"""
+    OPENAI = "openai"
+    LOCAL = "local"
+
+
+class BatchContentJobRequest(BaseModel):
+    """离线批量生成全文内容请求"""
+    outline: Dict[str, Any] = Field(..., description="目录结构")
+    project_overview: str = Field("", description="项目概述")
+    backend: BatchBackendType = Field(BatchBackendType.OPENAI, description="批量后端：openai 为 Batch API，local 为本地逐条执行")
+    requirements: str = Field("", description="技术评分要求，资料较多时与项目概述一起按章节检索相关段落")
+    tender_text: str = Field("", description="招标文件原文（可选），资料较多时与项目概述一起按章节检索相关段落")
 
 
 class ChapterContentRequest(BaseModel):
@@ -84,6 +162,8 @@ class ChapterContentRequest(BaseModel):
     parent_chapters: Optional[List[Dict[str, Any]]] = Field(None, description="上级章节列表")
     sibling_chapters: Optional[List[Dict[str, Any]]] = Field(None, description="同级章节列表")
     project_overview: str = Field("", description="项目概述")
+    requirements: str = Field("", description="技术评分要求，资料较多时与项目概述一起按章节检索相关段落")
+    tender_text: str = Field("", description="招标文件原文（可选），资料较多时与项目概述一起按章节检索相关段落")
 
 
 class ErrorResponse(BaseModel):
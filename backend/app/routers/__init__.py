@@ -1,15 +1,19 @@
+from .batch import router as batch_router
 from .config import router as config_router
 from .content import router as content_router
 from .document import router as document_router
 from .expand import router as expand_router
+from .metrics import router as metrics_router
 from .outline import router as outline_router
 from .search import router as search_router
 
 __all__ = [
+    "batch_router",
     "config_router",
     "content_router",
     "document_router",
     "expand_router",
+    "metrics_router",
     "outline_router",
     "search_router"
 ]
\ No newline at end of file
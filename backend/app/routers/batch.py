@@ -0,0 +1,57 @@
+"""离线批量生成相关API路由"""
+from fastapi import APIRouter, HTTPException
+from ..models.schemas import BatchContentJobRequest
+from ..services.llm_batch import batch_job_manager
+from ..utils.config_manager import config_manager
+
+router = APIRouter(prefix="/api/batch", tags=["批量生成"])
+
+
+@router.post("/content-jobs", response_model=dict)
+async def create_content_job(request: BatchContentJobRequest):
+    """创建全文内容的离线批量生成任务（后台提交并轮询，进程重启后自动恢复）"""
+    try:
+        config = config_manager.load_config()
+
+        if not config.get('api_key'):
+            raise HTTPException(status_code=400, detail="请先配置OpenAI API密钥")
+
+        job = await batch_job_manager.create_content_job(
+            outline=request.outline,
+            project_overview=request.project_overview,
+            backend=request.backend.value,
+            requirements=request.requirements,
+            tender_text=request.tender_text,
+        )
+        return await batch_job_manager.get_job(job['job_id'])
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建批量任务失败: {str(e)}")
+
+
+@router.get("/content-jobs", response_model=list)
+async def list_content_jobs():
+    """列出所有批量生成任务"""
+    return await batch_job_manager.list_jobs()
+
+
+@router.get("/content-jobs/{job_id}", response_model=dict)
+async def get_content_job(job_id: str):
+    """查询批量生成任务状态"""
+    job = await batch_job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.get("/content-jobs/{job_id}/result", response_model=dict)
+async def get_content_job_result(job_id: str):
+    """获取批量生成完成后回填了内容的目录"""
+    if await batch_job_manager.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    result = await batch_job_manager.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail="任务尚未完成")
+    return result
@@ -1,6 +1,8 @@
 """配置相关API路由"""
 from fastapi import APIRouter, HTTPException
-from ..models.schemas import ConfigRequest, ConfigResponse, ModelListResponse
+from ..models.schemas import (
+    ConfigRequest, ConfigResponse, ModelListResponse, ModelLimitsRequest, EndpointsRequest, ModelRoutesRequest,
+)
 from ..services.openai_service import OpenAIService
 from ..utils.config_manager import config_manager
 
@@ -36,6 +38,85 @@ async def load_config():
         raise HTTPException(status_code=500, detail=f"加载配置时发生错误: {str(e)}")
 
 
+@router.get("/model-limits", response_model=dict)
+async def load_model_limits():
+    """加载各模型的 RPM/TPM 限额配置"""
+    try:
+        return config_manager.load_config().get('model_limits') or {}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"加载模型限额时发生错误: {str(e)}")
+
+
+@router.post("/model-limits", response_model=ConfigResponse)
+async def save_model_limits(limits: ModelLimitsRequest):
+    """保存指定模型的 RPM/TPM 限额"""
+    try:
+        success = config_manager.save_model_limits(
+            limits.model_name, limits.rpm, limits.tpm, limits.context_tokens,
+            limits.input_price, limits.output_price,
+        )
+
+        if success:
+            return ConfigResponse(success=True, message="模型限额保存成功")
+        else:
+            return ConfigResponse(success=False, message="模型限额保存失败")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"保存模型限额时发生错误: {str(e)}")
+
+
+@router.get("/endpoints", response_model=dict)
+async def load_endpoints():
+    """加载额外的 LLM 端点配置"""
+    try:
+        return {"endpoints": config_manager.get_endpoints()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"加载端点配置时发生错误: {str(e)}")
+
+
+@router.post("/endpoints", response_model=ConfigResponse)
+async def save_endpoints(request: EndpointsRequest):
+    """保存额外的 LLM 端点配置（多个 API Key / base_url 组成端点池）"""
+    try:
+        success = config_manager.save_endpoints([
+            endpoint.model_dump(exclude_none=True) for endpoint in request.endpoints
+        ])
+
+        if success:
+            return ConfigResponse(success=True, message="端点配置保存成功")
+        else:
+            return ConfigResponse(success=False, message="端点配置保存失败")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"保存端点配置时发生错误: {str(e)}")
+
+
+@router.get("/model-routes", response_model=dict)
+async def load_model_routes():
+    """加载按调用点的模型路由规则"""
+    try:
+        return {"routes": config_manager.get_model_routes()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"加载模型路由时发生错误: {str(e)}")
+
+
+@router.post("/model-routes", response_model=ConfigResponse)
+async def save_model_routes(request: ModelRoutesRequest):
+    """保存模型路由规则（如一级提纲使用快速小模型、章节正文使用更强的模型）"""
+    try:
+        success = config_manager.save_model_routes([
+            route.model_dump(exclude_none=True) for route in request.routes
+        ])
+
+        if success:
+            return ConfigResponse(success=True, message="模型路由保存成功")
+        else:
+            return ConfigResponse(success=False, message="模型路由保存失败")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"保存模型路由时发生错误: {str(e)}")
+
+
 @router.post("/models", response_model=ModelListResponse)
 async def get_available_models(config: ConfigRequest):
     """获取可用的模型列表"""
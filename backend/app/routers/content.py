@@ -1,17 +1,23 @@
 """内容相关API路由"""
-from fastapi import APIRouter, HTTPException
-from ..models.schemas import ContentGenerationRequest, ChapterContentRequest
+from fastapi import APIRouter, HTTPException, Header, Query, Request
+from ..models.schemas import ContentGenerationRequest, ChapterContentRequest, ContentJobRequest
 from ..services.openai_service import OpenAIService
+from ..services.content_jobs import content_job_manager
 from ..utils.config_manager import config_manager
-from ..utils.sse import sse_response
+from ..config import settings
+from ..utils.sse import sse_response, DeltaStreamEncoder
 import json
+from typing import Optional
 
 router = APIRouter(prefix="/api/content", tags=["内容管理"])
 
 
 @router.post("/generate-chapter")
-async def generate_chapter_content(request: ChapterContentRequest):
-    """为单个章节生成内容"""
+async def generate_chapter_content(
+    request: ChapterContentRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """为单个章节生成内容（可通过 Idempotency-Key 请求头合并重复请求）"""
     try:
         # 加载配置
         config = config_manager.load_config()
@@ -23,24 +29,39 @@ async def generate_chapter_content(request: ChapterContentRequest):
         openai_service = OpenAIService()
         
         # 生成单章节内容
-        content = ""
+        parts = []
+        context_stats = {}
         async for chunk in openai_service._generate_chapter_content(
             chapter=request.chapter,
             parent_chapters=request.parent_chapters,
             sibling_chapters=request.sibling_chapters,
-            project_overview=request.project_overview
+            project_overview=request.project_overview,
+            idempotency_key=idempotency_key,
+            requirements=request.requirements,
+            tender_text=request.tender_text,
+            context_stats=context_stats
         ):
-            content += chunk
+            parts.append(chunk)
         
-        return {"success": True, "content": content}
+        return {"success": True, "content": "".join(parts), "context": context_stats or None}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"章节内容生成失败: {str(e)}")
 
 
 @router.post("/generate-chapter-stream")
-async def generate_chapter_content_stream(request: ChapterContentRequest):
-    """流式为单个章节生成内容"""
+async def generate_chapter_content_stream(
+    request: ChapterContentRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    protocol: int = Query(1, ge=1, le=2, description="流协议版本：1 每个事件携带累计全文，2 只发送增量"),
+):
+    """
+    流式为单个章节生成内容（进行中的相同请求会合并，后到的请求先收到已生成的部分）
+
+    protocol=1（默认）：每个 streaming 事件同时携带 content 与累计的 full_content
+    protocol=2：只发送带序号的 delta，定期发送长度与 SHA-256 校验点，结束时发送全文摘要（见 DeltaStreamEncoder）
+    """
     try:
         # 加载配置
         config = config_manager.load_config()
@@ -51,6 +72,33 @@ async def generate_chapter_content_stream(request: ChapterContentRequest):
         # 创建OpenAI服务实例
         openai_service = OpenAIService()
         
+        async def generate_v2():
+            encoder = DeltaStreamEncoder(settings.chapter_stream_checkpoint_interval)
+            context_stats = {}
+            try:
+                yield encoder.started('开始生成章节内容...')
+                async for chunk in openai_service._generate_chapter_content(
+                    chapter=request.chapter,
+                    parent_chapters=request.parent_chapters,
+                    sibling_chapters=request.sibling_chapters,
+                    project_overview=request.project_overview,
+                    idempotency_key=idempotency_key,
+                    requirements=request.requirements,
+                    tender_text=request.tender_text,
+                    context_stats=context_stats
+                ):
+                    for event in encoder.delta(chunk):
+                        yield event
+                yield encoder.completed(context=context_stats or None)
+
+            except Exception as e:
+                yield encoder.error(str(e))
+
+            yield "data: [DONE]\n\n"
+
+        if protocol == 2:
+            return sse_response(generate_v2(), request=http_request, endpoint="chapter-stream")
+
         async def generate():
             try:
                 # 发送开始信号
@@ -58,18 +106,23 @@ async def generate_chapter_content_stream(request: ChapterContentRequest):
                 
                 # 流式生成章节内容
                 full_content = ""
+                context_stats = {}
                 async for chunk in openai_service._generate_chapter_content(
                     chapter=request.chapter,
                     parent_chapters=request.parent_chapters,
                     sibling_chapters=request.sibling_chapters,
-                    project_overview=request.project_overview
+                    project_overview=request.project_overview,
+                    idempotency_key=idempotency_key,
+                    requirements=request.requirements,
+                    tender_text=request.tender_text,
+                    context_stats=context_stats
                 ):
                     full_content += chunk
                     # 实时发送内容片段
                     yield f"data: {json.dumps({'status': 'streaming', 'content': chunk, 'full_content': full_content}, ensure_ascii=False)}\n\n"
                 
                 # 发送完成信号
-                yield f"data: {json.dumps({'status': 'completed', 'content': full_content}, ensure_ascii=False)}\n\n"
+                yield f"data: {json.dumps({'status': 'completed', 'content': full_content, 'context': context_stats or None}, ensure_ascii=False)}\n\n"
                 
             except Exception as e:
                 # 发送错误信息
@@ -78,7 +131,136 @@ async def generate_chapter_content_stream(request: ChapterContentRequest):
             # 发送结束信号
             yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request, endpoint="chapter-stream")
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"章节内容生成失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"章节内容生成失败: {str(e)}")
+
+@router.post("/generate-outline-stream")
+async def generate_outline_content_stream(request: ContentGenerationRequest, http_request: Request):
+    """为整份目录并发生成全部章节内容，以SSE流式返回每个章节的进度与结果"""
+    try:
+        # 加载配置
+        config = config_manager.load_config()
+
+        if not config.get('api_key'):
+            raise HTTPException(status_code=400, detail="请先配置OpenAI API密钥")
+
+        # 创建OpenAI服务实例
+        openai_service = OpenAIService()
+
+        async def generate():
+            try:
+                async for event in openai_service.generate_content_for_outline_stream(
+                    outline=request.outline,
+                    project_overview=request.project_overview,
+                    concurrency=request.concurrency,
+                    draft=request.draft,
+                    requirements=request.requirements,
+                    tender_text=request.tender_text
+                ):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+            except Exception as e:
+                # 发送错误信息
+                yield f"data: {json.dumps({'status': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+
+            # 发送结束信号
+            yield "data: [DONE]\n\n"
+
+        return sse_response(generate(), request=http_request, endpoint="outline-content-stream")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"全文内容生成失败: {str(e)}")
+
+
+@router.post("/jobs", response_model=dict)
+async def create_content_job(request: ContentJobRequest):
+    """创建可恢复的全文内容生成任务（每个章节完成即持久化，服务重启后继续生成未完成的章节）"""
+    try:
+        config = config_manager.load_config()
+
+        if not config.get('api_key'):
+            raise HTTPException(status_code=400, detail="请先配置OpenAI API密钥")
+
+        return await content_job_manager.create_job(
+            outline={'outline': [item.model_dump(exclude_none=True) for item in request.outline]},
+            project_overview=request.project_overview,
+            requirements=request.requirements,
+            tender_text=request.tender_text,
+            concurrency=request.concurrency,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建内容生成任务失败: {str(e)}")
+
+
+@router.get("/jobs", response_model=list)
+async def list_content_jobs():
+    """列出所有内容生成任务"""
+    return await content_job_manager.list_jobs()
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_content_job(job_id: str):
+    """查询内容生成任务状态与每个章节的进度"""
+    job = await content_job_manager.get_job(job_id, include_chapters=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_content_job_events(job_id: str, http_request: Request):
+    """
+    重新订阅任务进度（SSE）：先发送 snapshot（任务状态与已完成章节的内容），
+    再发送后续的 chapter_started / chapter_completed / chapter_failed 事件，任务结束时发送 completed
+    """
+    if await content_job_manager.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def generate():
+        try:
+            async for event in content_job_manager.events(job_id):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'status': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+
+        yield "data: [DONE]\n\n"
+
+    # 客户端断开只结束订阅，任务继续在后台生成
+    return sse_response(generate(), request=http_request, endpoint="content-job-events")
+
+
+@router.get("/jobs/{job_id}/result", response_model=dict)
+async def get_content_job_result(job_id: str):
+    """获取回填了已生成内容的目录（任务未完成时只包含已完成的章节）"""
+    result = await content_job_manager.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return result
+
+
+@router.post("/jobs/{job_id}/retry", response_model=dict)
+async def retry_content_job(job_id: str):
+    """重新生成失败的章节，并继续已取消任务中未完成的章节"""
+    try:
+        job = await content_job_manager.retry(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=dict)
+async def cancel_content_job(job_id: str):
+    """取消内容生成任务（已完成的章节保留）"""
+    job = await content_job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
@@ -1,5 +1,5 @@
 """文档处理相关API路由"""
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from ..models.schemas import FileUploadResponse, AnalysisRequest, AnalysisType, WordExportRequest
 from ..services.file_service import FileService
@@ -65,7 +65,7 @@ async def upload_file(file: UploadFile = File(...)):
 
 
 @router.post("/analyze-stream")
-async def analyze_document_stream(request: AnalysisRequest):
+async def analyze_document_stream(request: AnalysisRequest, http_request: Request):
     """流式分析文档内容"""
     try:
         # 加载配置
@@ -135,21 +135,18 @@ async def analyze_document_stream(request: AnalysisRequest):
 """
             
             analysis_type_cn = "项目概述" if request.analysis_type == AnalysisType.OVERVIEW else "技术评分要求"
-            user_prompt = f"请分析以下招标文件内容，提取{analysis_type_cn}信息：\n\n{request.file_content}"
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            
-            # 流式返回分析结果
-            async for chunk in openai_service.stream_chat_completion(messages, temperature=0.3):
-                yield f"data: {json.dumps({'chunk': chunk}, ensure_ascii=False)}\n\n"
+            call_site = "analysis-overview" if request.analysis_type == AnalysisType.OVERVIEW else "analysis-requirements"
+
+            # 超长招标文件按页/表格分块并发提取后流式合并；分块进度以 status 事件返回，最终结果仍以 chunk 字段流式返回
+            async for event in openai_service.analyze_document_stream(
+                system_prompt, request.file_content, analysis_type_cn, call_site, mode=request.mode.value
+            ):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
             
             # 发送结束信号
             yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request, endpoint="analyze-stream")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文档分析失败: {str(e)}")
@@ -33,7 +33,7 @@ async def upload_file(file: UploadFile = File(...)):
             {"role": "user", "content": file_content}
         ]
         full_content = ""
-        async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}):
+        async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}, call_site="expand"):
             full_content += chunk
         return FileUploadResponse(
             success=True,
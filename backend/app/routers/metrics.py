@@ -0,0 +1,40 @@
+"""运行指标相关API路由"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..services.content_jobs import content_job_manager
+from ..services.llm_budget import budget_snapshots
+from ..services.llm_cache import completion_cache
+from ..services.llm_endpoints import endpoint_snapshots
+from ..services.llm_hedge import hedge_snapshots
+from ..services.llm_limiter import limiter_snapshots
+from ..services.llm_routing import stage_report
+from ..services.llm_singleflight import single_flight
+from ..utils.metrics import metrics
+
+router = APIRouter(prefix="/api/metrics", tags=["运行指标"])
+
+
+@router.get("", response_model=dict)
+async def get_metrics():
+    """获取LLM层运行指标"""
+    snapshot = metrics.snapshot()
+    snapshot["llm_cache"] = completion_cache.stats()
+    snapshot["llm_limiters"] = limiter_snapshots()
+    snapshot["llm_budgets"] = budget_snapshots()
+    snapshot["llm_endpoints"] = endpoint_snapshots()
+    snapshot["llm_hedges"] = hedge_snapshots()
+    snapshot["llm_singleflight"] = {"in_flight": single_flight.in_flight()}
+    snapshot["content_jobs"] = {"running": content_job_manager.active_count()}
+    return snapshot
+
+
+@router.get("/stages", response_model=dict)
+async def get_stage_metrics():
+    """按调用点与模型汇总的延迟、token 用量与费用，用于比较各阶段的模型路由效果"""
+    return {"stages": stage_report()}
+
+
+@router.get("/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """以 Prometheus 文本格式导出计数器与直方图"""
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,5 @@
 """目录相关API路由"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from ..models.schemas import OutlineRequest, OutlineResponse
 from ..services.openai_service import OpenAIService
 from ..utils.config_manager import config_manager
@@ -12,8 +12,13 @@ router = APIRouter(prefix="/api/outline", tags=["目录管理"])
 
 
 @router.post("/generate")
-async def generate_outline(request: OutlineRequest):
-    """生成标书目录结构（以SSE流式返回）"""
+async def generate_outline(request: OutlineRequest, http_request: Request):
+    """
+    生成标书目录结构（以SSE流式返回）
+
+    依次发送：一级标题列表（status=titles）、每个一级章节补全完成时的章节（status=chapter，按完成顺序，index 为章节序号）、
+    完整目录（status=completed，chunk 为目录 JSON）；等待期间每秒发送空 chunk 心跳。
+    """
     try:
         # 加载配置
         config = config_manager.load_config()
@@ -25,34 +30,45 @@ async def generate_outline(request: OutlineRequest):
         openai_service = OpenAIService()
         
         async def generate():
+            # 后台计算主任务：事件经队列转发，等待期间可以发送心跳
+            events: asyncio.Queue = asyncio.Queue()
+
+            async def compute():
+                try:
+                    async for event in openai_service.generate_outline_v2_stream(
+                        overview=request.overview,
+                        requirements=request.requirements
+                    ):
+                        await events.put(event)
+                except Exception as e:
+                    await events.put(e)
+
+            compute_task = asyncio.create_task(compute())
+            # 始终只保留一个挂起的 get()：wait_for 超时与 put 同时发生时可能丢掉刚取出的事件
+            get_task = None
             try:
-                # 后台计算主任务
-                compute_task = asyncio.create_task(openai_service.generate_outline_v2(
-                    overview=request.overview,
-                    requirements=request.requirements
-                ))
-
-                # 在等待计算完成期间发送心跳，保持连接（发送空字符串chunk）
-                while not compute_task.done():
-                    yield f"data: {json.dumps({'chunk': ''}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(1)
-
-                # 计算完成
-                result = await compute_task
-
-                # 确保为字符串
-                if isinstance(result, dict):
-                    result_str = json.dumps(result, ensure_ascii=False)
-                else:
-                    result_str = str(result)
-
-                # 分片发送实际数据
-                chunk_size = 128
-                chunk_delay = 0.1  # 每个分片之间增加一点点延迟，增强SSE逐步展示效果
-                for i in range(0, len(result_str), chunk_size):
-                    piece = result_str[i:i+chunk_size]
-                    yield f"data: {json.dumps({'chunk': piece}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(chunk_delay)
+                while True:
+                    if get_task is None:
+                        get_task = asyncio.create_task(events.get())
+                    done, _ = await asyncio.wait({get_task}, timeout=1)
+                    if not done:
+                        # 在等待期间发送心跳，保持连接（发送空字符串chunk）
+                        yield f"data: {json.dumps({'chunk': ''}, ensure_ascii=False)}\n\n"
+                        continue
+                    event = get_task.result()
+                    get_task = None
+                    if isinstance(event, Exception):
+                        raise event
+
+                    if event['status'] == 'completed':
+                        # 完整目录作为一个 chunk 立即发送（拼接全部 chunk 即得到目录 JSON，与原协议兼容）
+                        result_str = json.dumps(event['outline'], ensure_ascii=False)
+                        yield f"data: {json.dumps({'status': 'completed', 'chunk': result_str}, ensure_ascii=False)}\n\n"
+                        break
+
+                    # 一级标题列表与每个完成的一级章节（chunk 为空，只读取 chunk 的客户端不受影响）
+                    yield f"data: {json.dumps({**event, 'chunk': ''}, ensure_ascii=False)}\n\n"
+
                 # 发送结束信号
                 yield "data: [DONE]\n\n"
             except Exception as e:
@@ -65,15 +81,20 @@ async def generate_outline(request: OutlineRequest):
                 }
                 yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
                 yield "data: [DONE]\n\n"
+            finally:
+                if get_task is not None:
+                    get_task.cancel()
+                # 客户端断开时取消后台任务（连带取消一级节点的并发生成与重试）
+                compute_task.cancel()
 
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request, endpoint="outline-generate")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"目录生成失败: {str(e)}")
 
 
 @router.post("/generate-stream")
-async def generate_outline_stream(request: OutlineRequest):
+async def generate_outline_stream(request: OutlineRequest, http_request: Request):
     """流式生成标书目录结构"""
     try:
         # 加载配置
@@ -94,11 +115,11 @@ async def generate_outline_stream(request: OutlineRequest):
                 ]
                 
                 full_content = ""
-                async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}):
+                async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}, call_site="outline-stream"):
                     full_content += chunk
                 print(full_content)
                 # 流式返回目录生成结果
-                # async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}):
+                # async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}, call_site="outline-stream"):
                 #     yield f"data: {json.dumps({'chunk': chunk}, ensure_ascii=False)}\n\n"
                 
                 # 发送结束信号
@@ -113,13 +134,13 @@ async def generate_outline_stream(request: OutlineRequest):
                 ]
                 
                 # 流式返回目录生成结果
-                async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}):
+                async for chunk in openai_service.stream_chat_completion(messages, temperature=0.7, response_format={"type": "json_object"}, call_site="outline-stream"):
                     yield f"data: {json.dumps({'chunk': chunk}, ensure_ascii=False)}\n\n"
                 
                 # 发送结束信号
                 yield "data: [DONE]\n\n"
         
-        return sse_response(generate())
+        return sse_response(generate(), request=http_request, endpoint="outline-generate-stream")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"目录生成失败: {str(e)}")
@@ -0,0 +1,542 @@
+"""可恢复的全文内容生成任务：每个章节完成即写入 SQLite，服务重启后只继续生成未完成的章节"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+from .openai_service import OpenAIService
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+UNFINISHED_JOB_STATUSES = (JOB_PENDING, JOB_RUNNING)
+
+# 任务状态变化的明细日志（DEBUG 级别，默认不输出；汇总数据见 content_jobs_total 指标）
+logger = logging.getLogger(__name__)
+
+CHAPTER_PENDING = "pending"
+CHAPTER_COMPLETED = "completed"
+CHAPTER_FAILED = "failed"
+
+
+class ContentJobStore:
+    """
+    任务与章节结果的 SQLite 存储（WAL 模式，与 LLM 缓存相同的连接方式）
+
+    - content_jobs：每个任务一行，保存提交时的目录、项目资料、并发数与状态，
+      以及正在生成该任务的进程（owner）与其租约到期时间（lease_until）
+    - content_job_chapters：每个叶子章节一行（按叶子章节在目录中的顺序编号），保存状态与生成的内容
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(config_manager.config_dir, "content_jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS content_jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, outline TEXT NOT NULL, "
+                "project_overview TEXT NOT NULL, requirements TEXT NOT NULL, tender_text TEXT NOT NULL, "
+                "concurrency INTEGER, total INTEGER NOT NULL, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT, lease_until REAL)"
+            )
+            # 旧版本创建的数据库没有租约列
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(content_jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE content_jobs ADD COLUMN {column} {column_type}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS content_job_chapters ("
+                "job_id TEXT NOT NULL, leaf_index INTEGER NOT NULL, chapter_id TEXT NOT NULL, title TEXT NOT NULL, "
+                "status TEXT NOT NULL, content TEXT, error TEXT, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (job_id, leaf_index))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def create(self, job: Dict[str, Any], leaves: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT INTO content_jobs (job_id, status, outline, project_overview, requirements, tender_text, "
+                "concurrency, total, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+                (job['job_id'], JOB_PENDING, json.dumps(job['outline'], ensure_ascii=False), job['project_overview'],
+                 job['requirements'], job['tender_text'], job['concurrency'], len(leaves), now, now),
+            )
+            conn.executemany(
+                "INSERT INTO content_job_chapters (job_id, leaf_index, chapter_id, title, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job['job_id'], index, str(leaf['chapter'].get('id', 'unknown')),
+                  leaf['chapter'].get('title', '未命名章节'), CHAPTER_PENDING, now)
+                 for index, leaf in enumerate(leaves)],
+            )
+            conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._get_conn().execute("SELECT * FROM content_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['outline'] = json.loads(job['outline'])
+        return job
+
+    def list(self) -> List[str]:
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT job_id FROM content_jobs ORDER BY created_at DESC"
+            ).fetchall()
+        return [row['job_id'] for row in rows]
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._get_conn().execute(
+                f"SELECT job_id FROM content_jobs WHERE status IN ({','.join('?' * len(UNFINISHED_JOB_STATUSES))}) "
+                "ORDER BY created_at", UNFINISHED_JOB_STATUSES,
+            ).fetchall()
+        return [row['job_id'] for row in rows]
+
+    def chapters(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT leaf_index, chapter_id, title, status, content, error, updated_at "
+                "FROM content_job_chapters WHERE job_id = ? ORDER BY leaf_index", (job_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self, job_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT status, COUNT(*) AS n FROM content_job_chapters WHERE job_id = ? GROUP BY status", (job_id,),
+            ).fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "UPDATE content_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+            conn.commit()
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        原子地获取未完成任务的租约：任务没有持有者、租约已过期或本来就由 owner 持有时成功
+
+        多个进程（多 worker 部署、重启时旧进程尚未退出）同时恢复同一任务时只有一个能获取租约。
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            cursor = conn.execute(
+                "UPDATE content_jobs SET owner = ?, lease_until = ? WHERE job_id = ? "
+                f"AND status IN ({','.join('?' * len(UNFINISHED_JOB_STATUSES))}) "
+                "AND (owner IS NULL OR owner = ? OR lease_until IS NULL OR lease_until < ?)",
+                (owner, now + lease_seconds, job_id, *UNFINISHED_JOB_STATUSES, owner, now),
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def renew(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """续约；租约已被其他进程接管或任务已结束（如被取消）时返回 False"""
+        with self._lock:
+            conn = self._get_conn()
+            cursor = conn.execute(
+                "UPDATE content_jobs SET lease_until = ? WHERE job_id = ? AND owner = ? "
+                f"AND status IN ({','.join('?' * len(UNFINISHED_JOB_STATUSES))})",
+                (time.time() + lease_seconds, job_id, owner, *UNFINISHED_JOB_STATUSES),
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def release(self, job_id: str, owner: str) -> None:
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "UPDATE content_jobs SET owner = NULL, lease_until = NULL WHERE job_id = ? AND owner = ?",
+                (job_id, owner),
+            )
+            conn.commit()
+
+    def save_chapter(self, job_id: str, index: int, status: str,
+                     content: Optional[str] = None, error: Optional[str] = None) -> None:
+        """章节检查点：每个章节完成（或失败）时立即提交"""
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "UPDATE content_job_chapters SET status = ?, content = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND leaf_index = ?",
+                (status, content, error, now, job_id, index),
+            )
+            conn.execute("UPDATE content_jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+            conn.commit()
+
+    def reset_failed(self, job_id: str) -> int:
+        with self._lock:
+            conn = self._get_conn()
+            cursor = conn.execute(
+                "UPDATE content_job_chapters SET status = ?, error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = ?",
+                (CHAPTER_PENDING, time.time(), job_id, CHAPTER_FAILED),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ContentJobManager:
+    """
+    全文内容生成任务管理
+
+    提交目录即创建任务并在后台生成（复用 generate_content_for_outline_stream 的 worker 池），
+    每个章节完成后立即写入 SQLite；服务重启时 resume() 恢复未完成的任务，只生成尚未完成的章节。
+    客户端可随时按任务 ID 重新订阅进度：先收到当前快照，再收到后续的章节事件。
+
+    同一任务同时只由一个进程生成：开始生成前先获取任务的租约，生成期间定期续约，
+    续约失败（被其他进程接管或任务已被取消）时停止生成；持有者异常退出后租约过期，其他进程可接管。
+    所有数据库操作都通过 asyncio.to_thread 在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, store: Optional[ContentJobStore] = None):
+        self.store = store or ContentJobStore()
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def create_job(
+        self,
+        outline: Dict[str, Any],
+        project_overview: str = "",
+        requirements: str = "",
+        tender_text: str = "",
+        concurrency: int | None = None,
+    ) -> Dict[str, Any]:
+        """创建任务并开始后台生成"""
+        if not isinstance(outline, dict) or 'outline' not in outline:
+            raise Exception("无效的outline数据格式")
+        leaves = OpenAIService._collect_leaf_chapters(outline['outline'])
+        if not leaves:
+            raise Exception("目录中没有需要生成内容的章节")
+
+        job_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        await asyncio.to_thread(self.store.create, {
+            'job_id': job_id,
+            'outline': outline,
+            'project_overview': project_overview or "",
+            'requirements': requirements or "",
+            'tender_text': tender_text or "",
+            'concurrency': concurrency,
+        }, leaves)
+        metrics.inc("content_jobs_total", result="created")
+        await self._start(job_id)
+        return await self.get_job(job_id)
+
+    def _running(self, job_id: str) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    async def _start(self, job_id: str) -> bool:
+        """获取租约并在本进程开始生成，任务已在本进程运行时返回 True，租约由其他进程持有时返回 False"""
+        if self._running(job_id):
+            return True
+        if not await asyncio.to_thread(self.store.claim, job_id, self.owner, settings.content_job_lease_seconds):
+            return False
+        # 等待获取租约期间可能已由本进程的其他调用方启动
+        if self._running(job_id):
+            return True
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        # 任务结束后不再持有 Task 对象
+        task.add_done_callback(lambda done: self._tasks.pop(job_id, None) if self._tasks.get(job_id) is done else None)
+        return True
+
+    @staticmethod
+    def _lease_active(job: Dict[str, Any]) -> bool:
+        return bool(job.get('owner')) and (job.get('lease_until') or 0) >= time.time()
+
+    async def _keep_lease(self, job_id: str, run_task: asyncio.Task) -> None:
+        """生成期间每 1/3 租约时长续约一次，续约失败时停止生成"""
+        interval = settings.content_job_lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await asyncio.to_thread(
+                    self.store.renew, job_id, self.owner, settings.content_job_lease_seconds
+                )
+            except Exception as e:
+                # 数据库暂时不可用时下次再试，租约在过期前仍然有效
+                print(f"内容生成任务 {job_id} 续约失败: {str(e)}")
+                continue
+            if not renewed:
+                print(f"内容生成任务 {job_id} 的租约已失效（被其他进程接管或已取消），停止生成")
+                run_task.cancel()
+                return
+
+    def _publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        event = {**event, 'job_id': job_id}
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    async def _run(self, job_id: str) -> None:
+        lease_task = asyncio.create_task(self._keep_lease(job_id, asyncio.current_task()))
+        try:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None:
+                return
+            chapters = await asyncio.to_thread(self.store.chapters, job_id)
+            completed_contents = {
+                chapter['leaf_index']: chapter['content'] or ""
+                for chapter in chapters
+                if chapter['status'] == CHAPTER_COMPLETED
+            }
+            if completed_contents:
+                logger.debug("内容生成任务 %s 继续生成，已完成 %d/%d 个章节", job_id, len(completed_contents), job['total'])
+            await asyncio.to_thread(self.store.set_status, job_id, JOB_RUNNING)
+
+            async for event in OpenAIService().generate_content_for_outline_stream(
+                job['outline'],
+                job['project_overview'],
+                job['concurrency'],
+                requirements=job['requirements'],
+                tender_text=job['tender_text'],
+                completed_contents=completed_contents,
+            ):
+                status = event['status']
+                if status == 'chapter_completed':
+                    await asyncio.to_thread(
+                        self.store.save_chapter, job_id, event['index'], CHAPTER_COMPLETED, event['content']
+                    )
+                elif status == 'chapter_failed':
+                    await asyncio.to_thread(
+                        self.store.save_chapter, job_id, event['index'], CHAPTER_FAILED, None, event['message']
+                    )
+                elif status == 'completed':
+                    # 完成事件中的目录在 get_result 时由章节表重建，这里不重复发送
+                    event = {k: v for k, v in event.items() if k != 'outline'}
+                    await asyncio.to_thread(self.store.set_status, job_id, JOB_COMPLETED)
+                    metrics.inc("content_jobs_total", result="completed")
+                    logger.debug("内容生成任务 %s 完成，失败章节 %d 个", job_id, len(event['failed']))
+                self._publish(job_id, event)
+        except asyncio.CancelledError:
+            # 服务关闭时保持 running 状态，下次启动时继续；主动取消时由 cancel() 写入状态
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self.store.set_status, job_id, JOB_FAILED, str(e))
+            metrics.inc("content_jobs_total", result="failed")
+            print(f"内容生成任务 {job_id} 失败: {str(e)}")
+            self._publish(job_id, {'status': 'error', 'message': str(e)})
+        finally:
+            lease_task.cancel()
+            # 服务关闭时也释放租约，其他进程或重启后的进程可立即接管
+            # （线程中的释放操作不会被再次取消打断，即使本协程不再等待它也会完成）
+            await asyncio.to_thread(self.store.release, job_id, self.owner)
+
+    async def resume(self) -> int:
+        """恢复所有未完成且没有其他进程持有有效租约的任务，返回恢复的任务数"""
+        try:
+            job_ids = [job_id for job_id in await asyncio.to_thread(self.store.unfinished)
+                       if await self._start(job_id)]
+        except Exception as e:
+            print(f"读取内容生成任务失败: {str(e)}")
+            return 0
+        if job_ids:
+            metrics.inc("content_jobs_total", len(job_ids), result="resumed")
+            logger.debug("已恢复 %d 个未完成的内容生成任务", len(job_ids))
+        return len(job_ids)
+
+    async def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """重新生成失败的章节，并继续生成已取消或失败任务中未完成的章节（已完成的章节保持不变）"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        if self._running(job_id) or self._lease_active(job):
+            raise Exception("任务正在运行")
+        reset = await asyncio.to_thread(self.store.reset_failed, job_id)
+        if reset or job['status'] in (JOB_FAILED, JOB_CANCELLED):
+            await asyncio.to_thread(self.store.set_status, job_id, JOB_PENDING)
+            if not await self._start(job_id):
+                raise Exception("任务正在其他进程中运行")
+        return await self.get_job(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        取消任务（已完成的章节保留，之后可通过 retry 继续生成）
+
+        任务由其他进程生成时只写入取消状态，该进程下次续约失败时停止生成。
+        """
+        if await asyncio.to_thread(self.store.get, job_id) is None:
+            return None
+        task = self._tasks.pop(job_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job['status'] in UNFINISHED_JOB_STATUSES:
+            await asyncio.to_thread(self.store.set_status, job_id, JOB_CANCELLED)
+            metrics.inc("content_jobs_total", result="cancelled")
+            self._publish(job_id, {'status': JOB_CANCELLED})
+        return await self.get_job(job_id)
+
+    def _job_summary(self, job_id: str, include_chapters: bool = False) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        counts = self.store.counts(job_id)
+        result = {
+            'job_id': job_id,
+            'status': job['status'],
+            'total': job['total'],
+            'completed': counts.get(CHAPTER_COMPLETED, 0) + counts.get(CHAPTER_FAILED, 0),
+            'failed': counts.get(CHAPTER_FAILED, 0),
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at'],
+            'owner': job['owner'],
+            'lease_until': job['lease_until'],
+        }
+        if include_chapters:
+            result['chapters'] = [
+                {k: v for k, v in chapter.items() if k != 'content'}
+                for chapter in self.store.chapters(job_id)
+            ]
+        return result
+
+    async def get_job(self, job_id: str, include_chapters: bool = False) -> Optional[Dict[str, Any]]:
+        """任务状态与进度（include_chapters 时附带每个章节的状态，不含内容）"""
+        return await asyncio.to_thread(self._job_summary, job_id, include_chapters)
+
+    async def list_jobs(self) -> List[Dict[str, Any]]:
+        def list_summaries():
+            jobs = [self._job_summary(job_id) for job_id in self.store.list()]
+            return [job for job in jobs if job is not None]
+
+        return await asyncio.to_thread(list_summaries)
+
+    def _result_outline(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        outline = job['outline']
+        leaves = OpenAIService._collect_leaf_chapters(outline['outline'])
+        for chapter in self.store.chapters(job_id):
+            index = chapter['leaf_index']
+            if chapter['status'] == CHAPTER_COMPLETED and index < len(leaves) and chapter['content']:
+                leaves[index]['chapter']['content'] = chapter['content']
+        return outline
+
+    async def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """由章节表回填内容后的目录（未完成的任务返回已生成部分）"""
+        return await asyncio.to_thread(self._result_outline, job_id)
+
+    async def events(self, job_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        订阅任务进度：先产出 snapshot（任务状态与已完成章节的内容），再转发后续事件直到任务结束
+
+        任务不在本进程运行（如多 worker 部署时由其他进程生成）时，按 settings.content_job_poll_interval
+        轮询数据库，将新完成的章节转换为 chapter_completed / chapter_failed 事件；
+        其间任务的租约过期（持有者已退出）时由本进程接管继续生成，之后转发本进程的事件。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        # 始终只保留一个挂起的 get()：wait_for 超时与 put 同时发生时可能丢掉刚取出的事件
+        get_task: Optional[asyncio.Task] = None
+        try:
+            job = await self.get_job(job_id)
+            if job is None:
+                return
+            chapters = await asyncio.to_thread(self.store.chapters, job_id)
+            yield {'status': 'snapshot', 'job_id': job_id, 'job': job, 'chapters': chapters}
+            if job['status'] not in UNFINISHED_JOB_STATUSES:
+                return
+
+            seen = {chapter['leaf_index']: chapter['status'] for chapter in chapters}
+            while True:
+                if self._running(job_id) or get_task is not None or not queue.empty():
+                    # 本进程的任务在运行，或还有尚未转发的事件（任务刚结束）
+                    if get_task is None:
+                        get_task = asyncio.create_task(queue.get())
+                    done, _ = await asyncio.wait({get_task}, timeout=settings.content_job_poll_interval)
+                    if not done:
+                        if self._running(job_id):
+                            continue
+                        get_task.cancel()
+                        get_task = None
+                        continue
+                    event = get_task.result()
+                    get_task = None
+                    if event.get('index') is not None:
+                        seen[event['index']] = event['status'].replace('chapter_', '')
+                    yield event
+                    if event['status'] in ('completed', 'error', JOB_CANCELLED):
+                        return
+                    continue
+
+                for chapter in await asyncio.to_thread(self.store.chapters, job_id):
+                    if chapter['status'] != seen.get(chapter['leaf_index']) and chapter['status'] != CHAPTER_PENDING:
+                        seen[chapter['leaf_index']] = chapter['status']
+                        event = {'status': f"chapter_{chapter['status']}", 'job_id': job_id,
+                                 'index': chapter['leaf_index'], 'chapter_id': chapter['chapter_id']}
+                        if chapter['status'] == CHAPTER_COMPLETED:
+                            event['content'] = chapter['content']
+                        else:
+                            event['message'] = chapter['error']
+                        yield event
+                job = await self.get_job(job_id)
+                if job['status'] not in UNFINISHED_JOB_STATUSES:
+                    yield {'status': job['status'] if job['status'] != JOB_FAILED else 'error',
+                           'job_id': job_id, 'job': job}
+                    return
+                if not self._lease_active(job) and await self._start(job_id):
+                    logger.debug("内容生成任务 %s 的租约已过期，由本进程接管", job_id)
+                    continue
+                await asyncio.sleep(settings.content_job_poll_interval)
+        finally:
+            if get_task is not None:
+                get_task.cancel()
+            subscribers = self._subscribers.get(job_id, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def active_count(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    async def aclose(self) -> None:
+        """停止后台生成（已完成的章节已持久化，任务保持 running 状态，下次启动时继续）"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# 全局内容生成任务管理器实例
+content_job_manager = ContentJobManager()
@@ -3,15 +3,16 @@ import aiofiles
 import os
 import time
 import gc
-import io
 from datetime import datetime
 from typing import Optional, List, Dict, Tuple
 import PyPDF2
 import docx
 from fastapi import UploadFile
-import aiohttp
 import asyncio
+import re
 from ..config import settings
+from .pdf_extractor import pdf_extractor, IMAGE_MARK_PATTERN
+from .image_uploader import image_uploader, ImageReferenceCollector
 
 # 新增的第三方库
 try:
@@ -28,78 +29,10 @@ except ImportError as e:
 class FileService:
     """文件处理服务"""
 
-    # 图片上传配置
-    IMAGE_UPLOAD_URL = "https://mt.agnet.top/image/upload"
-    IMAGE_UPLOAD_TIMEOUT = 30  # 超时时间（秒）
-
     @staticmethod
     async def upload_image_to_server(image_data: bytes, filename: str) -> Optional[str]:
-        """上传图片到外部服务器"""
-        try:
-            # 准备multipart/form-data格式的数据
-            form_data = aiohttp.FormData()
-            form_data.add_field('file',
-                              io.BytesIO(image_data),
-                              filename=filename,
-                              content_type='image/jpeg')
-
-            timeout = aiohttp.ClientTimeout(total=FileService.IMAGE_UPLOAD_TIMEOUT)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(FileService.IMAGE_UPLOAD_URL, data=form_data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        # 根据实际API返回格式获取图片URL
-                        return result.get('file_url')
-                    else:
-                        print(f"图片上传失败，状态码: {response.status}")
-                        return None
-        except Exception as e:
-            print(f"图片上传异常: {str(e)}")
-            return None
-
-    @staticmethod
-    def extract_images_from_pdf(file_path: str) -> List[Tuple[bytes, str, int, int]]:
-        """从PDF提取图片，返回 (图片数据, 扩展名, 页码, 图片索引) 列表"""
-        if not HAS_ADVANCED_LIBS:
-            return []
-
-        images = []
-        try:
-            doc = fitz.open(file_path)
-
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                image_list = page.get_images(full=True)
-
-                for img_index, img in enumerate(image_list):
-                    try:
-                        # 获取图片数据
-                        xref = img[0]
-                        pix = fitz.Pixmap(doc, xref)
-
-                        # 转换为RGB格式（如果是CMYK）
-                        if pix.n - pix.alpha < 4:
-                            img_data = pix.tobytes("jpeg")
-                            ext = "jpg"
-                        else:
-                            pix1 = fitz.Pixmap(fitz.csRGB, pix)
-                            img_data = pix1.tobytes("jpeg")
-                            ext = "jpg"
-                            pix1 = None
-
-                        pix = None
-                        images.append((img_data, ext, page_num + 1, img_index + 1))
-
-                    except Exception as e:
-                        print(f"提取PDF第{page_num+1}页图片{img_index+1}失败: {str(e)}")
-                        continue
-
-            doc.close()
-            return images
-
-        except Exception as e:
-            print(f"PDF图片提取失败: {str(e)}")
-            return []
+        """上传图片到外部服务器（共享连接池，相同内容的图片只上传一次）"""
+        return await image_uploader.upload(image_data, filename)
 
     @staticmethod
     def extract_images_from_docx(file_path: str) -> List[Tuple[bytes, str, int]]:
@@ -204,123 +137,62 @@ class FileService:
     
     @staticmethod
     async def _extract_pdf_with_pdfplumber(file_path: str) -> str:
-        """使用pdfplumber提取PDF文本，包含表格和图片（确保及时释放文件句柄）"""
+        """
+        使用pdfplumber提取PDF文本，包含表格和图片
+
+        逐页流水线（见 pdf_extractor）只打开一次文档，一次遍历同时得到每页的文本、表格与该页的图片，
+        单页失败时只对该页降级到 PyMuPDF；每页的图片上传后即释放，不再预先编码整个文档的图片。
+        """
+        # 图片在后台并发上传，文本中先写入占位符，提取完成后统一编号
+        images = ImageReferenceCollector(image_uploader)
         try:
             extracted_text = []
-            image_references = []  # 存储图片引用映射
-            global_img_counter = 1
-
-            # 获取PDF文档的所有图片信息，用于后续匹配
-            all_images = FileService.extract_images_from_pdf(file_path)
-            page_images_map = {}
-            for img_data, ext, page_num, img_index in all_images:
-                if page_num not in page_images_map:
-                    page_images_map[page_num] = []
-                page_images_map[page_num].append((img_data, ext, img_index))
-
-            # 使用上下文管理器，避免在Windows上产生文件锁
-            with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # 添加页码标识
-                    extracted_text.append(f"\n--- 第 {page_num} 页 ---\n")
-
-                    # 提取普通文本
-                    text = page.extract_text()
-                    if text:
-                        # 检查文本中是否有图片标记
-                        import re
-                        img_pattern = r'----.*?(?:image|img|media).*?----'
-                        img_matches = list(re.finditer(img_pattern, text, re.IGNORECASE))
-
-                        if img_matches and page_num in page_images_map:
-                            # 按顺序处理页面中的图片
-                            page_images = page_images_map[page_num]
-                            processed_text = text
-
-                            for i, match in enumerate(img_matches):
-                                if i < len(page_images):
-                                    # 获取对应的图片数据
-                                    img_data, ext, img_index = page_images[i]
-                                    filename = f"pdf_page{page_num}_img{img_index}.{ext}"
-
-                                    # 上传图片
-                                    image_url = await FileService.upload_image_to_server(img_data, filename)
-
-                                    if image_url:
-                                        # 替换图片标记
-                                        old_mark = match.group()
-                                        new_mark = f"[图片{global_img_counter}]"
-                                        processed_text = processed_text.replace(old_mark, new_mark, 1)
-
-                                        # 记录图片引用
-                                        image_references.append(f"[图片{global_img_counter}]: {image_url}")
-                                        global_img_counter += 1
-
-                            extracted_text.append(processed_text)
-                        else:
-                            extracted_text.append(text)
-
-                    # 提取表格
-                    tables = page.extract_tables()
-                    for table_num, table in enumerate(tables, 1):
-                        extracted_text.append(f"\n[表格 {table_num}]")
-                        for row in table:
-                            if row:  # 跳过空行
-                                # 过滤空值并连接单元格
-                                row_text = " | ".join([str(cell) if cell else "" for cell in row])
-                                extracted_text.append(row_text)
-                        extracted_text.append("[表格结束]\n")
-
-            # 在文档末尾添加图片引用映射
-            if image_references:
-                extracted_text.append(f"\n\n--- 图片引用 ---")
-                extracted_text.extend(image_references)
-
-            result = "\n".join(extracted_text).strip()
+
+            async for page_num, text, tables, page_images in pdf_extractor.iter_pages(file_path):
+                # 添加页码标识
+                extracted_text.append(f"\n--- 第 {page_num} 页 ---\n")
+
+                # 普通文本
+                if text:
+                    # 检查文本中是否有图片标记
+                    img_matches = list(re.finditer(IMAGE_MARK_PATTERN, text, re.IGNORECASE))
+
+                    if img_matches and page_images:
+                        # 按顺序处理页面中的图片
+                        processed_text = text
+
+                        for i, match in enumerate(img_matches):
+                            if i < len(page_images):
+                                # 获取对应的图片数据
+                                img_data, ext, img_index = page_images[i]
+                                filename = f"pdf_page{page_num}_img{img_index}.{ext}"
+
+                                # 开始上传图片，先以占位符替换图片标记
+                                old_mark = match.group()
+                                placeholder = images.add(old_mark, img_data, filename)
+                                processed_text = processed_text.replace(old_mark, placeholder, 1)
+
+                        extracted_text.append(processed_text)
+                    else:
+                        extracted_text.append(text)
+
+                # 表格
+                for table_num, table in enumerate(tables, 1):
+                    extracted_text.append(f"\n[表格 {table_num}]")
+                    for row in table:
+                        if row:  # 跳过空行
+                            # 过滤空值并连接单元格
+                            row_text = " | ".join([str(cell) if cell else "" for cell in row])
+                            extracted_text.append(row_text)
+                    extracted_text.append("[表格结束]\n")
+
+            # 等待图片上传完成，替换占位符并在文档末尾添加图片引用映射
+            result = (await images.resolve("\n".join(extracted_text))).strip()
             gc.collect()
             return result
         except Exception as e:
+            images.cancel()
             gc.collect()
-            # 如果pdfplumber失败，尝试PyMuPDF
-            try:
-                return await FileService._extract_pdf_with_pymupdf(file_path)
-            except Exception:
-                raise Exception(f"PDF文件读取失败: {str(e)}")
-    
-    @staticmethod
-    async def _extract_pdf_with_pymupdf(file_path: str) -> str:
-        """使用PyMuPDF提取PDF文本和图片"""
-        try:
-            doc = fitz.open(file_path)
-            extracted_text = []
-            
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                extracted_text.append(f"\n--- 第 {page_num + 1} 页 ---\n")
-                
-                # 提取文本
-                text = page.get_text()
-                if text:
-                    extracted_text.append(text)
-                
-                # 尝试提取表格
-                try:
-                    tables = page.find_tables()
-                    for table_num, table in enumerate(tables, 1):
-                        extracted_text.append(f"\n[表格 {table_num}]")
-                        table_data = table.extract()
-                        for row in table_data:
-                            if row:
-                                row_text = " | ".join([str(cell) if cell else "" for cell in row])
-                                extracted_text.append(row_text)
-                        extracted_text.append("[表格结束]\n")
-                except:
-                    # 如果表格提取失败，跳过
-                    pass
-            
-            doc.close()
-            return "\n".join(extracted_text).strip()
-        except Exception as e:
             raise Exception(f"PDF文件读取失败: {str(e)}")
     
     @staticmethod 
@@ -348,13 +220,14 @@ class FileService:
     @staticmethod
     async def _extract_docx_with_docx2python(file_path: str) -> str:
         """使用docx2python提取Word文档内容和图片（确保及时释放文件句柄）"""
+        # 图片在后台并发上传，文本中先写入占位符，提取完成后统一编号
+        images = ImageReferenceCollector(image_uploader)
         try:
             extracted_text = []
-            image_references = []  # 存储图片引用映射
-            global_img_counter = 1
 
             # 获取Word文档的所有图片信息
             all_images = FileService.extract_images_from_docx(file_path)
+            image_position = 0
 
             # 使用上下文管理器确保文件及时关闭，避免Windows上的锁定
             with docx2python(file_path) as content:
@@ -378,45 +251,35 @@ class FileService:
                                 text = str(element).strip()
                                 if text:
                                     # 检查文本中是否有图片标记
-                                    import re
-                                    img_pattern = r'----.*?(?:image|img|media).*?----'
-                                    img_matches = list(re.finditer(img_pattern, text, re.IGNORECASE))
+                                    img_matches = list(re.finditer(IMAGE_MARK_PATTERN, text, re.IGNORECASE))
 
                                     if img_matches and all_images:
                                         processed_text = text
 
                                         for match in img_matches:
-                                            if global_img_counter <= len(all_images):
-                                                # 获取对应的图片数据
-                                                img_data, ext, img_index = all_images[global_img_counter - 1]
-                                                filename = f"docx_img{global_img_counter}.{ext}"
-
-                                                # 上传图片
-                                                image_url = await FileService.upload_image_to_server(img_data, filename)
-
-                                                if image_url:
-                                                    # 替换图片标记
-                                                    old_mark = match.group()
-                                                    new_mark = f"[图片{global_img_counter}]"
-                                                    processed_text = processed_text.replace(old_mark, new_mark, 1)
-
-                                                    # 记录图片引用
-                                                    image_references.append(f"[图片{global_img_counter}]: {image_url}")
-                                                    global_img_counter += 1
+                                            if image_position < len(all_images):
+                                                # 获取对应的图片数据（第 N 个图片标记对应文档中的第 N 张图片）
+                                                img_data, ext, img_index = all_images[image_position]
+                                                image_position += 1
+                                                filename = f"docx_img{image_position}.{ext}"
+
+                                                # 开始上传图片，先以占位符替换图片标记
+                                                old_mark = match.group()
+                                                placeholder = images.add(old_mark, img_data, filename)
+                                                processed_text = processed_text.replace(old_mark, placeholder, 1)
+                                                # 让出事件循环，使上传在继续提取文本的同时开始
+                                                await asyncio.sleep(0)
 
                                         extracted_text.append(processed_text)
                                     else:
                                         extracted_text.append(text)
 
-            # 在文档末尾添加图片引用映射
-            if image_references:
-                extracted_text.append(f"\n\n--- 图片引用 ---")
-                extracted_text.extend(image_references)
-
-            result = "\n".join(extracted_text).strip()
+            # 等待图片上传完成，替换占位符并在文档末尾添加图片引用映射
+            result = (await images.resolve("\n".join(extracted_text))).strip()
             gc.collect()
             return result
         except Exception as e:
+            images.cancel()
             gc.collect()
             # 如果docx2python失败，回退到增强的python-docx
             try:
@@ -428,45 +291,39 @@ class FileService:
     async def _extract_docx_with_python_docx(file_path: str) -> str:
         """使用python-docx提取Word文档内容和图片（增强版）"""
         doc = None
+        # 图片在后台并发上传，文本中先写入占位符，提取完成后统一编号
+        images = ImageReferenceCollector(image_uploader)
         try:
             doc = docx.Document(file_path)
             extracted_text = []
-            image_references = []  # 存储图片引用映射
-            global_img_counter = 1
 
             # 获取Word文档的所有图片信息
             all_images = FileService.extract_images_from_docx(file_path)
+            image_position = 0
 
             # 提取段落文本，同时处理图片
             for paragraph in doc.paragraphs:
                 text = paragraph.text.strip()
                 if text:
                     # 检查文本中是否有图片标记
-                    import re
-                    img_pattern = r'----.*?(?:image|img|media).*?----'
-                    img_matches = list(re.finditer(img_pattern, text, re.IGNORECASE))
+                    img_matches = list(re.finditer(IMAGE_MARK_PATTERN, text, re.IGNORECASE))
 
                     if img_matches and all_images:
                         processed_text = text
 
                         for match in img_matches:
-                            if global_img_counter <= len(all_images):
-                                # 获取对应的图片数据
-                                img_data, ext, img_index = all_images[global_img_counter - 1]
-                                filename = f"docx_img{global_img_counter}.{ext}"
-
-                                # 上传图片
-                                image_url = await FileService.upload_image_to_server(img_data, filename)
-
-                                if image_url:
-                                    # 替换图片标记
-                                    old_mark = match.group()
-                                    new_mark = f"[图片{global_img_counter}]"
-                                    processed_text = processed_text.replace(old_mark, new_mark, 1)
-
-                                    # 记录图片引用
-                                    image_references.append(f"[图片{global_img_counter}]: {image_url}")
-                                    global_img_counter += 1
+                            if image_position < len(all_images):
+                                # 获取对应的图片数据（第 N 个图片标记对应文档中的第 N 张图片）
+                                img_data, ext, img_index = all_images[image_position]
+                                image_position += 1
+                                filename = f"docx_img{image_position}.{ext}"
+
+                                # 开始上传图片，先以占位符替换图片标记
+                                old_mark = match.group()
+                                placeholder = images.add(old_mark, img_data, filename)
+                                processed_text = processed_text.replace(old_mark, placeholder, 1)
+                                # 让出事件循环，使上传在继续提取文本的同时开始
+                                await asyncio.sleep(0)
 
                         extracted_text.append(processed_text)
                     else:
@@ -485,12 +342,8 @@ class FileService:
                         extracted_text.append(row_text)
                 extracted_text.append("[表格结束]\n")
 
-            # 在文档末尾添加图片引用映射
-            if image_references:
-                extracted_text.append(f"\n\n--- 图片引用 ---")
-                extracted_text.extend(image_references)
-
-            result = "\n".join(extracted_text).strip()
+            # 等待图片上传完成，替换占位符并在文档末尾添加图片引用映射
+            result = (await images.resolve("\n".join(extracted_text))).strip()
 
             # 确保释放资源
             if doc:
@@ -499,6 +352,7 @@ class FileService:
 
             return result
         except Exception as e:
+            images.cancel()
             # 确保释放资源
             if doc:
                 del doc
@@ -0,0 +1,211 @@
+"""文档图片上传：应用级共享连接池、有上限的并发上传、按内容哈希去重与持久化的 哈希→URL 缓存"""
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import aiohttp
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+
+
+class ImageUrlCache:
+    """图片内容 SHA-256 → 上传后 URL 的 SQLite 缓存（跨文档、跨进程重启保留）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(config_manager.config_dir, "image_urls.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_urls ("
+                "sha256 TEXT PRIMARY KEY, url TEXT NOT NULL, upload_url TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, digest: str, upload_url: str) -> Optional[str]:
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT url FROM image_urls WHERE sha256 = ? AND upload_url = ?", (digest, upload_url)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, digest: str, upload_url: str, url: str) -> None:
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO image_urls (sha256, url, upload_url, created_at) VALUES (?, ?, ?, ?)",
+                (digest, url, upload_url, time.time()),
+            )
+            conn.commit()
+
+
+class ImageUploader:
+    """
+    图片上传器
+
+    - 整个应用共享一个 aiohttp.ClientSession（连接池），应用关闭时释放
+    - 同时进行的上传数不超过 settings.image_upload_concurrency
+    - 相同内容（按 SHA-256）只上传一次：已上传过的直接返回缓存的 URL，正在上传的合并到同一次上传
+    上传失败返回 None 且不写入缓存，下次遇到相同图片时重新上传。
+    """
+
+    def __init__(self, cache: Optional[ImageUrlCache] = None):
+        self.cache = cache or ImageUrlCache()
+        self._urls: Dict[str, str] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # 会话与信号量绑定在创建它们的事件循环上，循环变化（如测试中多次 asyncio.run）时重新创建
+            connector = aiohttp.TCPConnector(limit=settings.image_upload_concurrency)
+            timeout = aiohttp.ClientTimeout(total=settings.image_upload_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._semaphore = asyncio.Semaphore(settings.image_upload_concurrency)
+            self._in_flight = {}
+            self._loop = loop
+        return self._session
+
+    async def _post(self, image_data: bytes, filename: str) -> Optional[str]:
+        session = self._ensure_session()
+        async with self._semaphore:
+            started_at = time.monotonic()
+            try:
+                # 准备multipart/form-data格式的数据
+                form_data = aiohttp.FormData()
+                form_data.add_field('file', io.BytesIO(image_data), filename=filename, content_type='image/jpeg')
+                async with session.post(settings.image_upload_url, data=form_data) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        # 根据实际API返回格式获取图片URL
+                        return result.get('file_url')
+                    print(f"图片上传失败，状态码: {response.status}")
+                    return None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"图片上传异常: {str(e)}")
+                return None
+            finally:
+                metrics.observe("image_upload_seconds", time.monotonic() - started_at)
+
+    async def _upload_once(self, digest: str, image_data: bytes, filename: str) -> Optional[str]:
+        try:
+            url = await self._post(image_data, filename)
+            if url:
+                self._urls[digest] = url
+            if url and settings.image_upload_cache_enabled:
+                try:
+                    await asyncio.to_thread(self.cache.set, digest, settings.image_upload_url, url)
+                except Exception as e:
+                    print(f"图片URL缓存写入失败: {str(e)}")
+            metrics.inc("image_uploads_total", result="uploaded" if url else "failed")
+            return url
+        finally:
+            self._in_flight.pop(digest, None)
+
+    async def upload(self, image_data: bytes, filename: str) -> Optional[str]:
+        """上传图片并返回URL（相同内容复用已有的URL或正在进行的上传），失败返回 None"""
+        self._ensure_session()
+        digest = hashlib.sha256(image_data).hexdigest()
+        url = self._urls.get(digest)
+        if url is None and settings.image_upload_cache_enabled:
+            try:
+                url = await asyncio.to_thread(self.cache.get, digest, settings.image_upload_url)
+            except Exception as e:
+                print(f"图片URL缓存读取失败: {str(e)}")
+            if url:
+                self._urls[digest] = url
+        if url:
+            metrics.inc("image_uploads_total", result="cache_hit")
+            return url
+
+        task = self._in_flight.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._upload_once(digest, image_data, filename))
+            self._in_flight[digest] = task
+        else:
+            metrics.inc("image_uploads_total", result="deduplicated")
+        # 调用方取消（如请求中断）时不取消共享的上传，其他等待相同图片的调用方仍可得到结果
+        return await asyncio.shield(task)
+
+    async def aclose(self) -> None:
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        self._in_flight = {}
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class ImageReferenceCollector:
+    """
+    一份文档中的图片引用
+
+    提取文本时每遇到一个图片标记就在后台开始上传，并在文本中先写入占位符，文本提取不等待上传；
+    全部文本提取完成后 resolve() 等待上传结果，按文档顺序为上传成功的图片编号 [图片N]，
+    上传失败的占位符还原为原始标记。
+    """
+
+    def __init__(self, uploader: ImageUploader):
+        self.uploader = uploader
+        self._pending = []  # (占位符, 原始标记, 上传任务)
+
+    def add(self, original_mark: str, image_data: bytes, filename: str) -> str:
+        placeholder = f"\x00IMAGE{len(self._pending)}\x00"
+        task = asyncio.create_task(self.uploader.upload(image_data, filename))
+        self._pending.append((placeholder, original_mark, task))
+        return placeholder
+
+    async def resolve(self, text: str) -> str:
+        """替换全部占位符，并在末尾附加图片引用映射"""
+        if not self._pending:
+            return text
+        try:
+            urls = await asyncio.gather(*(task for _, _, task in self._pending))
+        finally:
+            self.cancel()
+
+        image_references = []
+        for (placeholder, original_mark, _), url in zip(self._pending, urls):
+            if url:
+                number = len(image_references) + 1
+                text = text.replace(placeholder, f"[图片{number}]", 1)
+                image_references.append(f"[图片{number}]: {url}")
+            else:
+                text = text.replace(placeholder, original_mark, 1)
+        self._pending = []
+
+        # 在文档末尾添加图片引用映射
+        if image_references:
+            text = "\n".join([text, "\n\n--- 图片引用 ---", *image_references])
+        return text
+
+    def cancel(self) -> None:
+        """取消尚未完成的等待：提取失败时由调用方调用，resolve() 被取消时也会调用（共享的上传本身不受影响）"""
+        for _, _, task in self._pending:
+            if not task.done():
+                task.cancel()
+
+
+# 全局图片上传器实例
+image_uploader = ImageUploader()
@@ -0,0 +1,421 @@
+"""离线批量生成：按 OpenAI Batch 文件格式编译章节请求，提交、轮询并把结果回填到目录中"""
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+from .llm_client_registry import client_registry
+from .openai_service import OpenAIService
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# 批次的终止状态（与 OpenAI Batch API 一致）
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+# 任务状态
+JOB_PENDING = "pending"
+JOB_SUBMITTED = "submitted"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+# 任务 ID 格式（create_content_job 生成）：时间戳-8 位十六进制
+JOB_ID_PATTERN = re.compile(r"\d{14}-[0-9a-f]{8}")
+
+
+def read_jsonl(path: str) -> List[Dict]:
+    """读取 JSONL 文件，忽略空行与写了一半的末行"""
+    if not os.path.exists(path):
+        return []
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return items
+
+
+def _truncate_partial_line(path: str) -> None:
+    """去掉进程中途退出时写了一半的末行，保证后续追加的行完整"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Any, indent: Optional[int] = None) -> None:
+    # 先写临时文件再原子替换，进程中途退出时不会留下写了一半的文件
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def _write_lines(path: str, lines: List[str], mode: str = 'w') -> None:
+    with open(path, mode, encoding='utf-8') as f:
+        for line in lines:
+            f.write(line if line.endswith("\n") else line + "\n")
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def parse_batch_output(lines: List[Dict]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    解析 Batch 输出文件
+
+    Returns:
+        {custom_id: (生成内容, 错误信息)}，成功时错误信息为 None，失败时内容为 None
+    """
+    results = {}
+    for item in lines:
+        custom_id = item.get('custom_id')
+        if not custom_id:
+            continue
+        response = item.get('response') or {}
+        error = item.get('error')
+        if error is None and response.get('status_code') == 200:
+            try:
+                content = response['body']['choices'][0]['message']['content']
+                results[custom_id] = (content or "", None)
+                continue
+            except (KeyError, IndexError, TypeError):
+                error = {'message': '响应格式无效'}
+        if error is None:
+            error = (response.get('body') or {}).get('error') or {'message': f"HTTP {response.get('status_code')}"}
+        message = error.get('message') if isinstance(error, dict) else str(error)
+        results[custom_id] = (None, message)
+    return results
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API（以及兼容该接口的服务商）"""
+
+    name = "openai"
+    poll_interval = None  # 使用 settings.batch_poll_interval
+
+    def __init__(self, api_key: str, base_url: str):
+        self.client = client_registry.get_client(api_key, base_url)
+
+    async def submit(self, job_id: str, input_path: str) -> str:
+        data = await asyncio.to_thread(_read_bytes, input_path)
+        input_file = await self.client.files.create(file=(os.path.basename(input_path), data), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+            metadata={"job_id": job_id},
+        )
+        return batch.id
+
+    async def poll(self, batch_id: str) -> Dict[str, Any]:
+        batch = await self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "total": counts.total if counts else None,
+            "completed": counts.completed if counts else None,
+            "failed": counts.failed if counts else None,
+        }
+
+    async def download(self, batch_id: str, output_path: str) -> None:
+        """下载输出文件与错误文件，合并写入 output_path"""
+        batch = await self.client.batches.retrieve(batch_id)
+        texts = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            texts.append(content.text)
+        await asyncio.to_thread(_write_lines, output_path, texts)
+
+
+class LocalBatchBackend:
+    """
+    本地文件批处理（用于测试，以及不支持 Batch API 的服务商）
+
+    逐条调用当前配置的模型，按 OpenAI Batch 输出格式追加写入任务目录下的 local_output.jsonl；
+    进程重启后只处理 local_output.jsonl 中还没有结果的请求。
+    """
+
+    name = "local"
+    poll_interval = 1.0
+
+    def __init__(self, root: str):
+        self.root = root
+        self._runners: Dict[str, asyncio.Task] = {}
+
+    def _paths(self, batch_id: str) -> Tuple[str, str]:
+        job_dir = os.path.join(self.root, batch_id)
+        return os.path.join(job_dir, "input.jsonl"), os.path.join(job_dir, "local_output.jsonl")
+
+    async def submit(self, job_id: str, input_path: str) -> str:
+        self._ensure_runner(job_id)
+        return job_id
+
+    def _ensure_runner(self, batch_id: str) -> None:
+        runner = self._runners.get(batch_id)
+        if runner is None or runner.done():
+            self._runners[batch_id] = asyncio.create_task(self._run(batch_id))
+
+    async def _run(self, batch_id: str) -> None:
+        input_path, output_path = self._paths(batch_id)
+        await asyncio.to_thread(_truncate_partial_line, output_path)
+        requests = await asyncio.to_thread(read_jsonl, input_path)
+        done = {item.get('custom_id') for item in await asyncio.to_thread(read_jsonl, output_path)}
+        pending = [item for item in requests if item['custom_id'] not in done]
+        if not pending:
+            return
+
+        service = OpenAIService()
+        semaphore = asyncio.Semaphore(max(1, settings.content_generation_concurrency))
+        write_lock = asyncio.Lock()
+
+        async def run_one(item: Dict) -> None:
+            async with semaphore:
+                body = item['body']
+                content = await service._collect_stream_text(
+                    body['messages'], temperature=body.get('temperature', 0.7), call_site="batch-chapter"
+                )
+                if content.startswith("错误: "):
+                    line = {"custom_id": item['custom_id'], "response": None,
+                            "error": {"message": content[len("错误: "):]}}
+                else:
+                    line = {"custom_id": item['custom_id'], "error": None, "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                              "finish_reason": "stop"}]},
+                    }}
+                async with write_lock:
+                    await asyncio.to_thread(_write_lines, output_path, [json.dumps(line, ensure_ascii=False)], 'a')
+
+        await asyncio.gather(*(run_one(item) for item in pending))
+
+    async def poll(self, batch_id: str) -> Dict[str, Any]:
+        input_path, output_path = self._paths(batch_id)
+        total = len(await asyncio.to_thread(read_jsonl, input_path))
+        results = parse_batch_output(await asyncio.to_thread(read_jsonl, output_path))
+        failed = sum(1 for _, error in results.values() if error)
+        if len(results) >= total:
+            status = "completed"
+        else:
+            # 进程重启后首次轮询时恢复执行
+            self._ensure_runner(batch_id)
+            status = "in_progress"
+        return {"status": status, "total": total, "completed": len(results) - failed, "failed": failed}
+
+    async def download(self, batch_id: str, output_path: str) -> None:
+        _, local_output = self._paths(batch_id)
+        await asyncio.to_thread(shutil.copyfile, local_output, output_path)
+
+    async def aclose(self) -> None:
+        for runner in self._runners.values():
+            runner.cancel()
+        await asyncio.gather(*self._runners.values(), return_exceptions=True)
+        self._runners.clear()
+
+
+class BatchJobManager:
+    """
+    批量生成任务管理
+
+    每个任务一个目录（~/.ai_write_helper/batches/<job_id>/）：
+    - manifest.json：任务状态、后端、批次 ID、叶子章节与 custom_id 的对应关系
+    - outline.json：提交时的目录；input.jsonl：Batch 输入文件
+    - output.jsonl：Batch 输出文件；result.json：回填内容后的目录
+    每次状态变化都先写 manifest，进程重启后 resume() 从 manifest 恢复未完成的任务继续轮询。
+    文件读写都在线程中执行（asyncio.to_thread），不阻塞事件循环。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(config_manager.config_dir, "batches")
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._local_backend: Optional[LocalBatchBackend] = None
+
+    @staticmethod
+    def is_valid_job_id(job_id: str) -> bool:
+        return bool(JOB_ID_PATTERN.fullmatch(job_id or ""))
+
+    def _job_dir(self, job_id: str) -> str:
+        # job_id 来自 URL 路径，只接受生成的格式，避免 ..\ 等路径穿越到任务目录之外
+        if not self.is_valid_job_id(job_id):
+            raise ValueError(f"无效的任务 ID: {job_id}")
+        return os.path.join(self.root, job_id)
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self._job_dir(job_id), name)
+
+    def _load_manifest(self, job_id: str) -> Optional[Dict]:
+        if not self.is_valid_job_id(job_id):
+            return None
+        return _read_json(self._path(job_id, "manifest.json"))
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        manifest['updated_at'] = time.time()
+        _write_json(self._path(manifest['job_id'], "manifest.json"), manifest, indent=2)
+
+    def _backend(self, name: str):
+        if name == LocalBatchBackend.name:
+            if self._local_backend is None:
+                self._local_backend = LocalBatchBackend(self.root)
+            return self._local_backend
+        config = config_manager.load_config()
+        return OpenAIBatchBackend(config.get('api_key', ''), config.get('base_url', ''))
+
+    async def create_content_job(self, outline: Dict[str, Any], project_overview: str = "", backend: str = "openai",
+                           requirements: str = "", tender_text: str = "") -> Dict:
+        """编译目录中所有叶子章节的请求并创建批量生成任务（后台提交与轮询）"""
+        service = OpenAIService()
+        requests, leaves = service.compile_chapter_batch(outline, project_overview, requirements, tender_text)
+        if not requests:
+            raise Exception("目录中没有需要生成内容的章节")
+
+        job_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        manifest = {
+            'job_id': job_id,
+            'backend': backend,
+            # 记录请求体中实际使用的模型（配置了模型路由时为 chapter 路由的模型），用于状态展示与成本归因
+            'model': requests[0]['body']['model'],
+            'status': JOB_PENDING,
+            'batch_id': None,
+            'batch_status': None,
+            'total': len(requests),
+            'leaves': leaves,
+            'failed': [],
+            'error': None,
+            'created_at': time.time(),
+        }
+        await asyncio.to_thread(self._write_job_files, manifest, outline, requests)
+        metrics.inc("llm_batch_jobs_total", backend=backend)
+        self._start(job_id)
+        return manifest
+
+    def _write_job_files(self, manifest: Dict, outline: Dict[str, Any], requests: List[Dict]) -> None:
+        job_id = manifest['job_id']
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        _write_json(self._path(job_id, "outline.json"), outline)
+        _write_lines(self._path(job_id, "input.jsonl"),
+                     [json.dumps(request, ensure_ascii=False) for request in requests])
+        self._save_manifest(manifest)
+
+    def _start(self, job_id: str) -> None:
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def _run(self, job_id: str) -> None:
+        manifest = await asyncio.to_thread(self._load_manifest, job_id)
+        backend = self._backend(manifest['backend'])
+        interval = backend.poll_interval or settings.batch_poll_interval
+        try:
+            if not manifest.get('batch_id'):
+                # 提交前崩溃时重新提交（提交成功但 manifest 未写入的极端情况下可能重复提交）
+                manifest['batch_id'] = await backend.submit(job_id, self._path(job_id, "input.jsonl"))
+                manifest['status'] = JOB_SUBMITTED
+                await asyncio.to_thread(self._save_manifest, manifest)
+                print(f"批量任务 {job_id} 已提交: {manifest['batch_id']}")
+
+            while True:
+                state = await backend.poll(manifest['batch_id'])
+                if state != manifest.get('batch_state'):
+                    manifest['batch_status'] = state['status']
+                    manifest['batch_state'] = state
+                    await asyncio.to_thread(self._save_manifest, manifest)
+                if state['status'] in TERMINAL_BATCH_STATUSES:
+                    break
+                await asyncio.sleep(interval)
+
+            if manifest['batch_status'] != "completed":
+                raise Exception(f"批次结束状态: {manifest['batch_status']}")
+
+            output_path = self._path(job_id, "output.jsonl")
+            await backend.download(manifest['batch_id'], output_path)
+            await asyncio.to_thread(self._apply_results, manifest)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            manifest['status'] = JOB_FAILED
+            manifest['error'] = str(e)
+            await asyncio.to_thread(self._save_manifest, manifest)
+            metrics.inc("llm_batch_jobs_failed_total", backend=manifest['backend'])
+            print(f"批量任务 {job_id} 失败: {str(e)}")
+
+    def _apply_results(self, manifest: Dict) -> None:
+        # 在线程中执行：读取目录与输出文件、回填并写入结果
+        job_id = manifest['job_id']
+        outline = _read_json(self._path(job_id, "outline.json"))
+        results = parse_batch_output(read_jsonl(self._path(job_id, "output.jsonl")))
+        result_outline, failed = OpenAIService.apply_chapter_batch_results(outline, results)
+        _write_json(self._path(job_id, "result.json"), result_outline)
+        manifest['status'] = JOB_COMPLETED
+        manifest['failed'] = failed
+        self._save_manifest(manifest)
+        print(f"批量任务 {job_id} 完成，失败章节 {len(failed)} 个")
+
+    def _load_manifests(self, reverse: bool = False) -> List[Dict]:
+        if not os.path.isdir(self.root):
+            return []
+        manifests = [self._load_manifest(job_id) for job_id in sorted(os.listdir(self.root), reverse=reverse)]
+        return [manifest for manifest in manifests if manifest is not None]
+
+    async def resume(self) -> int:
+        """恢复所有未完成的任务，返回恢复的任务数"""
+        resumed = 0
+        for manifest in await asyncio.to_thread(self._load_manifests):
+            if manifest['status'] in (JOB_PENDING, JOB_SUBMITTED):
+                self._start(manifest['job_id'])
+                resumed += 1
+        if resumed:
+            print(f"已恢复 {resumed} 个未完成的批量任务")
+        return resumed
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        manifest = await asyncio.to_thread(self._load_manifest, job_id)
+        if manifest is not None:
+            manifest.pop('leaves', None)
+        return manifest
+
+    async def list_jobs(self) -> List[Dict]:
+        manifests = await asyncio.to_thread(self._load_manifests, True)
+        for manifest in manifests:
+            manifest.pop('leaves', None)
+        return manifests
+
+    async def get_result(self, job_id: str) -> Optional[Dict]:
+        if not self.is_valid_job_id(job_id):
+            return None
+        return await asyncio.to_thread(_read_json, self._path(job_id, "result.json"))
+
+    async def aclose(self) -> None:
+        """停止后台轮询（任务状态已持久化，下次启动时恢复）"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._local_backend is not None:
+            await self._local_backend.aclose()
+
+
+# 全局批量任务管理器实例
+batch_job_manager = BatchJobManager()
@@ -0,0 +1,202 @@
+"""按模型的 RPM / TPM 令牌桶调度器"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按秒匀速补充；允许透支（余额为负）以结算实际用量"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """余额达到 amount 还需要等待的秒数"""
+        self.refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+
+class Reservation:
+    """一次已放行请求的额度预留，完成后按实际用量结算"""
+
+    def __init__(self, budget: "ModelBudget", tokens: int):
+        self.budget = budget
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """按实际消耗结算：多退少补；actual_tokens 为 None 时保持预留量"""
+        if self.settled:
+            return
+        self.settled = True
+        if actual_tokens is not None:
+            self.budget.adjust(self.tokens - actual_tokens)
+
+
+class ModelBudget:
+    """
+    单个模型的请求数与 token 数预算
+
+    等待中的请求按调用点分队列，调用点之间轮转放行，避免大 prompt（例如整份招标文件的分析）
+    连续占满额度而饿死章节生成等小请求。
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        # call_site -> deque[(future, tokens)]
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def unlimited(self) -> bool:
+        return self.request_bucket is None and self.token_bucket is None
+
+    def _clamp(self, tokens: int) -> int:
+        # 单个请求超过整分钟额度时按整分钟额度预留，否则永远无法放行
+        if self.token_bucket is not None:
+            return min(tokens, int(self.token_bucket.capacity))
+        return tokens
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _take(self, tokens: int) -> None:
+        if self.request_bucket is not None:
+            self.request_bucket.tokens -= 1
+        if self.token_bucket is not None:
+            self.token_bucket.tokens -= tokens
+
+    def adjust(self, delta_tokens: float) -> None:
+        """结算差额（正数为退还，负数为补扣），并尝试放行等待者"""
+        if self.token_bucket is not None:
+            self.token_bucket.refill()
+            self.token_bucket.tokens = min(self.token_bucket.capacity, self.token_bucket.tokens + delta_tokens)
+        self._dispatch()
+
+    async def reserve(self, tokens: int, call_site: str = "default") -> Reservation:
+        """预留一次请求与 tokens 个 token 的额度，额度不足时排队等待"""
+        tokens = self._clamp(max(0, tokens))
+        if self.unlimited:
+            return Reservation(self, tokens)
+
+        if not any(self._queues.values()) and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            return Reservation(self, tokens)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(call_site, deque()).append((fut, tokens))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 额度已扣除但请求被取消，全部退还
+                if self.request_bucket is not None:
+                    self.request_bucket.tokens += 1
+                self.adjust(tokens)
+            else:
+                queue = self._queues.get(call_site)
+                if queue is not None:
+                    try:
+                        queue.remove((fut, tokens))
+                    except ValueError:
+                        pass
+            raise
+        metrics.inc("llm_budget_wait_seconds_total", time.monotonic() - started, model=self.model, call_site=call_site)
+        return Reservation(self, tokens)
+
+    def _dispatch(self) -> None:
+        """按调用点轮转放行等待者；队首额度不足时设置定时器，在补充足够后再次调度"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while True:
+            # 清理空队列和已取消的等待者
+            for site in list(self._queues.keys()):
+                queue = self._queues[site]
+                while queue and queue[0][0].done():
+                    queue.popleft()
+                if not queue:
+                    del self._queues[site]
+            if not self._queues:
+                return
+
+            site, queue = next(iter(self._queues.items()))
+            fut, tokens = queue[0]
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            queue.popleft()
+            self._take(tokens)
+            fut.set_result(None)
+            # 当前调用点移到队尾，实现调用点之间的轮转
+            self._queues.move_to_end(site)
+
+    def snapshot(self) -> Dict:
+        for bucket in (self.request_bucket, self.token_bucket):
+            if bucket is not None:
+                bucket.refill()
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "requests_available": round(self.request_bucket.tokens, 2) if self.request_bucket else None,
+            "tokens_available": round(self.token_bucket.tokens, 2) if self.token_bucket else None,
+            "queued": {site: len(queue) for site, queue in self._queues.items() if queue},
+        }
+
+
+_budgets: Dict[str, ModelBudget] = {}
+
+
+def get_budget(model: str, endpoint: Optional[str] = None, limits: Optional[Dict] = None) -> ModelBudget:
+    """
+    获取模型对应的预算；配置文件中的限额变化时重建
+
+    传入 limits 时表示端点有独立限额（例如不同 API Key 各自的额度），预算按 "模型@端点" 单独计算。
+    """
+    key = model
+    if limits is None:
+        limits = config_manager.get_model_limits(model)
+    elif endpoint:
+        key = f"{model}@{endpoint}"
+    rpm = int(limits.get("rpm") or settings.llm_default_rpm or 0)
+    tpm = int(limits.get("tpm") or settings.llm_default_tpm or 0)
+    budget = _budgets.get(key)
+    if budget is None or budget.rpm != rpm or budget.tpm != tpm:
+        if budget is not None and any(budget._queues.values()):
+            # 仍有等待者时沿用旧预算，避免丢失队列
+            return budget
+        budget = _budgets[key] = ModelBudget(model, rpm, tpm)
+    return budget
+
+
+def budget_snapshots() -> Dict[str, Dict]:
+    """所有模型预算的当前状态"""
+    return {model: budget.snapshot() for model, budget in _budgets.items() if not budget.unlimited}
@@ -0,0 +1,205 @@
+"""LLM 补全结果缓存：内存 LRU + SQLite 磁盘层（多个 uvicorn worker 共享）"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+
+
+class CompletionCache:
+    """
+    以规范化请求的哈希为键的补全缓存
+
+    - 第一层：进程内 LRU，命中时零 IO
+    - 第二层：SQLite 文件（WAL 模式），同一台机器上的所有 worker 共享
+    - 条目按 TTL 过期；磁盘层超过上限时按写入时间淘汰最旧的条目
+    缓存值为原始的 chunk 列表，命中时可按原有粒度回放给流式消费者。
+    """
+
+    # 每写入多少次执行一次磁盘清理
+    PURGE_EVERY = 100
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_memory_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+        max_disk_entries: Optional[int] = None,
+        disk_enabled: Optional[bool] = None,
+    ):
+        self.db_path = db_path or os.path.join(config_manager.config_dir, "llm_cache.sqlite3")
+        self.max_memory_entries = max_memory_entries if max_memory_entries is not None else settings.llm_cache_memory_entries
+        self.ttl = ttl if ttl is not None else settings.llm_cache_ttl
+        self.max_disk_entries = max_disk_entries if max_disk_entries is not None else settings.llm_cache_max_disk_entries
+        self.disk_enabled = settings.llm_cache_disk_enabled if disk_enabled is None else disk_enabled
+
+        self._memory: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: list,
+        temperature: float,
+        response_format: Optional[dict] = None,
+        base_url: str = "",
+    ) -> str:
+        """根据规范化后的请求参数计算缓存键"""
+        normalized = {
+            "base_url": (base_url or "").rstrip("/"),
+            "model": model,
+            "messages": [
+                {"role": m.get("role", ""), "content": m.get("content", "")}
+                for m in messages
+            ],
+            "temperature": round(float(temperature), 4),
+            "response_format": response_format or None,
+        }
+        payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ---------- 磁盘层 ----------
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_created ON completions(created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, List[str]]]:
+        with self._db_lock:
+            row = self._get_conn().execute(
+                "SELECT created_at, chunks FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, created_at: float, chunks: List[str]) -> None:
+        with self._db_lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, chunks, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(chunks, ensure_ascii=False), created_at),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._purge_locked(conn)
+            conn.commit()
+
+    def _disk_delete(self, key: str) -> None:
+        with self._db_lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            conn.commit()
+
+    def _purge_locked(self, conn: sqlite3.Connection) -> None:
+        """删除过期条目，并将条目数控制在上限以内（调用方持有 _db_lock）"""
+        conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    # ---------- 对外接口 ----------
+
+    def _memory_put(self, key: str, created_at: float, chunks: List[str]) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, chunks)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                metrics.inc("llm_cache_evictions_total", tier="memory")
+
+    async def get(self, key: str, call_site: str = "default") -> Optional[List[str]]:
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._memory.move_to_end(key)
+                    metrics.inc("llm_cache_requests_total", result="memory_hit", call_site=call_site)
+                    return list(entry[1])
+                self._memory.pop(key, None)
+
+        if self.disk_enabled:
+            try:
+                entry = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                print(f"LLM缓存读取失败: {str(e)}")
+                entry = None
+            if entry is not None and now - entry[0] < self.ttl:
+                self._memory_put(key, entry[0], entry[1])
+                metrics.inc("llm_cache_requests_total", result="disk_hit", call_site=call_site)
+                return list(entry[1])
+
+        metrics.inc("llm_cache_requests_total", result="miss", call_site=call_site)
+        return None
+
+    async def set(self, key: str, chunks: List[str]) -> None:
+        """写入缓存（内存层同步写入，磁盘层在线程中写入）"""
+        created_at = time.time()
+        chunks = list(chunks)
+        self._memory_put(key, created_at, chunks)
+        metrics.inc("llm_cache_stores_total")
+        if self.disk_enabled:
+            try:
+                await asyncio.to_thread(self._disk_set, key, created_at, chunks)
+            except Exception as e:
+                print(f"LLM缓存写入失败: {str(e)}")
+
+    async def invalidate(self, key: str) -> None:
+        """删除指定缓存条目（例如缓存的结果未通过校验时）"""
+        with self._lock:
+            self._memory.pop(key, None)
+        metrics.inc("llm_cache_invalidations_total")
+        if self.disk_enabled:
+            try:
+                await asyncio.to_thread(self._disk_delete, key)
+            except Exception as e:
+                print(f"LLM缓存删除失败: {str(e)}")
+
+    def stats(self) -> dict:
+        """缓存状态与命中率"""
+        series = metrics.snapshot()["counters"].get("llm_cache_requests_total", [])
+        hits = sum(item["value"] for item in series if item["labels"].get("result") != "miss")
+        misses = sum(item["value"] for item in series if item["labels"].get("result") == "miss")
+        total = hits + misses
+        with self._lock:
+            memory_entries = len(self._memory)
+        return {
+            "enabled": settings.llm_cache_enabled,
+            "disk_enabled": self.disk_enabled,
+            "memory_entries": memory_entries,
+            "max_memory_entries": self.max_memory_entries,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+# 全局补全缓存实例
+completion_cache = CompletionCache()
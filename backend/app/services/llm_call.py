@@ -0,0 +1,74 @@
+"""单次 LLM 调用的上下文记录"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class LLMCall:
+    """
+    一次 stream_chat_completion 调用的上下文
+
+    由调用方创建，在上游流式请求的各个阶段（预算、限流、重试、用量统计）中逐步填充。
+    """
+    call_site: str
+    model: str
+    prompt_tokens_estimate: int = 0
+    completion_tokens_estimate: int = 0
+    finish_reason: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    ttft: Optional[float] = None
+    retries: int = 0
+    endpoint: Optional[str] = None
+    cache_hit: bool = False
+    coalesced: bool = False  # 合并到了进行中的相同请求，没有发起自己的上游调用
+    error: Optional[str] = None
+    queue_wait: float = 0.0  # 预算排队与并发限制器排队的总时间（含重试）
+    duration: float = 0.0  # 从发起到结束的总耗时（含排队与重试）
+    chunk_gaps: List[float] = field(default_factory=list)  # 最后一次尝试中相邻内容 chunk 的间隔
+
+    @property
+    def total_tokens(self) -> int:
+        """实际消耗的 token 数：优先使用上游返回的 usage，缺失时使用本地估算值"""
+        if self.usage and self.usage.get("total_tokens"):
+            return int(self.usage["total_tokens"])
+        return self.prompt_tokens_estimate + self.completion_tokens_estimate
+
+    @property
+    def status(self) -> str:
+        """调用结束状态：上游返回的 finish_reason，出错为 error，被消费方提前终止为 cancelled"""
+        if self.error is not None:
+            return "error"
+        return self.finish_reason or "cancelled"
+
+    @property
+    def completion_tokens(self) -> int:
+        """上游返回的 completion token 数，缺失时使用本地估算值"""
+        if self.usage and self.usage.get("completion_tokens") is not None:
+            return int(self.usage["completion_tokens"])
+        return self.completion_tokens_estimate
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """首 token 之后的生成速度"""
+        if self.ttft is None or not self.chunk_gaps:
+            return None
+        generation_time = sum(self.chunk_gaps)
+        if generation_time <= 0:
+            return None
+        return self.completion_tokens / generation_time
+
+    @property
+    def prompt_tokens(self) -> int:
+        """上游返回的 prompt token 数（未返回 usage 时为 0）"""
+        return int((self.usage or {}).get("prompt_tokens") or 0)
+
+    @property
+    def cached_tokens(self) -> int:
+        """
+        命中服务商前缀缓存的 prompt token 数
+
+        OpenAI / Qwen 使用 prompt_tokens_details.cached_tokens，DeepSeek 使用 prompt_cache_hit_tokens。
+        """
+        usage = self.usage or {}
+        details = usage.get("prompt_tokens_details") or {}
+        return int(details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0)
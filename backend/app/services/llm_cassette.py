@@ -0,0 +1,173 @@
+"""LLM 录制/回放（cassette）：录制真实会话的请求与 chunk 流，回放时不访问上游，用于可复现的性能基准与回归测试"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+from ..utils.token_util import estimate_tokens
+from .llm_cache import CompletionCache
+from .llm_call import LLMCall
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+
+class Cassette:
+    """
+    一个录制文件（JSONL，每行一次上游调用）
+
+    每行记录请求哈希、调用点、模型、首 token 延迟、按相对时间排列的 chunk 列表、总耗时、finish_reason 与 usage。
+    请求哈希只包含消息、temperature 与 response_format（不含模型与 base_url），换一套模型配置也能回放。
+    同一请求录制了多次时（如 JSON 校验失败后的重试）按录制顺序依次回放，用完后重复最后一次。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, List[Dict]]] = None
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(messages: list, temperature: float, response_format: dict | None) -> str:
+        return CompletionCache.make_key("", messages, temperature, response_format)
+
+    def _load(self) -> Dict[str, List[Dict]]:
+        if self._entries is None:
+            entries: Dict[str, List[Dict]] = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # 录制中断时最后一行可能不完整
+                        entries.setdefault(entry["key"], []).append(entry)
+            self._entries = entries
+        return self._entries
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._load().values())
+
+    def _append(self, entry: Dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            if self._entries is not None:
+                self._entries.setdefault(entry["key"], []).append(entry)
+
+    def _next(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            items = self._load().get(key)
+            if not items:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return items[min(cursor, len(items) - 1)]
+
+    def rewind(self) -> None:
+        """重置回放位置（下一次回放从每个请求的第一条录制开始）"""
+        with self._lock:
+            self._cursors.clear()
+
+    async def record(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        call: LLMCall,
+        upstream: AsyncGenerator[str, None],
+    ) -> AsyncGenerator[str, None]:
+        """透传上游的 chunk 并记录到达时间，正常结束的调用写入录制文件"""
+        started_at = time.monotonic()
+        chunks = []
+        async with aclosing(upstream) as stream:
+            async for chunk in stream:
+                chunks.append([round(time.monotonic() - started_at, 4), chunk])
+                yield chunk
+        if call.error is not None or call.finish_reason is None:
+            return
+        self._append({
+            "key": self.request_key(messages, temperature, response_format),
+            "call_site": call.call_site,
+            "model": call.model,
+            "ttft": round(call.ttft, 4) if call.ttft is not None else None,
+            "chunks": chunks,
+            "duration": round(time.monotonic() - started_at, 4),
+            "finish_reason": call.finish_reason,
+            "usage": call.usage,
+        })
+        metrics.inc("llm_cassette_total", mode=MODE_RECORD, call_site=call.call_site, result="recorded")
+
+    async def replay(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        call: LLMCall,
+        speed: float = 0.0,
+    ) -> AsyncGenerator[str, None]:
+        """
+        从录制文件回放一次调用，并按录制内容填充 call（首 token 延迟、usage、finish_reason）
+
+        speed 为 0 时尽快回放；为 1 时按录制时的节奏回放，2 表示两倍速，依此类推。
+        没有匹配的录制时以错误文本结束。
+        """
+        key = self.request_key(messages, temperature, response_format)
+        entry = self._next(key)
+        if entry is None:
+            metrics.inc("llm_cassette_total", mode=MODE_REPLAY, call_site=call.call_site, result="miss")
+            print(f"[{call.call_site}] 录制文件中没有匹配的请求: {key[:16]}")
+            call.error = "cassette miss"
+            yield f"错误: 录制文件中没有匹配的请求（{key[:16]}）"
+            return
+
+        metrics.inc("llm_cassette_total", mode=MODE_REPLAY, call_site=call.call_site, result="hit")
+        started_at = time.monotonic()
+        previous = None
+        call.chunk_gaps = []
+        for offset, chunk in entry["chunks"]:
+            if speed > 0:
+                delay = offset / speed - (time.monotonic() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if previous is not None:
+                call.chunk_gaps.append(max(0.0, (offset - previous) / speed) if speed > 0 else 0.0)
+            elif speed > 0 and entry.get("ttft") is not None:
+                call.ttft = entry["ttft"] / speed
+            else:
+                call.ttft = 0.0
+            previous = offset
+            call.completion_tokens_estimate += estimate_tokens(chunk)
+            yield chunk
+        if speed > 0 and entry.get("duration"):
+            # 最后一个 chunk 之后上游还会发送结束标记与 usage，按录制节奏回放时同样等待
+            delay = entry["duration"] / speed - (time.monotonic() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        call.finish_reason = entry.get("finish_reason") or "stop"
+        call.usage = entry.get("usage")
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """按 settings.llm_cassette_mode 返回当前录制文件，未开启录制/回放时返回 None"""
+    global _cassette
+    if settings.llm_cassette_mode not in (MODE_RECORD, MODE_REPLAY):
+        return None
+    path = settings.llm_cassette_path or os.path.join(config_manager.config_dir, "cassettes", "llm_cassette.jsonl")
+    if _cassette is None or _cassette.path != path:
+        _cassette = Cassette(path)
+    return _cassette
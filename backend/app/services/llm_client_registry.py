@@ -0,0 +1,127 @@
+"""LLM客户端注册表：进程级共享、按 (base_url, api_key) 复用的 AsyncOpenAI 客户端"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+from ..config import settings
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+ClientKey = Tuple[str, str]
+
+
+class ClientRegistry:
+    """
+    AsyncOpenAI 客户端注册表
+
+    - 相同 (base_url, api_key) 复用同一个客户端及其底层连接池，避免每次请求重新握手
+    - 配置变更后按新 key 创建客户端，旧客户端在 LRU 淘汰时延迟关闭，保证在途请求不受影响
+    - 模型列表按 key 缓存，带 TTL
+    """
+
+    # 被淘汰的客户端延迟关闭的时间（秒），给在途的流式请求留出收尾时间
+    RETIRE_DELAY = 600
+
+    def __init__(self):
+        self._clients: "OrderedDict[ClientKey, openai.AsyncOpenAI]" = OrderedDict()
+        self._models_cache: Dict[ClientKey, Tuple[float, List[str]]] = {}
+        self._retire_tasks: set = set()
+
+    @staticmethod
+    def make_key(api_key: str, base_url: Optional[str]) -> ClientKey:
+        return ((base_url or "").rstrip("/"), api_key or "")
+
+    @staticmethod
+    def _build_client(api_key: str, base_url: Optional[str]) -> openai.AsyncOpenAI:
+        """创建带调优连接池的 AsyncOpenAI 客户端"""
+        http_client = openai.DefaultAsyncHttpxClient(
+            http2=settings.llm_http2 and HAS_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(settings.llm_request_timeout, connect=settings.llm_connect_timeout),
+        )
+        return openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url if base_url else None,
+            http_client=http_client,
+            # 重试交由 LLM 层的自适应限制器处理，使 429/5xx 能反馈到并发窗口
+            max_retries=0,
+        )
+
+    def get_client(self, api_key: str, base_url: Optional[str]) -> openai.AsyncOpenAI:
+        """获取（必要时创建）指定 key 对应的共享客户端"""
+        key = self.make_key(api_key, base_url)
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+
+        client = self._build_client(api_key, base_url)
+        self._clients[key] = client
+        while len(self._clients) > max(1, settings.llm_max_cached_clients):
+            old_key, old_client = self._clients.popitem(last=False)
+            self._models_cache.pop(old_key, None)
+            self._retire(old_client)
+        return client
+
+    def _retire(self, client: openai.AsyncOpenAI) -> None:
+        """延迟关闭被淘汰的客户端"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        async def _close_later():
+            await asyncio.sleep(self.RETIRE_DELAY)
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+        task = loop.create_task(_close_later())
+        self._retire_tasks.add(task)
+        task.add_done_callback(self._retire_tasks.discard)
+
+    def get_cached_models(self, api_key: str, base_url: Optional[str]) -> Optional[List[str]]:
+        """读取未过期的模型列表缓存"""
+        entry = self._models_cache.get(self.make_key(api_key, base_url))
+        if entry is None:
+            return None
+        expires_at, models = entry
+        if time.monotonic() >= expires_at:
+            return None
+        return list(models)
+
+    def set_cached_models(self, api_key: str, base_url: Optional[str], models: List[str]) -> None:
+        """写入模型列表缓存"""
+        expires_at = time.monotonic() + settings.llm_models_cache_ttl
+        self._models_cache[self.make_key(api_key, base_url)] = (expires_at, list(models))
+
+    async def aclose(self) -> None:
+        """关闭所有客户端（应用关闭时调用）"""
+        for task in list(self._retire_tasks):
+            task.cancel()
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._models_cache.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+
+# 全局客户端注册表实例
+client_registry = ClientRegistry()
@@ -0,0 +1,221 @@
+"""LLM 上游端点池：多个 API Key / 多个 OpenAI 兼容 base_url 之间的健康路由与故障转移"""
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+import openai
+
+from ..config import settings
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+from .llm_client_registry import client_registry
+from .llm_limiter import AdaptiveLimiter, get_limiter, OUTCOME_OVERLOAD
+
+
+def is_endpoint_failure(error: Exception, outcome: str) -> bool:
+    """
+    错误是否由端点本身引起（换一个端点可能成功）
+
+    过载（429/5xx/超时）、连接失败（包括流式读取中途断开）以及密钥无效/无权限属于端点故障；
+    其余 4xx（如请求参数错误）换端点也无济于事。
+    """
+    if outcome == OUTCOME_OVERLOAD or isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (401, 403, 404)
+
+
+class Endpoint:
+    """单个上游端点及其健康状态"""
+
+    def __init__(self, name: str, api_key: str, base_url: str, model: str,
+                 weight: float = 1.0, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.weight = max(0.01, float(weight or 1.0))
+        self.rpm = int(rpm or 0)
+        self.tpm = int(tpm or 0)
+
+        self.outstanding = 0
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def spec(self) -> tuple:
+        """端点配置签名，配置未变化时沿用已有的健康状态"""
+        return (self.api_key, self.base_url, self.model, self.weight, self.rpm, self.tpm)
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        return client_registry.get_client(self.api_key, self.base_url)
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        return get_limiter(self.base_url, self.api_key)
+
+    @property
+    def limits(self) -> Optional[Dict]:
+        """端点自身的 RPM/TPM 限额；未配置时返回 None，按模型限额处理"""
+        if self.rpm or self.tpm:
+            return {'rpm': self.rpm, 'tpm': self.tpm}
+        return None
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def snapshot(self) -> Dict:
+        return {
+            "base_url": self.base_url or "default",
+            "model": self.model,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected_for": round(max(0.0, self.ejected_until - time.monotonic()), 3),
+        }
+
+
+class EndpointPool:
+    """
+    端点池
+
+    - 选择：在未被摘除的端点中，按 (在途请求数 + 1) × 首 token 延迟 EWMA / 权重 取最小者
+      （最少在途请求 + 延迟感知；尚无延迟数据的端点按已知最小延迟计算，保证新端点能被探测到）
+    - 摘除：端点连续失败达到阈值（或返回 Retry-After）后摘除一段冷却时间，多次摘除时冷却时间指数增长
+    - 全部端点都被摘除时，选择最早恢复的端点，不让请求直接失败
+    """
+
+    def __init__(self, endpoints: List[Endpoint]):
+        self.endpoints = endpoints
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def primary(self) -> Endpoint:
+        return self.endpoints[0]
+
+    def _scope(self, only: Optional[str]) -> List[Endpoint]:
+        """路由规则限定的端点范围；未限定或名称不存在时为全部端点"""
+        if only:
+            scoped = [ep for ep in self.endpoints if ep.name == only]
+            if scoped:
+                return scoped
+        return list(self.endpoints)
+
+    def select(self, exclude: Iterable[str] = (), only: Optional[str] = None) -> Endpoint:
+        """
+        选择当前最健康的端点
+
+        exclude 为本次调用已经失败过的端点名称；only 为路由规则限定的端点名称
+        """
+        exclude = set(exclude)
+        scope = self._scope(only)
+        candidates = [ep for ep in scope if ep.name not in exclude] or scope
+        healthy = [ep for ep in candidates if not ep.ejected]
+        if not healthy:
+            return min(candidates, key=lambda ep: ep.ejected_until)
+
+        known = [ep.latency_ewma for ep in healthy if ep.latency_ewma is not None]
+        default_latency = min(known) if known else 1.0
+
+        def score(ep: Endpoint) -> float:
+            latency = ep.latency_ewma if ep.latency_ewma is not None else default_latency
+            return (ep.outstanding + 1) * max(latency, 0.001) / ep.weight
+
+        best = min(score(ep) for ep in healthy)
+        # 分数相同的端点之间随机选择，避免总是压在第一个端点上
+        return random.choice([ep for ep in healthy if score(ep) == best])
+
+    def has_alternative(self, exclude: Iterable[str], only: Optional[str] = None) -> bool:
+        """除 exclude 之外是否还有未被摘除的端点"""
+        exclude = set(exclude)
+        return any(ep.name not in exclude and not ep.ejected for ep in self._scope(only))
+
+    def record_success(self, endpoint: Endpoint, ttft: Optional[float]) -> None:
+        endpoint.consecutive_failures = 0
+        endpoint.ejections = 0
+        if ttft is not None:
+            alpha = settings.llm_endpoint_latency_alpha
+            endpoint.latency_ewma = ttft if endpoint.latency_ewma is None else \
+                (1 - alpha) * endpoint.latency_ewma + alpha * ttft
+
+    def record_failure(self, endpoint: Endpoint, retry_after: Optional[float] = None) -> None:
+        """记录一次端点故障，达到阈值时摘除端点"""
+        endpoint.consecutive_failures += 1
+        metrics.inc("llm_endpoint_failures_total", endpoint=endpoint.name)
+        if len(self.endpoints) == 1:
+            # 只有一个端点时不摘除，交给限制器的 Retry-After 与退避处理
+            return
+
+        cooldown = 0.0
+        if endpoint.consecutive_failures >= settings.llm_endpoint_eject_failures:
+            endpoint.ejections += 1
+            cooldown = min(settings.llm_endpoint_eject_cooldown * (2 ** (endpoint.ejections - 1)),
+                           settings.llm_endpoint_max_eject)
+        if retry_after:
+            cooldown = max(cooldown, min(retry_after, settings.llm_max_retry_after))
+        if cooldown > 0:
+            endpoint.ejected_until = max(endpoint.ejected_until, time.monotonic() + cooldown)
+            metrics.inc("llm_endpoint_ejections_total", endpoint=endpoint.name)
+            print(f"LLM端点 {endpoint.name} 已摘除 {cooldown:.0f}s（连续失败 {endpoint.consecutive_failures} 次）")
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {ep.name: ep.snapshot() for ep in self.endpoints}
+
+
+_pool: Optional[EndpointPool] = None
+
+
+def _load_endpoints() -> List[Endpoint]:
+    """从配置构建端点列表：主配置（api_key/base_url/model_name）在前，endpoints 中的额外端点在后"""
+    config = config_manager.load_config()
+    model_name = config.get('model_name') or 'gpt-3.5-turbo'
+    endpoints = [Endpoint(
+        name='default',
+        api_key=config.get('api_key', ''),
+        base_url=config.get('base_url', ''),
+        model=model_name,
+    )]
+    names = {'default'}
+    for i, item in enumerate(config.get('endpoints') or []):
+        if not isinstance(item, dict) or not item.get('api_key'):
+            continue
+        name = str(item.get('name') or f"endpoint-{i + 1}")
+        if name in names:
+            name = f"{name}-{i + 1}"
+        names.add(name)
+        endpoints.append(Endpoint(
+            name=name,
+            api_key=item['api_key'],
+            base_url=item.get('base_url') or '',
+            model=item.get('model_name') or model_name,
+            weight=item.get('weight') or 1.0,
+            rpm=item.get('rpm') or 0,
+            tpm=item.get('tpm') or 0,
+        ))
+    return endpoints
+
+
+def get_endpoint_pool() -> EndpointPool:
+    """获取端点池；配置变化时重建，未变化的端点保留健康状态"""
+    global _pool
+    endpoints = _load_endpoints()
+    if _pool is not None:
+        old = {ep.name: ep for ep in _pool.endpoints}
+        if [ep.name for ep in endpoints] == list(old) and all(ep.spec == old[ep.name].spec for ep in endpoints):
+            return _pool
+        endpoints = [old[ep.name] if ep.name in old and old[ep.name].spec == ep.spec else ep
+                     for ep in endpoints]
+    _pool = EndpointPool(endpoints)
+    return _pool
+
+
+def endpoint_snapshots() -> Dict[str, Dict]:
+    """端点池状态（仅在配置了多个端点时有意义）"""
+    return _pool.snapshot() if _pool is not None else {}
@@ -0,0 +1,162 @@
+"""对冲请求（hedged requests）：按调用点的延迟分位数为慢请求发起副本，降低扇出调用的尾延迟"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..config import settings
+from ..utils.metrics import metrics
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class HedgePolicy:
+    """
+    单个调用点的对冲策略
+
+    - 延迟阈值：最近成功调用的首 token 延迟与总耗时的分位数（默认 P90），样本不足时不对冲
+    - 预算：对冲副本数不超过该调用点请求数 × llm_hedge_budget_ratio，保证 token 开销只是小幅增加
+    """
+
+    def __init__(self, call_site: str):
+        self.call_site = call_site
+        self.requests = 0
+        self.hedges = 0
+        self._ttfts: deque = deque(maxlen=settings.llm_hedge_window)
+        self._durations: deque = deque(maxlen=settings.llm_hedge_window)
+
+    def observe(self, ttft: Optional[float], duration: float) -> None:
+        """记录一次成功调用的首 token 延迟与总耗时"""
+        if ttft is not None:
+            self._ttfts.append(ttft)
+        self._durations.append(duration)
+
+    def delays(self) -> Tuple[Optional[float], Optional[float]]:
+        """返回 (首 token 延迟阈值, 总耗时阈值)，样本不足时为 None"""
+        q = settings.llm_hedge_percentile
+        ttft_delay = _percentile(self._ttfts, q) if len(self._ttfts) >= settings.llm_hedge_min_samples else None
+        total_delay = _percentile(self._durations, q) if len(self._durations) >= settings.llm_hedge_min_samples else None
+        return ttft_delay, total_delay
+
+    def try_acquire(self) -> bool:
+        """申请一次对冲额度"""
+        if self.hedges + 1 > self.requests * settings.llm_hedge_budget_ratio:
+            metrics.inc("llm_hedge_budget_exhausted_total", call_site=self.call_site)
+            return False
+        self.hedges += 1
+        return True
+
+    def snapshot(self) -> Dict:
+        ttft_delay, total_delay = self.delays()
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "ttft_delay": round(ttft_delay, 3) if ttft_delay is not None else None,
+            "total_delay": round(total_delay, 3) if total_delay is not None else None,
+        }
+
+
+_policies: Dict[str, HedgePolicy] = {}
+
+
+def get_hedge_policy(call_site: str) -> HedgePolicy:
+    policy = _policies.get(call_site)
+    if policy is None:
+        policy = _policies[call_site] = HedgePolicy(call_site)
+    return policy
+
+
+def hedge_snapshots() -> Dict[str, Dict]:
+    """各调用点的对冲状态"""
+    return {site: policy.snapshot() for site, policy in _policies.items()}
+
+
+class AttemptProbe:
+    """
+    传给每次尝试的探针：记录首 token 到达时间，以及结果是否来自补全缓存或合并的请求（不计入延迟样本）
+
+    hedge=True 表示对冲副本，副本必须发起独立的上游调用
+    """
+
+    def __init__(self, hedge: bool = False):
+        self.hedge = hedge
+        self.started = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.from_cache = False
+
+    @property
+    def first_token_received(self) -> bool:
+        return self.ttft is not None
+
+    def mark_first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self.started
+
+
+# 一次尝试：接收探针，返回 (是否有效, 结果)
+Attempt = Callable[[AttemptProbe], Awaitable[Tuple[bool, Any]]]
+
+
+async def run_hedged(call_site: str, attempt: Attempt) -> Tuple[bool, Any]:
+    """
+    以对冲方式执行 attempt
+
+    主请求在阈值内没有收到首 token、或超过总耗时阈值仍未完成时，发起一个副本；
+    两者中先得到有效结果的胜出，另一个被取消（连带关闭上游 HTTP 流）。
+    两者都无效时返回主请求的结果，由调用方决定是否重试。
+    """
+    policy = get_hedge_policy(call_site)
+    policy.requests += 1
+    started = time.monotonic()
+
+    async def timed(probe: AttemptProbe) -> Tuple[bool, Any]:
+        ok, result = await attempt(probe)
+        if ok and not probe.from_cache:
+            policy.observe(probe.ttft, time.monotonic() - probe.started)
+        return ok, result
+
+    primary_probe = AttemptProbe()
+    primary = asyncio.create_task(timed(primary_probe))
+    tasks = {primary: "primary"}
+    try:
+        # 等待主请求完成或触发对冲条件（阈值随样本动态更新，按固定间隔检查）
+        while not primary.done():
+            ttft_delay, total_delay = policy.delays()
+            elapsed = time.monotonic() - started
+            slow_first_token = ttft_delay is not None and not primary_probe.first_token_received and elapsed >= ttft_delay
+            slow_total = total_delay is not None and elapsed >= total_delay
+            if slow_first_token or slow_total:
+                break
+            timeout = settings.llm_hedge_check_interval
+            for delay in (ttft_delay if not primary_probe.first_token_received else None, total_delay):
+                if delay is not None:
+                    timeout = min(timeout, max(0.0, delay - elapsed))
+            await asyncio.wait({primary}, timeout=timeout)
+
+        if primary.done() or not policy.try_acquire():
+            return await primary
+
+        print(f"[{call_site}] 请求已耗时 {time.monotonic() - started:.1f}s，发起对冲请求")
+        metrics.inc("llm_hedges_total", call_site=call_site)
+        hedge = asyncio.create_task(timed(AttemptProbe(hedge=True)))
+        tasks[hedge] = "hedge"
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result()[0]:
+                    metrics.inc("llm_hedge_wins_total", call_site=call_site, winner=tasks[task])
+                    return task.result()
+        return await primary
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
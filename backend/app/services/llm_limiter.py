@@ -0,0 +1,212 @@
+"""LLM 上游自适应并发限制器（AIMD）"""
+import asyncio
+import hashlib
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import openai
+
+from ..config import settings
+from ..utils.metrics import metrics
+
+
+# 调用结果分类
+OUTCOME_SUCCESS = "success"      # 正常完成
+OUTCOME_OVERLOAD = "overload"    # 429 / 5xx / 超时，视为上游过载
+OUTCOME_ERROR = "error"          # 其他错误，不调整窗口
+OUTCOME_CANCELLED = "cancelled"  # 消费方提前退出，不调整窗口
+
+
+def classify_error(error: Exception) -> Tuple[str, Optional[float]]:
+    """
+    将上游异常分类为 (调用结果, Retry-After 秒数)
+
+    429、5xx 与超时视为过载信号，其余错误不影响并发窗口。
+    """
+    if isinstance(error, openai.APITimeoutError):
+        return OUTCOME_OVERLOAD, None
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429 or error.status_code >= 500:
+            return OUTCOME_OVERLOAD, parse_retry_after(error.response.headers if error.response is not None else None)
+    return OUTCOME_ERROR, None
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """解析 retry-after-ms / retry-after 响应头（仅支持秒数形式）"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+    return None
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 自适应并发限制器
+
+    - 调用成功且首 token 延迟健康时，窗口按 1/窗口 累加（约每轮满窗口 +1）
+    - 遇到 429、5xx 或超时时窗口减半（同一波过载只减半一次）
+    - 收到 Retry-After 时，在该时间内暂停放行新请求
+    等待中的请求按先进先出排队。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: Optional[float] = None,
+        min_limit: Optional[float] = None,
+        max_limit: Optional[float] = None,
+    ):
+        self.name = name
+        self.min_limit = float(min_limit if min_limit is not None else settings.llm_limiter_min)
+        self.max_limit = float(max_limit if max_limit is not None else settings.llm_limiter_max)
+        self.limit = float(initial if initial is not None else settings.llm_limiter_initial)
+        self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._blocked_until = 0.0
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+        self._last_decrease = 0.0
+        self._ttft_ewma: Optional[float] = None
+
+    @property
+    def window(self) -> int:
+        return max(1, int(self.limit))
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for fut in self._waiters if not fut.done())
+
+    def _can_admit(self) -> bool:
+        return self.in_flight < self.window and time.monotonic() >= self._blocked_until
+
+    async def acquire(self) -> float:
+        """获取一个并发名额，返回排队等待的秒数"""
+        started = time.monotonic()
+        if not self._waiters and self._can_admit():
+            self.in_flight += 1
+            return 0.0
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiters.append(fut)
+        self._schedule_wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已经转交给本请求，但请求被取消，归还名额
+                self.in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+        return time.monotonic() - started
+
+    def release(self, outcome: str, ttft: Optional[float] = None, retry_after: Optional[float] = None) -> None:
+        """归还名额，并根据调用结果调整并发窗口"""
+        self.in_flight = max(0, self.in_flight - 1)
+        now = time.monotonic()
+
+        if outcome == OUTCOME_SUCCESS:
+            if self._is_healthy(ttft):
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        elif outcome == OUTCOME_OVERLOAD:
+            # 同一波过载（在冷却时间内）只减半一次
+            if now - self._last_decrease >= settings.llm_limiter_decrease_cooldown:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+                metrics.inc("llm_limiter_decreases_total", limiter=self.name)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + min(retry_after, settings.llm_max_retry_after))
+
+        self._wake()
+
+    def _is_healthy(self, ttft: Optional[float]) -> bool:
+        """首 token 延迟是否健康：不超过绝对上限，且不明显劣化于历史均值"""
+        if ttft is None:
+            return True
+        baseline = self._ttft_ewma
+        self._ttft_ewma = ttft if baseline is None else 0.8 * baseline + 0.2 * ttft
+        if ttft > settings.llm_limiter_slow_ttft:
+            return False
+        return baseline is None or ttft <= baseline * settings.llm_limiter_ttft_degradation
+
+    def _wake(self) -> None:
+        """按先进先出顺序把空出来的名额转交给等待者"""
+        while self._waiters and self._can_admit():
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
+        self._schedule_wake()
+
+    def _schedule_wake(self) -> None:
+        """Retry-After 暂停期间，在暂停结束时重新唤醒等待者"""
+        delay = self._blocked_until - time.monotonic()
+        if delay <= 0 or not self._waiters or self._wake_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def _on_timer():
+            self._wake_handle = None
+            self._wake()
+
+        self._wake_handle = loop.call_later(delay, _on_timer)
+
+    def snapshot(self) -> Dict:
+        """当前窗口、在途请求数与排队深度"""
+        return {
+            "limit": round(self.limit, 3),
+            "window": self.window,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "blocked_for": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+            "ttft_ewma": round(self._ttft_ewma, 3) if self._ttft_ewma is not None else None,
+        }
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+
+
+def get_limiter(base_url: Optional[str], api_key: str) -> AdaptiveLimiter:
+    """
+    获取上游 (base_url, api_key) 对应的限制器
+
+    按完整密钥的哈希区分限制器（末 4 位相同的不同密钥互不影响），名称中只保留密钥末 4 位用于展示。
+    """
+    base = (base_url or 'default').rstrip('/')
+    key = (base, hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12])
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = AdaptiveLimiter(f"{base}#{(api_key or '')[-4:]}")
+    return limiter
+
+
+def limiter_snapshots() -> Dict[str, Dict]:
+    """所有限制器的状态（展示名称相同时依次加序号区分）"""
+    snapshots: Dict[str, Dict] = {}
+    for limiter in _limiters.values():
+        name = limiter.name
+        index = 2
+        while name in snapshots:
+            name = f"{limiter.name}({index})"
+            index += 1
+        snapshots[name] = limiter.snapshot()
+    return snapshots
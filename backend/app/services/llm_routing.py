@@ -0,0 +1,83 @@
+"""按调用点的模型路由：不同阶段（一级提纲、二三级提纲、章节正文等）使用不同的模型与端点"""
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional
+
+from ..utils.config_manager import config_manager
+from ..utils.metrics import metrics
+
+
+class ModelRoute:
+    """一条路由规则匹配结果：model 为空表示使用端点自身的模型，endpoint 为空表示不限定端点"""
+
+    __slots__ = ("pattern", "model", "endpoint")
+
+    def __init__(self, pattern: str, model: str = "", endpoint: str = ""):
+        self.pattern = pattern
+        self.model = model
+        self.endpoint = endpoint
+
+
+def resolve_route(call_site: str) -> Optional[ModelRoute]:
+    """
+    按配置中 model_routes 的顺序匹配调用点，返回第一条匹配的规则
+
+    规则的 call_site 支持通配符，如 "outline-*"、"*-map"；没有匹配的规则时返回 None（使用默认模型与全部端点）。
+    """
+    for rule in config_manager.get_model_routes():
+        pattern = rule.get('call_site') or ''
+        if pattern and fnmatchcase(call_site, pattern):
+            return ModelRoute(pattern, rule.get('model') or '', rule.get('endpoint') or '')
+    return None
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """按模型配置的单价（元 / 百万 token）估算费用，未配置单价时返回 None"""
+    limits = config_manager.get_model_limits(model)
+    input_price = float(limits.get('input_price') or 0)
+    output_price = float(limits.get('output_price') or 0)
+    if not input_price and not output_price:
+        return None
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def _series(snapshot: Dict, kind: str, name: str) -> List[Dict]:
+    return snapshot.get(kind, {}).get(name, [])
+
+
+def stage_report() -> List[Dict]:
+    """
+    按 (调用点, 模型) 汇总各阶段的调用数、延迟分位数、token 用量与费用，便于比较不同模型路由的延迟与成本
+    """
+    snapshot = metrics.snapshot()
+    stages: Dict[tuple, Dict] = {}
+
+    def stage(labels: Dict) -> Dict:
+        key = (labels.get('call_site', ''), labels.get('model', ''))
+        if key not in stages:
+            stages[key] = {
+                'call_site': key[0], 'model': key[1], 'calls': 0,
+                'duration_p50': None, 'duration_p90': None, 'ttft_p50': None,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'cost': None,
+            }
+        return stages[key]
+
+    for item in _series(snapshot, 'counters', 'llm_calls_total'):
+        stage(item['labels'])['calls'] += int(item['value'])
+    for name, field in (('llm_prompt_tokens_total', 'prompt_tokens'),
+                        ('llm_completion_tokens_total', 'completion_tokens')):
+        for item in _series(snapshot, 'counters', name):
+            stage(item['labels'])[field] += int(item['value'])
+    for item in _series(snapshot, 'counters', 'llm_cost_total'):
+        entry = stage(item['labels'])
+        entry['cost'] = round((entry['cost'] or 0) + item['value'], 6)
+    for item in _series(snapshot, 'histograms', 'llm_call_duration_seconds'):
+        entry = stage(item['labels'])
+        entry['duration_p50'], entry['duration_p90'] = item['p50'], item['p90']
+    for item in _series(snapshot, 'histograms', 'llm_ttft_seconds'):
+        stage(item['labels'])['ttft_p50'] = item['p50']
+
+    report = sorted(stages.values(), key=lambda s: (s['call_site'], s['model']))
+    for entry in report:
+        entry['cost_per_call'] = round(entry['cost'] / entry['calls'], 6) \
+            if entry['cost'] is not None and entry['calls'] else None
+    return report
@@ -0,0 +1,107 @@
+"""相同 LLM 请求的合并（single-flight）：进行中的相同请求共享同一个上游流"""
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, Dict, List, Optional
+
+from ..utils.metrics import metrics
+
+
+class _Flight:
+    """一个进行中的上游流：已产出的 chunk 全部保留，后加入的订阅者先回放再跟随实时 chunk"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        # 唤醒当前所有等待者，并为下一轮等待换一个新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    按请求键合并进行中的流式请求
+
+    - 第一个请求（leader）在后台任务中消费上游流，chunk 追加到共享缓冲区
+    - 相同键的后续请求直接订阅该缓冲区：先收到已产出的 chunk，再实时跟随，不产生新的上游调用
+    - 所有订阅者都退出（如客户端全部断开）时取消后台任务，连带关闭上游 HTTP 流
+    - 上游流结束后立即移除该键，之后的相同请求由补全缓存或新的上游调用处理
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncGenerator[str, None]],
+        call_site: str = "default",
+        on_join: Optional[Callable[[], None]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        订阅 key 对应的流；没有进行中的相同请求时调用 factory() 创建上游流
+
+        on_join 在本次请求合并到已有的流（而不是自己发起上游调用）时调用
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(key)
+            flight.task = asyncio.create_task(self._produce(flight, factory()))
+        else:
+            metrics.inc("llm_singleflight_coalesced_total", call_site=call_site)
+            print(f"[{call_site}] 相同请求正在进行中，合并到已有的流（已产出 {len(flight.chunks)} 个片段）")
+            if on_join is not None:
+                on_join()
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = flight._changed
+                if index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    yield chunk
+                    continue
+                if flight.done:
+                    break
+                await changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                self._remove(flight)
+
+    async def _produce(self, flight: _Flight, upstream: AsyncGenerator[str, None]) -> None:
+        try:
+            async with aclosing(upstream) as chunks:
+                async for chunk in chunks:
+                    flight.chunks.append(chunk)
+                    flight.notify()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._remove(flight)
+            flight.notify()
+
+    def _remove(self, flight: _Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+
+# 全局请求合并实例
+single_flight = SingleFlight()
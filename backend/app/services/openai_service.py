@@ -3,10 +3,35 @@ import openai
 from typing import Dict, Any, List, AsyncGenerator
 import json
 import asyncio
+import copy
+import logging
+import time
+from contextlib import aclosing
 
 from ..utils.outline_util import get_random_indexes, calculate_nodes_distribution, generate_one_outline_json_by_level1
-from ..utils.json_util import check_json
+from ..utils.json_util import (
+    parse_and_check_json, repair_json, build_response_format, wrapped_list_template, IncrementalJsonValidator
+)
 from ..utils.config_manager import config_manager
+from ..utils.prompt_manager import build_project_info_prompt
+from ..config import settings
+from .llm_client_registry import client_registry
+from .llm_cache import completion_cache
+from .llm_budget import get_budget
+from .llm_call import LLMCall
+from .llm_limiter import classify_error, OUTCOME_SUCCESS, OUTCOME_OVERLOAD, OUTCOME_CANCELLED
+from .llm_endpoints import get_endpoint_pool, is_endpoint_failure
+from .llm_hedge import run_hedged, AttemptProbe
+from .llm_singleflight import single_flight
+from .llm_routing import resolve_route, estimate_cost
+from .llm_cassette import get_cassette, MODE_REPLAY
+from ..utils.metrics import metrics, TOKEN_BUCKETS, RATE_BUCKETS
+from ..utils.token_util import estimate_tokens, estimate_messages_tokens, get_model_context_tokens
+from ..utils.document_chunker import split_document
+from ..utils.context_retriever import ContextSelection, get_project_context, chapter_query
+
+# 每次调用的明细日志（DEBUG 级别，默认不输出；汇总数据见 /api/metrics）
+logger = logging.getLogger(__name__)
 
 
 class OpenAIService:
@@ -14,20 +39,21 @@ class OpenAIService:
     
     def __init__(self):
         """初始化OpenAI服务，从config_manager读取配置"""
-        # 从配置管理器加载配置
+        # 从配置管理器加载配置（配置文件未变化时直接命中内存缓存）
         config = config_manager.load_config()
         self.api_key = config.get('api_key', '')
         self.base_url = config.get('base_url', '')
         self.model_name = config.get('model_name', 'gpt-3.5-turbo')
 
-        # 初始化OpenAI客户端 - 使用异步客户端
-        self.client = openai.AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url if self.base_url else None
-        )
+        # 从进程级注册表获取共享的异步客户端，复用已建立的连接池
+        self.client = client_registry.get_client(self.api_key, self.base_url)
     
-    async def get_available_models(self) -> List[str]:
-        """获取可用的模型列表"""
+    async def get_available_models(self, use_cache: bool = True) -> List[str]:
+        """获取可用的模型列表（带 TTL 缓存）"""
+        if use_cache:
+            cached = client_registry.get_cached_models(self.api_key, self.base_url)
+            if cached is not None:
+                return cached
         try:
             models = await self.client.models.list()
             chat_models = []
@@ -35,45 +61,341 @@ class OpenAIService:
                 model_id = model.id.lower()
                 if any(keyword in model_id for keyword in ['gpt', 'claude', 'chat', 'llama', 'qwen', 'deepseek']):
                     chat_models.append(model.id)
-            return sorted(list(set(chat_models)))
+            chat_models = sorted(list(set(chat_models)))
+            client_registry.set_cached_models(self.api_key, self.base_url, chat_models)
+            return chat_models
         except Exception as e:
             raise Exception(f"获取模型列表失败: {str(e)}")
+
+    async def warm_up(self) -> None:
+        """预热连接：提前完成 DNS/TLS 握手并填充模型列表缓存，失败时仅打印日志"""
+        if not self.api_key:
+            return
+        try:
+            await asyncio.wait_for(self.get_available_models(), timeout=settings.llm_connect_timeout)
+        except Exception as e:
+            print(f"LLM连接预热失败（不影响使用）: {str(e)}")
     
+    def _route_model(self, call_site: str) -> str:
+        """调用点路由到的模型（没有匹配的路由规则时为默认模型）"""
+        route = resolve_route(call_site)
+        return (route.model if route else "") or self.model_name
+
+    def _cache_key(self, messages: list, temperature: float, response_format: dict | None,
+                   call_site: str = "default") -> str:
+        """计算当前请求的补全缓存键（模型按调用点路由，不同模型的结果互不命中）"""
+        return completion_cache.make_key(
+            self._route_model(call_site), messages, temperature, response_format, base_url=self.base_url
+        )
+
     async def stream_chat_completion(
         self, 
         messages: list, 
         temperature: float = 0.7,
-        response_format: dict = None
+        response_format: dict = None,
+        cache: bool = False,
+        call_site: str = "default",
+        failover: bool = False,
+        call: LLMCall | None = None,
+        coalesce: bool = True,
+        idempotency_key: str | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        流式聊天完成请求 - 真正的异步实现
+
+        Args:
+            cache: 是否对本次调用启用补全缓存。命中时按原 chunk 顺序回放，
+                未命中时请求上游，并在正常结束后写入缓存。只用于确定性、幂等的调用点（如低温度的文档分析）；
+                用户可以"重新生成"的采样调用（提纲、扩写）不缓存，否则缓存有效期内每次重新生成都得到相同结果
+            call_site: 调用点名称，用于指标统计
+            failover: 消费方只使用完整结果（不转发部分输出）时设为 True，输出缓冲到正常结束后再产出，
+                生成中途端点出错时透明地在其他端点上重新生成
+            call: 调用方传入的调用记录，结束后可从中读取用量、重试次数、是否命中缓存等信息
+            coalesce: 是否与进行中的相同请求合并：相同请求只发起一次上游调用，
+                后到的请求先收到已产出的 chunk，再跟随实时 chunk。对冲副本等需要独立上游调用的场景设为 False
+            idempotency_key: 客户端提供的幂等键，提供时按该键（而不是请求内容）合并
+        """
+        cache_key = None
+        if cache and settings.llm_cache_enabled:
+            cache_key = self._cache_key(messages, temperature, response_format, call_site)
+            cached_chunks = await completion_cache.get(cache_key, call_site=call_site)
+            if cached_chunks is not None:
+                if call is not None:
+                    call.cache_hit = True
+                for chunk in cached_chunks:
+                    yield chunk
+                return
+
+        if call is None:
+            call = LLMCall(call_site=call_site, model=self.model_name)
+        upstream = lambda: self._stream_and_record(
+            messages, temperature, response_format, call, cache_key, failover
+        )
+        if not (coalesce and settings.llm_singleflight_enabled):
+            async with aclosing(upstream()) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+            return
+
+        # failover 决定输出是否缓冲，不同的 failover 请求不能共享同一个流
+        if idempotency_key:
+            flight_key = f"idempotency:{call_site}:{idempotency_key}"
+        else:
+            flight_key = f"{cache_key or self._cache_key(messages, temperature, response_format, call_site)}:{int(failover)}"
+        def on_join():
+            call.coalesced = True
+
+        async with aclosing(single_flight.stream(
+            flight_key, upstream, call_site=call_site, on_join=on_join
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def _stream_and_record(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        call: LLMCall,
+        cache_key: str | None,
+        failover: bool,
     ) -> AsyncGenerator[str, None]:
-        """流式聊天完成请求 - 真正的异步实现"""
+        """
+        请求上游并在结束后记录遥测；cache_key 不为空时把完整结束的结果写入补全缓存
+
+        开启录制（settings.llm_cassette_mode=record）时同时把上游调用写入录制文件；
+        开启回放（replay）时从录制文件回放，不访问上游。
+        """
+        call.prompt_tokens_estimate = estimate_messages_tokens(messages)
+        cassette = get_cassette()
+        if cassette is not None and settings.llm_cassette_mode == MODE_REPLAY:
+            source = cassette.replay(
+                messages, temperature, response_format, call, speed=settings.llm_cassette_replay_speed
+            )
+        else:
+            source = self._stream_upstream(messages, temperature, response_format, call, failover=failover)
+            if cassette is not None:
+                source = cassette.record(messages, temperature, response_format, call, source)
+        chunks = []
+        started_at = time.monotonic()
         try:
-            stream = await self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=temperature,
-                stream=True,
-                **({"response_format": response_format} if response_format is not None else {})
+            async with aclosing(source) as upstream:
+                async for chunk in upstream:
+                    if cache_key:
+                        chunks.append(chunk)
+                    yield chunk
+        finally:
+            call.duration = time.monotonic() - started_at
+            self._record_telemetry(call)
+
+        # 只缓存完整结束的结果（被截断或出错的结果不缓存）
+        if cache_key and chunks and call.finish_reason not in (None, "length"):
+            await completion_cache.set(cache_key, chunks)
+
+    async def _stream_upstream(
+        self,
+        messages: list,
+        temperature: float,
+        response_format: dict | None,
+        call: LLMCall,
+        failover: bool = False,
+    ) -> AsyncGenerator[str, None]:
+        """
+        向上游发起流式请求，逐个产出文本片段；正常结束时在 call 中记录 finish_reason 与 usage
+
+        每次尝试从端点池中选择当前最健康的端点；请求先按预算排队（预留估算的 prompt token 与输出额度，
+        完成后按实际用量结算），再经过该端点的自适应限制器。
+        首 token 之前遇到 429/5xx/超时或端点故障时会重试，优先切换到其他端点，没有可用端点时
+        按 Retry-After 或指数退避等待；已经输出内容后出错则直接以错误文本结束。
+        failover=True 时输出先缓冲，正常结束后再产出，因此中途出错也可以在其他端点上整体重试。
+        """
+        pool = get_endpoint_pool()
+        extra_params = {}
+        if response_format is not None:
+            extra_params["response_format"] = response_format
+        if settings.llm_stream_include_usage:
+            extra_params["stream_options"] = {"include_usage": True}
+
+        # 按调用点路由：规则可以指定模型，也可以把调用限定在某个端点上
+        route = resolve_route(call.call_site)
+        pinned = route.endpoint if route else None
+        failed_endpoints = set()
+        while True:
+            endpoint = pool.select(exclude=failed_endpoints, only=pinned)
+            model = (route.model if route else "") or endpoint.model
+            call.endpoint = endpoint.name
+            call.model = model
+            limiter = endpoint.limiter
+            budget = get_budget(model, endpoint.name, endpoint.limits)
+            queued_at = time.monotonic()
+            reservation = await budget.reserve(
+                call.prompt_tokens_estimate + settings.llm_budget_completion_reserve,
+                call_site=call.call_site,
             )
+            try:
+                await limiter.acquire()
+            except BaseException:
+                # 在限制器排队期间被取消（如客户端断开）时退还预留的额度，与请求未被处理时的结算方式一致
+                reservation.settle(0)
+                raise
+            endpoint.outstanding += 1
+            started_at = time.monotonic()
+            call.queue_wait += started_at - queued_at
+            call.chunk_gaps = []
+            last_chunk_at = None
+            outcome = OUTCOME_CANCELLED
+            retry_after = None
+            call.ttft = None
+            call.completion_tokens_estimate = 0
+            buffer = [] if failover else None
+            stream = None
+            try:
+                stream = await endpoint.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    **extra_params
+                )
 
-            async for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None:
+                        call.usage = usage.model_dump(exclude_none=True)
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.finish_reason:
+                        call.finish_reason = choice.finish_reason
+                    if choice.delta.content is not None:
+                        now = time.monotonic()
+                        if call.ttft is None:
+                            call.ttft = now - started_at
+                        else:
+                            call.chunk_gaps.append(now - last_chunk_at)
+                        last_chunk_at = now
+                        call.completion_tokens_estimate += estimate_tokens(choice.delta.content)
+                        if buffer is not None:
+                            buffer.append(choice.delta.content)
+                        else:
+                            yield choice.delta.content
 
-        except Exception as e:
-            yield f"错误: {str(e)}"
+                call.finish_reason = call.finish_reason or "stop"
+                outcome = OUTCOME_SUCCESS
+                pool.record_success(endpoint, call.ttft)
+
+            except Exception as e:
+                outcome, retry_after = classify_error(e)
+                endpoint_failure = is_endpoint_failure(e, outcome)
+                if endpoint_failure:
+                    pool.record_failure(endpoint, retry_after)
+                    failed_endpoints.add(endpoint.name)
+                switch = endpoint_failure and pool.has_alternative(failed_endpoints, only=pinned)
+                restartable = call.ttft is None or buffer is not None
+                retryable = restartable and call.retries < settings.llm_max_retries and \
+                    (outcome == OUTCOME_OVERLOAD or switch)
+                metrics.inc("llm_upstream_errors_total", call_site=call.call_site, outcome=outcome, retried=retryable)
+                if not retryable:
+                    call.error = str(e)
+                    yield f"错误: {str(e)}"
+                    return
+            finally:
+                endpoint.outstanding -= 1
+                if stream is not None:
+                    # 消费方提前退出时关闭 HTTP 响应，让上游尽快停止生成
+                    await stream.close()
+                limiter.release(outcome, ttft=call.ttft, retry_after=retry_after)
+                if outcome == OUTCOME_SUCCESS or call.ttft is not None:
+                    reservation.settle(call.total_tokens)
+                else:
+                    # 请求未被上游处理，退还 token 额度（请求次数不退还）
+                    reservation.settle(0)
+
+            if outcome == OUTCOME_SUCCESS:
+                for content in buffer or ():
+                    yield content
+                return
+
+            call.retries += 1
+            call.finish_reason = None
+            call.usage = None
+            if switch:
+                # 切换到其他端点，无需等待
+                metrics.inc("llm_endpoint_failovers_total", call_site=call.call_site, endpoint=endpoint.name)
+                print(f"[{call.call_site}] 端点 {endpoint.name} 失败，切换端点进行第 {call.retries}/{settings.llm_max_retries} 次重试")
+                continue
+            delay = retry_after if retry_after is not None else settings.llm_retry_backoff * (2 ** (call.retries - 1))
+            print(f"[{call.call_site}] 上游过载，{delay:.1f}s 后进行第 {call.retries}/{settings.llm_max_retries} 次重试")
+            await asyncio.sleep(min(delay, settings.llm_max_retry_after))
+
+    @staticmethod
+    def _record_telemetry(call: LLMCall) -> None:
+        """
+        记录一次上游调用的遥测数据（命中补全缓存的调用不经过上游，不在此记录）
+
+        直方图：排队等待、首 token 延迟、chunk 间隔、总耗时、prompt/completion token 数、生成速度；
+        计数器：按结束原因统计的调用数、重试次数、prompt/缓存命中/completion token 总数，
+        被取消的调用数及其已消耗的 token 估算值，按模型单价估算的费用。
+        """
+        labels = {"call_site": call.call_site, "model": call.model}
+        metrics.inc("llm_calls_total", call_site=call.call_site, model=call.model, finish_reason=call.status)
+        if call.retries:
+            metrics.inc("llm_call_retries_total", call.retries, **labels)
+        metrics.observe("llm_queue_wait_seconds", call.queue_wait, **labels)
+        metrics.observe("llm_call_duration_seconds", call.duration, **labels)
+        if call.ttft is not None:
+            metrics.observe("llm_ttft_seconds", call.ttft, **labels)
+        if call.chunk_gaps:
+            metrics.observe_many("llm_inter_chunk_seconds", call.chunk_gaps, **labels)
+        if call.tokens_per_second is not None:
+            metrics.observe("llm_tokens_per_second", call.tokens_per_second, buckets=RATE_BUCKETS, **labels)
+        if call.status == "cancelled":
+            # 被取消的调用（客户端断开、校验提前终止、对冲落败）：已开始输出的调用按估算值统计浪费的 token
+            stage = "streaming" if call.ttft is not None else "waiting"
+            metrics.inc("llm_cancelled_calls_total", stage=stage, **labels)
+            if call.ttft is not None:
+                metrics.inc("llm_cancelled_tokens_total",
+                            call.prompt_tokens_estimate + call.completion_tokens_estimate, **labels)
+
+        cost = estimate_cost(
+            call.model,
+            call.prompt_tokens or call.prompt_tokens_estimate,
+            call.completion_tokens,
+        )
+        if cost is not None:
+            metrics.inc("llm_cost_total", cost, **labels)
+
+        if not call.usage:
+            return
+        prompt_tokens = call.prompt_tokens
+        cached_tokens = call.cached_tokens
+        completion_tokens = call.completion_tokens
+        metrics.observe("llm_prompt_tokens", prompt_tokens, buckets=TOKEN_BUCKETS, **labels)
+        metrics.observe("llm_completion_tokens", completion_tokens, buckets=TOKEN_BUCKETS, **labels)
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, **labels)
+        metrics.inc("llm_cached_prompt_tokens_total", cached_tokens, **labels)
+        metrics.inc("llm_completion_tokens_total", completion_tokens, **labels)
+        if prompt_tokens:
+            logger.debug("[%s] prompt %d tokens，前缀缓存命中 %d tokens（%d%%）",
+                         call.call_site, prompt_tokens, cached_tokens, cached_tokens * 100 // prompt_tokens)
 
     async def _collect_stream_text(
         self,
         messages: list,
         temperature: float = 0.7,
         response_format: dict | None = None,
+        cache: bool = False,
+        call_site: str = "default",
     ) -> str:
-        """收集流式返回的文本到一个完整字符串"""
+        """收集流式返回的文本到一个完整字符串（非流式使用，端点中途出错时自动在其他端点重试）"""
         full_content = ""
         async for chunk in self.stream_chat_completion(
             messages,
             temperature=temperature,
             response_format=response_format,
+            cache=cache,
+            call_site=call_site,
+            failover=True,
         ):
             full_content += chunk
         return full_content
@@ -87,116 +409,657 @@ class OpenAIService:
         response_format: dict | None = None,
         log_prefix: str = "",
         raise_on_fail: bool = True,
+        cache: bool = False,
+        call_site: str = "default",
     ) -> str:
         """
         通用的带 JSON 结构校验与重试的生成函数。
 
-        返回：通过校验的 full_content；如果 raise_on_fail=False，则在多次失败后返回最后一次内容。
+        返回：通过校验的 JSON 文本（经过本地修复时为修复后的文本）；
+        如果 raise_on_fail=False，则在多次失败后返回最后一次内容。
+        """
+        data, full_content = await self._generate_json(
+            messages,
+            schema,
+            max_retries=max_retries,
+            temperature=temperature,
+            response_format=response_format,
+            log_prefix=log_prefix,
+            raise_on_fail=raise_on_fail,
+            cache=cache,
+            call_site=call_site,
+        )
+        if data is None:
+            return full_content
+        return json.dumps(data, ensure_ascii=False)
+
+    async def _json_attempt(
+        self,
+        messages: list,
+        schema: str | Dict[str, Any],
+        temperature: float,
+        response_format: dict | None,
+        cache: bool,
+        call_site: str,
+        probe: AttemptProbe | None = None,
+        coalesce: bool = True,
+    ) -> tuple[bool, tuple]:
+        """
+        生成并校验一次 JSON 输出
+
+        Returns:
+            (是否有效, (错误信息, 流式校验错误, 解析后的数据, 原始输出))
+        """
+        repair_enabled = settings.llm_json_repair
+        # strict json_schema 把列表模板包裹为 {"items": [...]}：按包裹后的模板校验，通过后取出 items
+        wrapped_schema = wrapped_list_template(schema, response_format)
+        check_schema = wrapped_schema or schema
+        validator = IncrementalJsonValidator(check_schema, lenient=repair_enabled)
+        parts = []
+        early_error = None
+        call = LLMCall(call_site=call_site, model=self.model_name)
+        async with aclosing(self.stream_chat_completion(
+            messages,
+            temperature=temperature,
+            response_format=response_format,
+            cache=cache,
+            call_site=call_site,
+            call=call,
+            coalesce=coalesce,
+        )) as stream:
+            async for chunk in stream:
+                if probe is not None:
+                    probe.mark_first_token()
+                parts.append(chunk)
+                early_error = validator.feed(chunk)
+                if early_error:
+                    # 退出 async with 时关闭生成器，连带关闭上游 HTTP 流
+                    break
+        full_content = "".join(parts)
+        if probe is not None:
+            probe.from_cache = call.cache_hit or call.coalesced
+
+        data = None
+        if early_error:
+            isok, error_msg = False, f"流式校验提前终止: {early_error}"
+            metrics.inc("llm_json_early_abort_total", call_site=call_site)
+        else:
+            isok, error_msg, data = parse_and_check_json(full_content.strip(), check_schema)
+            if isok and wrapped_schema is not None:
+                data = data["items"]
+            if not isok and repair_enabled:
+                # 按原模板修复，包裹对象由 repair_json 的 unwrap 步骤展开
+                repaired, fixes = repair_json(full_content, schema)
+                if repaired is not None:
+                    isok, error_msg, data = True, "", repaired
+                    for fix in fixes:
+                        metrics.inc("llm_json_repairs_total", call_site=call_site, fix=fix)
+        return isok, (error_msg, early_error, data, full_content)
+
+    async def _generate_json(
+        self,
+        messages: list,
+        schema: str | Dict[str, Any],
+        max_retries: int = 3,
+        temperature: float = 0.7,
+        response_format: dict | None = None,
+        log_prefix: str = "",
+        raise_on_fail: bool = True,
+        cache: bool = False,
+        call_site: str = "default",
+        hedge: bool = False,
+    ) -> tuple[Any, str]:
+        """
+        生成 JSON 并按模板校验，返回 (解析后的数据, 原始输出)，避免调用方再次解析。
+
+        - 生成过程中使用 IncrementalJsonValidator 逐块校验，一旦输出不可能通过校验
+          （如非 JSON 前缀、类型错误、对象闭合时缺键）立即取消上游请求并马上重试
+        - 校验失败时先用 repair_json 在本地修复（代码块标记、尾随逗号、截断、外层包裹对象），
+          修复成功则不再重试
+        - settings.llm_strict_json_schema 开启时，根据模板自动生成 strict json_schema 的 response_format
+        - cache=True 时优先使用补全缓存；缓存中的结果未通过校验会被删除，重试时重新请求上游
+        - hedge=True 时每次尝试以对冲方式执行（见 llm_hedge.run_hedged），用于扇出调用降低尾延迟
+
+        如果 raise_on_fail=False，多次失败后数据为 None，返回最后一次原始输出。
         """
         attempt = 0
         last_error_msg = ""
+        if settings.llm_strict_json_schema:
+            response_format = build_response_format(schema, name=call_site.replace("/", "_"))
 
-        while True:
-            full_content = await self._collect_stream_text(
-                messages,
-                temperature=temperature,
-                response_format=response_format,
+        async def attempt_once(probe: AttemptProbe | None = None):
+            # 重试与对冲副本需要独立的上游调用，不与进行中的相同请求合并（否则会拿到同一份输出）
+            coalesce = attempt == 0 and not (probe is not None and probe.hedge)
+            return await self._json_attempt(
+                messages, schema, temperature, response_format, cache, call_site, probe, coalesce
             )
 
-            isok, error_msg = check_json(str(full_content), schema)
+        while True:
+            if hedge and settings.llm_hedge_enabled:
+                isok, (error_msg, early_error, data, full_content) = await run_hedged(call_site, attempt_once)
+            else:
+                isok, (error_msg, early_error, data, full_content) = await attempt_once()
             if isok:
-                return full_content
+                metrics.inc("llm_json_generations_total", call_site=call_site, attempts=attempt + 1)
+                return data, full_content
+
+            if cache and settings.llm_cache_enabled:
+                await completion_cache.invalidate(self._cache_key(messages, temperature, response_format, call_site))
 
             last_error_msg = error_msg
             prefix = f"{log_prefix} " if log_prefix else ""
 
             if attempt >= max_retries:
                 print(f"{prefix}check_json 校验失败，已达到最大重试次数({max_retries})：{last_error_msg}")
+                metrics.inc("llm_json_failures_total", call_site=call_site)
                 if raise_on_fail:
                     raise Exception(f"{prefix}check_json 校验失败: {last_error_msg}")
                 # 不抛异常，返回最后一次内容（保持原有行为）
-                return full_content
+                return None, full_content
 
             attempt += 1
+            metrics.inc("llm_json_retries_total", call_site=call_site)
             print(f"{prefix}check_json 校验失败，进行第 {attempt}/{max_retries} 次重试：{last_error_msg}")
-            await asyncio.sleep(0.5)
+            if not early_error:
+                await asyncio.sleep(0.5)
 
-    async def generate_content_for_outline(self, outline: Dict[str, Any], project_overview: str = "") -> Dict[str, Any]:
-        """为目录结构生成内容"""
+    async def generate_content_for_outline(
+        self,
+        outline: Dict[str, Any],
+        project_overview: str = "",
+        concurrency: int | None = None,
+    ) -> Dict[str, Any]:
+        """为目录结构生成内容（叶子章节按并发上限并行生成）"""
         try:
-            if not isinstance(outline, dict) or 'outline' not in outline:
-                raise Exception("无效的outline数据格式")
-            
-            # 深拷贝outline数据
-            import copy
-            result_outline = copy.deepcopy(outline)
-            
-            # 递归处理目录
-            await self._process_outline_recursive(result_outline['outline'], [], project_overview)
-            
+            result_outline = None
+            async for event in self.generate_content_for_outline_stream(outline, project_overview, concurrency):
+                if event['status'] == 'completed':
+                    result_outline = event['outline']
             return result_outline
-            
+
         except Exception as e:
             raise Exception(f"处理过程中发生错误: {str(e)}")
-    
-    async def _process_outline_recursive(self, chapters: list, parent_chapters: list = None, project_overview: str = ""):
-        """递归处理章节列表"""
+
+    @staticmethod
+    def _collect_leaf_chapters(chapters: list, parent_chapters: list = None) -> List[Dict[str, Any]]:
+        """
+        按目录顺序收集所有叶子章节
+
+        Returns:
+            列表元素为 {'chapter': 章节dict(原对象引用), 'parents': 上级章节列表, 'siblings': 同级章节列表}
+        """
+        leaves = []
         for chapter in chapters:
-            chapter_id = chapter.get('id', 'unknown')
-            chapter_title = chapter.get('title', '未命名章节')
-            
-            # 检查是否为叶子节点
-            is_leaf = 'children' not in chapter or not chapter.get('children', [])
-            
             # 准备当前章节信息
             current_chapter_info = {
-                'id': chapter_id,
-                'title': chapter_title,
+                'id': chapter.get('id', 'unknown'),
+                'title': chapter.get('title', '未命名章节'),
                 'description': chapter.get('description', '')
             }
-            
-            # 构建完整的上级章节列表
-            current_parent_chapters = []
-            if parent_chapters:
-                current_parent_chapters.extend(parent_chapters)
-            current_parent_chapters.append(current_chapter_info)
-            
-            if is_leaf:
-                # 为叶子节点生成内容，传递同级章节信息
-                content = ""
-                async for chunk in self._generate_chapter_content(
-                    chapter, 
-                    current_parent_chapters[:-1],  # 上级章节列表（排除当前章节）
-                    chapters,  # 同级章节列表
-                    project_overview
-                ):
-                    content += chunk
-                if content:
-                    chapter['content'] = content
+
+            # 检查是否为叶子节点
+            if 'children' not in chapter or not chapter.get('children', []):
+                leaves.append({
+                    'chapter': chapter,
+                    'parents': list(parent_chapters or []),
+                    'siblings': chapters,
+                })
             else:
                 # 递归处理子章节
-                await self._process_outline_recursive(chapter['children'], current_parent_chapters, project_overview)
-    
-    async def _generate_chapter_content(self, chapter: dict, parent_chapters: list = None, sibling_chapters: list = None, project_overview: str = "") -> AsyncGenerator[str, None]:
+                current_parent_chapters = list(parent_chapters or []) + [current_chapter_info]
+                leaves.extend(OpenAIService._collect_leaf_chapters(chapter['children'], current_parent_chapters))
+        return leaves
+
+    async def generate_content_for_outline_stream(
+        self,
+        outline: Dict[str, Any],
+        project_overview: str = "",
+        concurrency: int | None = None,
+        draft: bool = False,
+        requirements: str = "",
+        tender_text: str = "",
+        completed_contents: Dict[int, str] | None = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        为单个章节流式生成内容
+        全量生成目录内容，并以事件流的形式报告进度
+
+        叶子章节放入工作队列，由固定数量的 worker 拉取：任一章节完成后 worker 立即拉取下一个，
+        没有批次屏障，总耗时约为 (叶子数 / 并发数) × 平均章节耗时。
+        生成结果写回深拷贝后的目录中对应章节，因此最终结果保持目录顺序。
+
+        draft=True 时分两个阶段：先以调用点 chapter-draft（在模型路由中指向快速的小模型）生成全部章节的草稿，
+        产出 draft_completed 事件供预览；随后以调用点 chapter 逐章升级为正式内容，升级失败的章节保留草稿。
+        两个阶段的耗时、token 用量与费用在 completed 事件的 stages 中对比。
+        chapter-draft 与 chapter 路由到同一个模型时跳过草稿阶段，started 事件的 draft_skipped 给出原因。
+
+        每个章节携带的项目资料控制在 settings.chapter_context_max_tokens 之内（见 _chapter_context），
+        与携带完整项目概述相比节省或补充的 prompt token 分别记入阶段统计的 context_tokens_saved、context_tokens_added。
+
+        completed_contents 为已生成的叶子章节内容（按叶子章节在目录中的顺序编号），这些章节直接回填而不再生成，
+        用于中断后继续生成（见 content_jobs）；进度中的 completed 计数包含这些章节。
+
+        Yields:
+            {'status': 'started', 'total': n, 'concurrency': c, 'draft': bool, 'draft_skipped': 跳过草稿阶段的原因或 None, 'resumed': k}
+            {'status': 'chapter_started', 'phase': 'draft'|'final', 'index': i, 'chapter_id': ..., 'title': ...}
+            {'status': 'chapter_completed', 'phase': ..., 'index': i, 'chapter_id': ..., 'content': ..., 'completed': k, 'total': n}
+            {'status': 'chapter_failed', 'phase': ..., 'index': i, 'chapter_id': ..., 'message': ..., 'completed': k, 'total': n}
+            {'status': 'draft_completed', 'outline': {...}, 'failed': [...], 'stage': {...}}  （仅 draft=True）
+            {'status': 'completed', 'outline': {...}, 'failed': [...], 'elapsed': 秒, 'stages': {'final': {...}, 'draft': {...}}}
+        """
+        if not isinstance(outline, dict) or 'outline' not in outline:
+            raise Exception("无效的outline数据格式")
+
+        result_outline = copy.deepcopy(outline)
+        leaves = self._collect_leaf_chapters(result_outline['outline'])
+        total = len(leaves)
+        concurrency = max(1, min(concurrency or settings.content_generation_concurrency,
+                                 settings.content_generation_max_concurrency, total or 1))
+
+        started_at = time.monotonic()
+        completed_contents = completed_contents or {}
+        for index, content in completed_contents.items():
+            if 0 <= index < total:
+                leaves[index]['chapter']['content'] = content
+        pending = [index for index in range(total) if index not in completed_contents]
+
+        # chapter-draft 与 chapter 路由到同一个模型（如未配置 chapter-draft 路由）时草稿没有预览价值，
+        # 只会让每个章节生成两次，此时跳过草稿阶段并在 started 事件中说明
+        draft_skipped = None
+        if draft and self._route_model("chapter-draft") == self._route_model("chapter"):
+            draft_skipped = f"chapter-draft 与 chapter 路由到同一模型（{self._route_model('chapter')}），已跳过草稿阶段"
+            print(draft_skipped)
+            draft = False
+
+        yield {'status': 'started', 'total': total, 'concurrency': concurrency, 'draft': draft,
+               'draft_skipped': draft_skipped, 'resumed': total - len(pending)}
+
+        stages = {}
+        if draft:
+            stage = stages['draft'] = self._new_stage_stats("chapter-draft")
+            async for event in self._generate_leaves_stream(
+                    leaves, project_overview, concurrency, stage, 'draft', requirements, tender_text, pending):
+                yield event
+            yield {
+                'status': 'draft_completed',
+                'outline': copy.deepcopy(result_outline),
+                'failed': stage['failed'],
+                'stage': stage,
+            }
+
+        stage = stages['final'] = self._new_stage_stats("chapter")
+        async for event in self._generate_leaves_stream(
+                leaves, project_overview, concurrency, stage, 'final', requirements, tender_text, pending):
+            yield event
+
+        yield {
+            'status': 'completed',
+            'outline': result_outline,
+            # 草稿模式下升级失败的章节仍保留草稿内容，只有两个阶段都失败的章节才算失败
+            'failed': [cid for cid in stage['failed'] if not draft or cid in stages['draft']['failed']],
+            'elapsed': round(time.monotonic() - started_at, 3),
+            'stages': stages,
+        }
+
+    def _new_stage_stats(self, call_site: str) -> Dict[str, Any]:
+        """一个生成阶段的统计：耗时、章节平均耗时、token 用量与按单价估算的费用"""
+        return {
+            'call_site': call_site,
+            'model': self._route_model(call_site),
+            'chapters': 0,
+            'failed': [],
+            'elapsed': 0.0,
+            'avg_chapter_seconds': None,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'context_tokens_saved': 0,
+            'context_tokens_added': 0,
+            'cost': None,
+        }
+
+    async def _generate_leaves_stream(
+        self,
+        leaves: List[Dict[str, Any]],
+        project_overview: str,
+        concurrency: int,
+        stage: Dict[str, Any],
+        phase: str,
+        requirements: str = "",
+        tender_text: str = "",
+        pending: List[int] | None = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        以固定数量的 worker 并发生成叶子章节（调用点为 stage['call_site']），产出章节事件并填充阶段统计
+
+        pending 为需要生成的叶子章节编号，默认全部生成；其余章节视为已完成，计入进度。
+        """
+        total = len(leaves)
+        if pending is None:
+            pending = list(range(total))
+        call_site = stage['call_site']
+        started_at = time.monotonic()
+        durations = []
+
+        work_queue: asyncio.Queue = asyncio.Queue()
+        for index in pending:
+            work_queue.put_nowait(index)
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    index = work_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                leaf = leaves[index]
+                chapter = leaf['chapter']
+                await events.put({
+                    'status': 'chapter_started',
+                    'index': index,
+                    'chapter_id': chapter.get('id', 'unknown'),
+                    'title': chapter.get('title', '未命名章节'),
+                })
+                call = LLMCall(call_site=call_site, model=stage['model'])
+                context_stats = {}
+                try:
+                    parts = []
+                    async for chunk in self._generate_chapter_content(
+                        chapter,
+                        leaf['parents'],  # 上级章节列表（排除当前章节）
+                        leaf['siblings'],  # 同级章节列表
+                        project_overview,
+                        call_site=call_site,
+                        call=call,
+                        requirements=requirements,
+                        tender_text=tender_text,
+                        context_stats=context_stats,
+                    ):
+                        parts.append(chunk)
+                    content = "".join(parts)
+                    if content.startswith("错误: "):
+                        raise Exception(content[len("错误: "):])
+                    if content:
+                        chapter['content'] = content
+                    await events.put({'status': 'chapter_completed', 'index': index, 'content': content})
+                except Exception as e:
+                    await events.put({'status': 'chapter_failed', 'index': index, 'message': str(e)})
+                finally:
+                    stage['context_tokens_saved'] += context_stats.get('saved_tokens', 0)
+                    stage['context_tokens_added'] += context_stats.get('added_tokens', 0)
+                    if not call.cache_hit and not call.coalesced:
+                        durations.append(call.duration)
+                        prompt_tokens = call.prompt_tokens or call.prompt_tokens_estimate
+                        stage['prompt_tokens'] += prompt_tokens
+                        stage['completion_tokens'] += call.completion_tokens
+                        cost = estimate_cost(call.model, prompt_tokens, call.completion_tokens)
+                        if cost is not None:
+                            stage['cost'] = round((stage['cost'] or 0) + cost, 6)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            completed = total - len(pending)
+            while completed < total:
+                event = await events.get()
+                event['phase'] = phase
+                if event['status'] != 'chapter_started':
+                    completed += 1
+                    chapter = leaves[event['index']]['chapter']
+                    event['chapter_id'] = chapter.get('id', 'unknown')
+                    event['completed'] = completed
+                    event['total'] = total
+                    if event['status'] == 'chapter_failed':
+                        stage['failed'].append(event['chapter_id'])
+                    else:
+                        stage['chapters'] += 1
+                yield event
+        finally:
+            # 消费方提前退出（如客户端断开）时取消剩余 worker
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            stage['elapsed'] = round(time.monotonic() - started_at, 3)
+            if durations:
+                stage['avg_chapter_seconds'] = round(sum(durations) / len(durations), 3)
+
+    def _analysis_chunk_tokens(self, system_prompt: str, call_site: str = "default") -> int:
+        """按分块调用点路由到的模型的上下文长度计算分块分析时每个分块的 token 上限"""
+        model = self._route_model(call_site)
+        limits = config_manager.get_model_limits(model)
+        context_tokens = get_model_context_tokens(model, int(limits.get('context_tokens') or 0))
+        budget = int(context_tokens * settings.analysis_chunk_context_ratio) - estimate_tokens(system_prompt)
+        return max(settings.analysis_min_chunk_tokens, min(budget, settings.analysis_max_chunk_tokens))
+
+    async def analyze_document_stream(
+        self,
+        system_prompt: str,
+        file_content: str,
+        subject: str,
+        call_site: str,
+        mode: str = "auto",
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        分析招标文件，以事件流的形式返回结果
+
+        文档不超过单个分块上限时（或 mode="single"）整篇一次分析；否则（或 mode="chunked"）按页和表格边界切分，
+        各分块并发提取（map），完成一个报告一个，最后流式合并去重（reduce）。
 
         Args:
-            chapter: 章节数据
-            parent_chapters: 上级章节列表，每个元素包含章节id、标题和描述
-            sibling_chapters: 同级章节列表，避免内容重复
-            project_overview: 项目概述信息，提供项目背景和要求
+            system_prompt: 提取用的系统提示词
+            subject: 提取内容的名称，如“项目概述”“技术评分要求”
+            call_site: 调用点名称，分块提取与合并分别使用 {call_site}-map / {call_site}-reduce
 
         Yields:
-            生成的内容流
+            {'status': 'map_started', 'total': n, 'chunk_tokens': 上限}
+            {'status': 'map_completed', 'index': i, 'completed': k, 'total': n, 'content': 分块提取结果}
+            {'status': 'map_failed', 'index': i, 'completed': k, 'total': n, 'message': ...}
+            {'chunk': 文本}  最终结果（单次分析或合并阶段）的流式片段
         """
+        chunk_tokens = self._analysis_chunk_tokens(system_prompt, f"{call_site}-map")
+        chunks = [file_content]
+        if mode != "single" and (mode == "chunked" or estimate_tokens(file_content) > chunk_tokens):
+            chunks = split_document(file_content, chunk_tokens)
+
+        if len(chunks) <= 1:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"请分析以下招标文件内容，提取{subject}信息：\n\n{file_content}"}
+            ]
+            # 同一份招标文件重复分析时直接命中缓存
+            async for chunk in self.stream_chat_completion(messages, temperature=0.3, cache=True, call_site=call_site):
+                yield {'chunk': chunk}
+            return
+
+        total = len(chunks)
+        yield {'status': 'map_started', 'total': total, 'chunk_tokens': chunk_tokens}
+
+        semaphore = asyncio.Semaphore(max(1, settings.analysis_map_concurrency))
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def map_chunk(index: int, chunk: str):
+            async with semaphore:
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": (
+                        f"以下是招标文件的第 {index + 1}/{total} 部分（其余部分会单独分析），请提取其中的{subject}信息。"
+                        f"如果本部分没有相关内容，直接返回“无”：\n\n{chunk}"
+                    )}
+                ]
+                try:
+                    content = await self._collect_stream_text(
+                        messages, temperature=0.3, cache=True, call_site=f"{call_site}-map"
+                    )
+                    if content.startswith("错误: "):
+                        raise Exception(content[len("错误: "):])
+                    await events.put({'status': 'map_completed', 'index': index, 'content': content})
+                except Exception as e:
+                    await events.put({'status': 'map_failed', 'index': index, 'message': str(e)})
+
+        tasks = [asyncio.create_task(map_chunk(i, chunk)) for i, chunk in enumerate(chunks)]
+        partials: List[str | None] = [None] * total
         try:
-            chapter_id = chapter.get('id', 'unknown')
-            chapter_title = chapter.get('title', '未命名章节')
-            chapter_description = chapter.get('description', '')
+            for completed in range(1, total + 1):
+                event = await events.get()
+                event['completed'] = completed
+                event['total'] = total
+                if event['status'] == 'map_completed':
+                    partials[event['index']] = event['content']
+                yield event
+        finally:
+            # 消费方提前退出（如客户端断开）时取消剩余分块
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        findings = [(i, text.strip()) for i, text in enumerate(partials)
+                    if text and text.strip() and text.strip() != "无"]
+        if not findings:
+            yield {'chunk': f"错误: 未能从招标文件中提取到{subject}信息"}
+            return
 
-            # 构建提示词
-            system_prompt = """你是一个专业的标书编写专家，负责为投标文件的技术标部分生成具体内容。
+        # 合并输入超过上限时先分组合并，直到能放进一次请求
+        while len(findings) > 1 and sum(estimate_tokens(text) for _, text in findings) > chunk_tokens:
+            groups, group, group_tokens = [], [], 0
+            for item in findings:
+                item_tokens = estimate_tokens(item[1])
+                if group and group_tokens + item_tokens > chunk_tokens:
+                    groups.append(group)
+                    group, group_tokens = [], 0
+                group.append(item)
+                group_tokens += item_tokens
+            groups.append(group)
+            if len(groups) == len(findings):
+                break
+            merged = await asyncio.gather(*[
+                self._collect_stream_text(
+                    self._analysis_reduce_messages(system_prompt, group, subject),
+                    temperature=0.3, cache=True, call_site=f"{call_site}-reduce",
+                )
+                for group in groups
+            ])
+            findings = list(enumerate(merged))
+
+        async for chunk in self.stream_chat_completion(
+            self._analysis_reduce_messages(system_prompt, findings, subject),
+            temperature=0.3, cache=True, call_site=f"{call_site}-reduce",
+        ):
+            yield {'chunk': chunk}
+
+    @staticmethod
+    def _analysis_reduce_messages(system_prompt: str, findings: List[tuple], subject: str) -> list:
+        """构建合并分块提取结果的消息"""
+        parts = "\n\n".join(f"### 第 {index + 1} 部分的提取结果\n{text}" for index, text in findings)
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": (
+                f"以下是从同一份招标文件的不同部分分别提取的{subject}信息。请将它们合并为一份完整的结果：\n"
+                f"1. 去除重复内容，同一项在多个部分出现时合并为一条，保留最完整、最准确的描述\n"
+                f"2. 不要遗漏任何部分中的有效信息，不要添加原文没有的内容\n"
+                f"3. 按上述输出格式要求直接返回合并后的结果\n\n{parts}"
+            )}
+        ]
+
+    def compile_chapter_batch(self, outline: Dict[str, Any], project_overview: str = "",
+                              requirements: str = "", tender_text: str = "") -> tuple[List[Dict], List[Dict]]:
+        """
+        将目录中所有叶子章节的生成请求编译为 OpenAI Batch 输入行（与流式生成使用相同的提示词与章节上下文检索）
+
+        Returns:
+            (Batch 请求行列表, 叶子章节信息列表 [{'custom_id', 'chapter_id', 'title'}])
+        """
+        if not isinstance(outline, dict) or 'outline' not in outline:
+            raise Exception("无效的outline数据格式")
+        requests, leaves = [], []
+        for index, leaf in enumerate(self._collect_leaf_chapters(outline['outline'])):
+            chapter = leaf['chapter']
+            custom_id = f"chapter-{index}"
+            selection = self._chapter_context(chapter, leaf['parents'], project_overview, requirements, tender_text)
+            if selection is not None:
+                metrics.inc("chapter_context_tokens_saved_total", selection.saved_tokens, call_site="chapter-batch")
+                metrics.inc("chapter_context_tokens_added_total", selection.added_tokens, call_site="chapter-batch")
+            requests.append({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self._route_model("chapter"),
+                    "messages": self._build_chapter_messages(
+                        chapter, leaf['parents'], leaf['siblings'],
+                        selection.overview if selection is not None else project_overview,
+                        selection.text if selection is not None else None,
+                    ),
+                    "temperature": 0.7,
+                },
+            })
+            leaves.append({
+                'custom_id': custom_id,
+                'chapter_id': chapter.get('id', 'unknown'),
+                'title': chapter.get('title', '未命名章节'),
+            })
+        return requests, leaves
+
+    @staticmethod
+    def apply_chapter_batch_results(
+        outline: Dict[str, Any],
+        results: Dict[str, tuple],
+    ) -> tuple[Dict[str, Any], List[str]]:
+        """
+        将 Batch 结果回填到目录的叶子章节中（custom_id 与 compile_chapter_batch 的编号一致）
+
+        Returns:
+            (回填后的目录副本, 失败的章节 ID 列表)
+        """
+        result_outline = copy.deepcopy(outline)
+        failed = []
+        for index, leaf in enumerate(OpenAIService._collect_leaf_chapters(result_outline['outline'])):
+            chapter = leaf['chapter']
+            content, error = results.get(f"chapter-{index}", (None, "缺少结果"))
+            if error is None and content:
+                chapter['content'] = content
+            else:
+                failed.append(chapter.get('id', 'unknown'))
+        return result_outline, failed
+
+    @staticmethod
+    def _chapter_context(chapter: dict, parent_chapters: list = None, project_overview: str = "",
+                         requirements: str = "", tender_text: str = "") -> ContextSelection | None:
+        """
+        为章节检索相关的项目资料
+
+        按章节标题、描述与上级章节从资料中检索最相关的段落，控制在 settings.chapter_context_max_tokens 之内：
+        项目概述不超过预算时完整保留，只用剩余预算补充评分要求、招标文件中的相关段落；超过时从全部资料中检索。
+        没有可补充的段落时返回 None，按原方式携带完整的项目概述。
+        检索到的段落放在各章节共享的前缀之后（见 _build_chapter_messages）；settings.chapter_context_retrieval 默认关闭。
+        """
+        if not settings.chapter_context_retrieval or not (project_overview or requirements or tender_text):
+            return None
+        context = get_project_context(
+            project_overview or "", requirements or "", tender_text or "", settings.chapter_context_passage_tokens
+        )
+        budget = settings.chapter_context_max_tokens
+        if context.full_tokens <= budget and context.supplement_tokens == 0:
+            return None
+        selection = context.select(chapter_query(chapter, parent_chapters), budget)
+        if context.full_tokens <= budget and selection.passages == 0:
+            return None
+        return selection
+
+    @staticmethod
+    def _build_chapter_messages(chapter: dict, parent_chapters: list = None, sibling_chapters: list = None, project_overview: str = "", retrieved_context: str | None = None) -> list:
+        """
+        构建单个章节内容生成的消息（流式生成与批量生成共用）
+
+        Args:
+            chapter: 章节数据
+            parent_chapters: 上级章节列表，每个元素包含章节id、标题和描述
+            sibling_chapters: 同级章节列表，避免内容重复
+            project_overview: 项目概述信息，提供项目背景和要求（各章节相同，放在最前面；检索时概述超过预算则为空）
+            retrieved_context: 检索得到的与本章节相关的项目资料，放在章节层级信息之后，不影响各章节共享的前缀
+        """
+        chapter_id = chapter.get('id', 'unknown')
+        chapter_title = chapter.get('title', '未命名章节')
+        chapter_description = chapter.get('description', '')
+
+        # 构建提示词
+        system_prompt = """你是一个专业的标书编写专家，负责为投标文件的技术标部分生成具体内容。
 
 要求：
 1. 内容要专业、准确，与章节标题和描述保持一致
@@ -207,44 +1070,86 @@ class OpenAIService:
 6. 直接返回章节内容，不生成标题，不要任何额外说明或格式标记
 """
 
-            # 构建上下文信息
-            context_info = ""
-            
-            # 上级章节信息
-            if parent_chapters:
-                context_info += "上级章节信息：\n"
-                for parent in parent_chapters:
-                    context_info += f"- {parent['id']} {parent['title']}\n  {parent['description']}\n"
-            
-            # 同级章节信息（排除当前章节）
-            if sibling_chapters:
-                context_info += "同级章节信息（请避免内容重复）：\n"
-                for sibling in sibling_chapters:
-                    if sibling.get('id') != chapter_id:  # 排除当前章节
-                        context_info += f"- {sibling.get('id', 'unknown')} {sibling.get('title', '未命名')}\n  {sibling.get('description', '')}\n"
-
-            # 构建用户提示词
-            project_info = ""
-            if project_overview.strip():
-                project_info = f"项目概述信息：\n{project_overview}\n\n"
-            
-            user_prompt = f"""请为以下标书章节生成具体内容：
+        # 构建上下文信息
+        context_info = ""
+        
+        # 上级章节信息
+        if parent_chapters:
+            context_info += "上级章节信息：\n"
+            for parent in parent_chapters:
+                context_info += f"- {parent['id']} {parent['title']}\n  {parent['description']}\n"
+        
+        # 同级章节信息（排除当前章节）
+        if sibling_chapters:
+            context_info += "同级章节信息（请避免内容重复）：\n"
+            for sibling in sibling_chapters:
+                if sibling.get('id') != chapter_id:  # 排除当前章节
+                    context_info += f"- {sibling.get('id', 'unknown')} {sibling.get('title', '未命名')}\n  {sibling.get('description', '')}\n"
 
-{project_info}{context_info if context_info else ''}当前章节信息：
+        # 构建用户提示词：项目概述放在最前面，所有章节共享相同前缀（便于前缀缓存命中），
+        # 随章节变化的层级信息、检索到的资料与当前章节信息放在最后
+        project_info = ""
+        if project_overview.strip():
+            project_info = f"项目概述信息：\n{project_overview}\n\n"
+        retrieved_info = ""
+        if retrieved_context:
+            retrieved_info = f"与本章节相关的项目资料（从项目资料中检索）：\n{retrieved_context}\n\n"
+        
+        user_prompt = f"""{project_info}请为以下标书章节生成具体内容：
+
+{context_info}{retrieved_info}当前章节信息：
 章节ID: {chapter_id}
 章节标题: {chapter_title}
 章节描述: {chapter_description}
 
 请根据项目概述信息和上述章节层级关系，生成详细的专业内容，确保与上级章节的内容逻辑相承，同时避免与同级章节内容重复，突出本章节的独特性和技术方案的优势。"""
 
-            # 调用AI流式生成内容
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    async def _generate_chapter_content(self, chapter: dict, parent_chapters: list = None, sibling_chapters: list = None, project_overview: str = "", idempotency_key: str | None = None, call_site: str = "chapter", call: LLMCall | None = None, requirements: str = "", tender_text: str = "", context_stats: dict | None = None) -> AsyncGenerator[str, None]:
+        """
+        为单个章节流式生成内容
+
+        相同章节的重复请求（重复点击、页面重连、前端重试）在生成期间合并到同一个上游流。
+
+        Args:
+            chapter: 章节数据
+            parent_chapters: 上级章节列表，每个元素包含章节id、标题和描述
+            sibling_chapters: 同级章节列表，避免内容重复
+            project_overview: 项目概述信息，提供项目背景和要求
+            idempotency_key: 客户端提供的幂等键，相同键的请求共享同一次生成
+            call_site: 调用点名称（草稿阶段为 chapter-draft），决定路由到的模型
+            call: 调用记录，结束后可从中读取耗时与用量
+            requirements: 技术评分要求，与项目概述一起作为检索资料
+            tender_text: 招标文件原文，与项目概述一起作为检索资料
+            context_stats: 传入时写入本章节携带的项目资料 token 统计（full_tokens、selected_tokens、saved_tokens、added_tokens、passages）
+
+        Yields:
+            生成的内容流
+        """
+        try:
+            selection = self._chapter_context(chapter, parent_chapters, project_overview, requirements, tender_text)
+            if selection is not None:
+                metrics.inc("chapter_context_tokens_saved_total", selection.saved_tokens, call_site=call_site)
+                metrics.inc("chapter_context_tokens_added_total", selection.added_tokens, call_site=call_site)
+                logger.debug("[%s] 章节「%s」检索项目资料 %d 段，%d/%d tokens，节省 %d tokens，补充 %d tokens",
+                             call_site, chapter.get('title', ''), selection.passages, selection.tokens,
+                             selection.full_tokens, selection.saved_tokens, selection.added_tokens)
+                if context_stats is not None:
+                    context_stats.update(selection.to_dict())
+            messages = self._build_chapter_messages(
+                chapter, parent_chapters, sibling_chapters,
+                selection.overview if selection is not None else project_overview,
+                selection.text if selection is not None else None,
+            )
 
             # 流式返回生成的文本
-            async for chunk in self.stream_chat_completion(messages, temperature=0.7):
+            async for chunk in self.stream_chat_completion(
+                messages, temperature=0.7, call_site=call_site, call=call, idempotency_key=idempotency_key
+            ):
                 yield chunk
 
         except Exception as e:
@@ -252,6 +1157,20 @@ class OpenAIService:
             yield f"错误: {str(e)}"
             
     async def generate_outline_v2(self, overview: str, requirements: str) -> Dict[str, Any]:
+        """生成完整提纲（一级标题后并发补全各一级章节的二三级目录，结果保持一级标题顺序）"""
+        async for event in self.generate_outline_v2_stream(overview, requirements):
+            if event['status'] == 'completed':
+                return event['outline']
+
+    async def generate_outline_v2_stream(self, overview: str, requirements: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        生成完整提纲，并在每个一级章节补全完成时立即产出
+
+        Yields:
+            {'status': 'titles', 'titles': [一级标题...], 'total': n}
+            {'status': 'chapter', 'index': i, 'chapter': {...}, 'completed': k, 'total': n}  （按完成顺序）
+            {'status': 'completed', 'outline': {'outline': [...]}}  （按一级标题顺序组装）
+        """
         schema_json = json.dumps([
             {
                 "rating_item": "原评分项",
@@ -259,44 +1178,28 @@ class OpenAIService:
             }
         ])
 
-        system_prompt = f"""
-            ### 角色
-            你是专业的标书编写专家，擅长根据项目需求编写标书。
-            
-            ### 人物
-            1. 根据得到的项目概述(overview)和评分要求(requirements)，撰写技术标部分的一级提纲
-            
-            ### 说明
-            1. 只设计一级标题，数量要和"评分要求"一一对应
-            2. 一级标题名称要进行简单修改，不能完全使用"评分要求"中的文字
-
-            
-            ### Output Format in JSON
-            {schema_json}
+        system_prompt = f"""### 角色
+你是专业的标书编写专家，擅长根据项目需求编写标书。
 
-            """
-        user_prompt = f"""
-            ### 项目信息
-            
-            <overview>
-            {overview}
-            </overview>
+### 任务
+1. 根据得到的项目概述(overview)和评分要求(requirements)，撰写技术标部分的一级提纲
 
-            <requirements>
-            {requirements}
-            </requirements>
+### 说明
+1. 只设计一级标题，数量要和"评分要求"一一对应
+2. 一级标题名称要进行简单修改，不能完全使用"评分要求"中的文字
+3. 直接返回json，不要任何额外说明或格式标记
 
-
-            直接返回json，不要任何额外说明或格式标记
-
-            """
+### Output Format in JSON
+{schema_json}
+"""
+        user_prompt = build_project_info_prompt(overview, requirements)
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
 
-        # 使用通用方法进行 JSON 校验与重试（失败时抛出异常）
-        full_content = await self._generate_with_json_check(
+        # 使用通用方法进行 JSON 校验、本地修复与重试（失败时抛出异常），直接得到解析后的数据
+        level_l1, _ = await self._generate_json(
             messages=messages,
             schema=schema_json,
             max_retries=3,
@@ -304,11 +1207,9 @@ class OpenAIService:
             response_format={"type": "json_object"},
             log_prefix="一级提纲",
             raise_on_fail=True,
+            call_site="outline-l1",
         )
 
-        # 通过校验后再进行 JSON 解析
-        level_l1 = json.loads(full_content.strip())
-
         expected_word_count = 100000
         leaf_node_count = expected_word_count // 1500
         
@@ -317,16 +1218,27 @@ class OpenAIService:
 
         nodes_distribution = calculate_nodes_distribution(len(level_l1), (index1, index2), leaf_node_count)
         
-        # 并发生成每个一级节点的提纲，保持结果顺序
-        tasks = [
-            self.process_level1_node(i, level1_node, nodes_distribution, level_l1, overview, requirements)
-            for i, level1_node in enumerate(level_l1)
-        ]
-        outline = await asyncio.gather(*tasks)
-        
-        
-        
-        return {"outline": outline}
+        total = len(level_l1)
+        yield {'status': 'titles', 'titles': [node.get('new_title', '') for node in level_l1], 'total': total}
+
+        async def indexed(i, level1_node):
+            return i, await self.process_level1_node(i, level1_node, nodes_distribution, level_l1, overview, requirements)
+
+        # 并发生成每个一级节点的提纲，按完成顺序产出，最终结果按一级标题顺序组装
+        tasks = [asyncio.create_task(indexed(i, level1_node)) for i, level1_node in enumerate(level_l1)]
+        outline = [None] * total
+        try:
+            for completed, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+                i, chapter = await next_done
+                outline[i] = chapter
+                yield {'status': 'chapter', 'index': i, 'chapter': chapter, 'completed': completed, 'total': total}
+        finally:
+            # 消费方提前退出或某个章节失败时取消其余章节
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        yield {'status': 'completed', 'outline': {"outline": outline}}
     
     async def process_level1_node(self, i, level1_node, nodes_distribution, level_l1, overview, requirements):
         """处理单个一级节点的函数"""
@@ -340,52 +1252,41 @@ class OpenAIService:
                             for j, node in enumerate(level_l1) 
                             if j!= i])
 
-        system_prompt = f"""
-    ### 角色
-    你是专业的标书编写专家，擅长根据项目需求编写标书。
-    
-    ### 任务
-    1. 根据得到项目概述(overview)、评分要求(requirements)补全标书的提纲的二三级目录
-    
-    ### 说明
-    1. 你将会得到一段json，这是提纲的其中一个章节，你需要再原结构上补全标题(title)和描述(description)
-    2. 二级标题根据一级标题撰写,三级标题根据二级标题撰写
-    3. 补全的内容要参考项目概述(overview)、评分要求(requirements)等项目信息
-    4. 你还会收到其他章节的标题(other_outline)，你需要确保本章节的内容不会包含其他章节的内容
-    
-    ### 注意事项
-    在原json上补全信息，禁止修改json结构，禁止修改一级标题
-
-    ### Output Format in JSON
-    {json_outline}
+        # 提示词布局：不变的系统提示词与项目信息在前，各章节不同的内容（其他章节标题、本章 JSON 模板）在后，
+        # 使各一级节点的请求共享尽可能长的字节级相同前缀，便于模型服务商的自动前缀缓存命中
+        system_prompt = """### 角色
+你是专业的标书编写专家，擅长根据项目需求编写标书。
 
-    """
-        user_prompt = f"""
-    ### 项目信息
+### 任务
+1. 根据得到项目概述(overview)、评分要求(requirements)补全标书的提纲的二三级目录
 
-    <overview>
-    {overview}
-    </overview>
-
-    <requirements>
-    {requirements}
-    </requirements>
-    
-    <other_outline>
-    {other_outline}
-    </other_outline>
+### 说明
+1. 你将会得到一段json(outline_json)，这是提纲的其中一个章节，你需要再原结构上补全标题(title)和描述(description)
+2. 二级标题根据一级标题撰写,三级标题根据二级标题撰写
+3. 补全的内容要参考项目概述(overview)、评分要求(requirements)等项目信息
+4. 你还会收到其他章节的标题(other_outline)，你需要确保本章节的内容不会包含其他章节的内容
 
+### 注意事项
+在原json上补全信息，禁止修改json结构，禁止修改一级标题
+直接返回json，不要任何额外说明或格式标记
+"""
+        user_prompt = f"""{build_project_info_prompt(overview, requirements)}
+<other_outline>
+{other_outline}
+</other_outline>
 
-    直接返回json，不要任何额外说明或格式标记
-
-    """
+### Output Format in JSON
+<outline_json>
+{json.dumps(json_outline, ensure_ascii=False)}
+</outline_json>
+"""
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
 
-        # 使用通用方法进行 JSON 校验与重试（失败时不抛异常，保持原有“返回最后一次结果”的行为）
-        full_content = await self._generate_with_json_check(
+        # 使用通用方法进行 JSON 校验、本地修复与重试（失败时不抛异常，保持原有“返回最后一次结果”的行为）
+        data, full_content = await self._generate_json(
             messages=messages,
             schema=json_outline,
             max_retries=3,
@@ -393,6 +1294,10 @@ class OpenAIService:
             response_format={"type": "json_object"},
             log_prefix=f"第{i+1}章",
             raise_on_fail=False,
+            call_site="outline-l2/3",
+            hedge=True,
         )
 
-        return json.loads(full_content.strip())
\ No newline at end of file
+        if data is not None:
+            return data
+        return json.loads(full_content.strip())
@@ -0,0 +1,216 @@
+"""
+PDF 逐页提取流水线：一次遍历同时得到每页的文本、表格与图片，按页分片在进程池中并行执行，结果按页码顺序流式返回
+
+每个分片只打开一次文档（pdfplumber），每页处理完立即释放该页的版面缓存：
+- 图片只在该页文本中出现图片标记时才用 PyMuPDF 编码，且只编码该页的图片
+- 某一页 pdfplumber 提取失败时只对这一页改用 PyMuPDF，pdfplumber 无法打开文档时整个分片改用 PyMuPDF
+PyMuPDF 文档在首次需要时才打开，同一分片内复用。
+"""
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncGenerator, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from ..utils.metrics import metrics
+
+# 文本中的图片占位标记
+IMAGE_MARK_PATTERN = r'----.*?(?:image|img|media).*?----'
+
+# 单页图片：(图片数据, 扩展名, 页内图片序号)
+PageImage = Tuple[bytes, str, int]
+# 单页提取结果：(页码, 文本, 表格列表, 图片列表)
+PageResult = Tuple[int, Optional[str], List[list], List[PageImage]]
+
+
+def encode_page_images(doc, page_index: int) -> List[PageImage]:
+    """将 PyMuPDF 文档中一页的图片编码为 JPEG（CMYK 等颜色空间先转换为 RGB）"""
+    import fitz
+
+    images = []
+    for img_index, img in enumerate(doc[page_index].get_images(full=True)):
+        try:
+            pix = fitz.Pixmap(doc, img[0])
+            if pix.n - pix.alpha >= 4:
+                pix = fitz.Pixmap(fitz.csRGB, pix)
+            images.append((pix.tobytes("jpeg"), "jpg", img_index + 1))
+            pix = None
+        except Exception as e:
+            print(f"提取PDF第{page_index + 1}页图片{img_index + 1}失败: {str(e)}")
+    return images
+
+
+def _pymupdf_page_content(doc, page_index: int) -> Tuple[Optional[str], List[list]]:
+    """用 PyMuPDF 提取一页的文本与表格（pdfplumber 失败时的逐页降级）"""
+    page = doc[page_index]
+    text = page.get_text()
+    tables = []
+    try:
+        tables = [table.extract() for table in page.find_tables()]
+    except Exception:
+        # 如果表格提取失败，跳过
+        pass
+    return text, tables
+
+
+def iter_page_range(file_path: str, start: int, end: int) -> Iterator[PageResult]:
+    """逐页提取 [start, end) 页（从 0 开始），每页产出后释放该页的对象"""
+    import fitz
+    import pdfplumber
+
+    fitz_doc = None
+
+    def pymupdf_document():
+        nonlocal fitz_doc
+        if fitz_doc is None:
+            fitz_doc = fitz.open(file_path)
+        return fitz_doc
+
+    try:
+        pdf = None
+        try:
+            pdf = pdfplumber.open(file_path)
+        except Exception as e:
+            print(f"pdfplumber 无法打开PDF，改用 PyMuPDF: {str(e)}")
+
+        try:
+            page_count = len(pdf.pages) if pdf is not None else pymupdf_document().page_count
+            for index in range(start, min(end, page_count)):
+                if pdf is not None:
+                    page = pdf.pages[index]
+                    try:
+                        text = page.extract_text()
+                        tables = page.extract_tables()
+                    except Exception as e:
+                        print(f"pdfplumber 提取第{index + 1}页失败，改用 PyMuPDF: {str(e)}")
+                        text, tables = _pymupdf_page_content(pymupdf_document(), index)
+                    finally:
+                        page.close()
+                else:
+                    text, tables = _pymupdf_page_content(pymupdf_document(), index)
+
+                images = []
+                if text and re.search(IMAGE_MARK_PATTERN, text, re.IGNORECASE):
+                    images = encode_page_images(pymupdf_document(), index)
+                yield index + 1, text, tables, images
+        finally:
+            if pdf is not None:
+                pdf.close()
+    finally:
+        if fitz_doc is not None:
+            fitz_doc.close()
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[PageResult]:
+    """
+    提取 [start, end) 页的结果列表
+
+    在进程池的子进程中执行（必须是模块级函数才能被序列化）。
+    """
+    return list(iter_page_range(file_path, start, end))
+
+
+def count_pages(file_path: str) -> int:
+    """读取页数（PyMuPDF 只解析页面树，不解析页面内容）"""
+    import fitz
+
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+class PdfExtractor:
+    """
+    进程池并行的 PDF 提取
+
+    - 页数不超过一个分片时在线程中逐页提取，每页交给调用方处理后才提取下一页，内存占用以单页为上限
+    - 否则按 settings.pdf_extract_shard_pages 切分页码区间，提交到进程池并行提取，按页码顺序逐个分片产出，
+      父进程的内存占用以已完成、尚未消费的分片为上限
+    进程池在首次使用时以 spawn 方式创建，子进程数为 settings.pdf_extract_workers（0 表示按 CPU 核数，最多 4 个）。
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def worker_count() -> int:
+        if settings.pdf_extract_workers > 0:
+            return settings.pdf_extract_workers
+        return max(1, min(4, os.cpu_count() or 1))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # 始终用 spawn 启动子进程：服务进程中已有线程（to_thread、SQLite、aiohttp），
+                # fork 会继承其中被持有的锁而可能死锁，并复制整个服务进程的内存；Windows 打包版本本就是 spawn
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.worker_count(), mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    @staticmethod
+    def shards(page_count: int, shard_pages: int) -> List[Tuple[int, int]]:
+        shard_pages = max(1, shard_pages)
+        return [(start, min(start + shard_pages, page_count)) for start in range(0, page_count, shard_pages)]
+
+    async def iter_pages(self, file_path: str) -> AsyncGenerator[PageResult, None]:
+        """按页码顺序逐页产出文本、表格与图片"""
+        started_at = time.monotonic()
+        page_count = await asyncio.to_thread(count_pages, file_path)
+        shards = self.shards(page_count, settings.pdf_extract_shard_pages)
+        pages = 0
+
+        if len(shards) <= 1 or self.worker_count() <= 1:
+            mode = "thread"
+            iterator = iter_page_range(file_path, 0, page_count)
+            try:
+                while True:
+                    page = await asyncio.to_thread(next, iterator, None)
+                    if page is None:
+                        break
+                    pages += 1
+                    yield page
+            finally:
+                await asyncio.to_thread(iterator.close)
+        else:
+            mode = "process"
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            futures = [
+                loop.run_in_executor(pool, extract_page_range, file_path, start, end)
+                for start, end in shards
+            ]
+            try:
+                for future in futures:
+                    shard = await future
+                    while shard:
+                        # 逐页交出并释放已消费的页
+                        page = shard.pop(0)
+                        pages += 1
+                        yield page
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        elapsed = time.monotonic() - started_at
+        metrics.inc("pdf_extract_pages_total", pages, mode=mode)
+        metrics.observe("pdf_extract_seconds", elapsed, mode=mode)
+        print(f"PDF 提取 {pages} 页（{mode}，{len(shards)} 个分片），耗时 {elapsed:.2f}s")
+
+    async def extract_pages(self, file_path: str) -> List[PageResult]:
+        """按页码顺序返回全部页的提取结果"""
+        return [page async for page in self.iter_pages(file_path)]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# 全局 PDF 提取器实例
+pdf_extractor = PdfExtractor()
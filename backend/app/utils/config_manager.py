@@ -1,53 +1,123 @@
 """配置管理工具"""
+import copy
 import json
 import os
-from typing import Dict, Optional
+import threading
+from typing import Dict, List, Optional
 
 
 class ConfigManager:
     """用户配置管理器"""
-    
+
     def __init__(self):
         # 配置文件路径 - 存储到用户家目录中
         self.config_dir = os.path.join(os.path.expanduser("~"), ".ai_write_helper")
         self.config_file = os.path.join(self.config_dir, "user_config.json")
-        
+
         # 确保配置目录存在
         os.makedirs(self.config_dir, exist_ok=True)
-    
+
+        # 内存缓存：仅当配置文件的 mtime/size 变化时才重新读取磁盘
+        self._lock = threading.Lock()
+        self._cached_config: Optional[Dict] = None
+        self._cached_stamp: Optional[tuple] = None
+
+    def _file_stamp(self) -> Optional[tuple]:
+        """返回配置文件的 (mtime_ns, size)，文件不存在时返回 None"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
     def load_config(self) -> Dict:
-        """从本地JSON文件加载配置"""
+        """从本地JSON文件加载配置（带文件变更检测的内存缓存）"""
+        stamp = self._file_stamp()
+        with self._lock:
+            if self._cached_config is not None and stamp == self._cached_stamp:
+                return copy.deepcopy(self._cached_config)
+
         default_config = {
             'api_key': '',
             'base_url': '',
             'model_name': 'gpt-3.5-turbo'
         }
-        
-        if os.path.exists(self.config_file):
+
+        if stamp is not None:
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     loaded_config = json.load(f)
                     default_config.update(loaded_config)
             except Exception:
                 pass  # 如果读取失败，使用默认配置
-        
+
+        with self._lock:
+            self._cached_config = copy.deepcopy(default_config)
+            self._cached_stamp = stamp
+
         return default_config
-    
+
     def save_config(self, api_key: str, base_url: str, model_name: str) -> bool:
-        """保存配置到本地JSON文件"""
-        config = {
+        """保存配置到本地JSON文件（保留其他高级配置项，如模型限额）"""
+        return self._write_config({
             'api_key': api_key,
             'base_url': base_url,
             'model_name': model_name
-        }
-        
+        })
+
+    def _write_config(self, updates: Dict) -> bool:
+        """将 updates 合并进现有配置并写回文件"""
+        config = self.load_config()
+        config.update(updates)
+
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
+            # 写入后使缓存失效，下次读取时按新文件重建
+            with self._lock:
+                self._cached_config = None
+                self._cached_stamp = None
             return True
         except Exception:
             return False
 
+    def get_model_limits(self, model_name: str) -> Dict:
+        """获取指定模型的 RPM/TPM 限额与上下文长度，未配置时返回空字典"""
+        limits = self.load_config().get('model_limits') or {}
+        return limits.get(model_name) or {}
+
+    def save_model_limits(self, model_name: str, rpm: int, tpm: int, context_tokens: int = 0,
+                          input_price: float = 0, output_price: float = 0) -> bool:
+        """
+        保存指定模型的 RPM/TPM 限额（0 表示不限制）、上下文长度（0 表示按模型名自动判断）
+        及输入/输出单价（元 / 百万 token，0 表示不统计费用）
+        """
+        limits = dict(self.load_config().get('model_limits') or {})
+        limits[model_name] = {
+            'rpm': rpm,
+            'tpm': tpm,
+            'context_tokens': context_tokens,
+            'input_price': input_price,
+            'output_price': output_price,
+        }
+        return self._write_config({'model_limits': limits})
+
+    def get_endpoints(self) -> List[Dict]:
+        """获取额外的 LLM 端点列表（主配置之外的 API Key / base_url）"""
+        return list(self.load_config().get('endpoints') or [])
+
+    def save_endpoints(self, endpoints: List[Dict]) -> bool:
+        """保存额外的 LLM 端点列表（整体覆盖）"""
+        return self._write_config({'endpoints': endpoints})
+
+    def get_model_routes(self) -> List[Dict]:
+        """获取按调用点的模型路由规则（按顺序匹配）"""
+        return list(self.load_config().get('model_routes') or [])
+
+    def save_model_routes(self, routes: List[Dict]) -> bool:
+        """保存模型路由规则（整体覆盖）"""
+        return self._write_config({'model_routes': routes})
+
 
 # 全局配置管理器实例
-config_manager = ConfigManager()
\ No newline at end of file
+config_manager = ConfigManager()
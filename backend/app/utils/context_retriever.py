@@ -0,0 +1,200 @@
+"""章节上下文检索：在项目概述、评分要求与招标文件中为每个章节选取最相关的段落（字符 n-gram BM25）"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from .token_util import estimate_tokens
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;])")
+
+# 资料来源及其在上下文中的标题
+SOURCE_LABELS = {
+    "overview": "项目概述",
+    "requirements": "评分要求",
+    "tender": "招标文件",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    适合中文的检索词切分：连续汉字切分为字符二元组（单字成段时保留单字），英文与数字按单词小写
+    """
+    terms: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    terms.extend(word.lower() for word in _WORD.findall(text))
+    return terms
+
+
+def split_passages(text: str, max_tokens: int) -> List[str]:
+    """按行切分段落：过短的相邻行合并，超过 max_tokens 的行按句号等句末标点再切分"""
+    pieces: List[str] = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if estimate_tokens(line) <= max_tokens:
+            pieces.append(line)
+            continue
+        sentence_group = ""
+        for sentence in _SENTENCE_END.split(line):
+            if sentence_group and estimate_tokens(sentence_group + sentence) > max_tokens:
+                pieces.append(sentence_group)
+                sentence_group = ""
+            sentence_group += sentence
+        if sentence_group:
+            pieces.append(sentence_group)
+
+    passages: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current) + estimate_tokens(piece) > max_tokens:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+class BM25Index:
+    """进程内 BM25 倒排索引"""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_freqs: List[Counter] = [Counter(tokenize(doc)) for doc in documents]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self._term_freqs)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query: str) -> List[float]:
+        """返回每个文档对 query 的 BM25 得分"""
+        query_terms = set(tokenize(query))
+        results = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+class ContextSelection:
+    """
+    一次检索的结果：拼接好的上下文文本与 token 统计
+
+    overview 为完整保留的项目概述（各章节相同，放在提示词最前面作为共享前缀；未完整保留时为空），
+    text 为检索到的段落（随章节变化，放在共享前缀之后）。
+    full_tokens 为不检索时原本携带的资料（完整的项目概述）的 token 数，
+    selected_tokens 少于它时记为 saved_tokens，多于它（补充了评分要求、招标文件段落）时记为 added_tokens。
+    """
+
+    __slots__ = ("overview", "text", "tokens", "full_tokens", "passages")
+
+    def __init__(self, overview: str, text: str, tokens: int, full_tokens: int, passages: int):
+        self.overview = overview
+        self.text = text
+        self.tokens = tokens
+        self.full_tokens = full_tokens
+        self.passages = passages
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.full_tokens - self.tokens)
+
+    @property
+    def added_tokens(self) -> int:
+        return max(0, self.tokens - self.full_tokens)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "full_tokens": self.full_tokens,
+            "selected_tokens": self.tokens,
+            "saved_tokens": self.saved_tokens,
+            "added_tokens": self.added_tokens,
+            "passages": self.passages,
+        }
+
+
+class ProjectContext:
+    """
+    项目资料的段落索引
+
+    为每个章节按标题、描述与上级章节检索最相关的段落，在 token 预算内按得分从高到低选取，
+    再按资料来源与原文顺序排列；只选取与章节相关（得分大于 0）的段落，不用无关段落填满预算：
+    - 项目概述不超过预算时完整保留（与不检索时相同），只用剩余预算从评分要求、招标文件中检索
+    - 项目概述超过预算时从全部资料中检索，概述的第一段（通常是项目名称与基本情况）始终保留
+    """
+
+    def __init__(self, overview: str, requirements: str = "", tender_text: str = "", passage_tokens: int = 200):
+        self.passages: List[tuple] = []  # (来源, 段落文本, token 数)
+        for source, text in (("overview", overview), ("requirements", requirements), ("tender", tender_text)):
+            for passage in split_passages(text or "", passage_tokens):
+                self.passages.append((source, passage, estimate_tokens(passage)))
+        self.overview = (overview or "").strip()
+        # 不检索时章节提示词携带的是完整的项目概述
+        self.full_tokens = estimate_tokens(self.overview)
+        self.supplement_tokens = sum(tokens for source, _, tokens in self.passages if source != "overview")
+        self._index = BM25Index([passage for _, passage, _ in self.passages])
+
+    def select(self, query: str, budget_tokens: int) -> ContextSelection:
+        scores = self._index.scores(query)
+        chosen: List[int] = []
+        used = 0
+        keep_overview = self.full_tokens <= budget_tokens
+        if keep_overview:
+            used = self.full_tokens
+            ranked = [i for i in sorted(range(len(self.passages)), key=lambda i: (-scores[i], i))
+                      if self.passages[i][0] != "overview"]
+        else:
+            if self.passages and self.passages[0][0] == "overview" and self.passages[0][2] <= budget_tokens:
+                chosen.append(0)
+                used += self.passages[0][2]
+            ranked = sorted(range(len(self.passages)), key=lambda i: (-scores[i], i))
+        for i in ranked:
+            if i in chosen:
+                continue
+            if scores[i] <= 0:
+                break
+            tokens = self.passages[i][2]
+            if used + tokens > budget_tokens:
+                continue
+            chosen.append(i)
+            used += tokens
+
+        sections: List[str] = []
+        for source, label in SOURCE_LABELS.items():
+            texts = [self.passages[i][1] for i in sorted(chosen) if self.passages[i][0] == source]
+            if texts:
+                sections.append(f"【{label}】\n" + "\n".join(texts))
+        return ContextSelection(self.overview if keep_overview else "", "\n\n".join(sections),
+                                used, self.full_tokens, len(chosen))
+
+
+@lru_cache(maxsize=8)
+def get_project_context(overview: str, requirements: str = "", tender_text: str = "",
+                        passage_tokens: int = 200) -> ProjectContext:
+    """构建（或复用最近构建过的）项目资料索引，同一份资料的多个章节请求共享一个索引"""
+    return ProjectContext(overview, requirements, tender_text, passage_tokens)
+
+
+def chapter_query(chapter: Dict, parent_chapters: Optional[List[Dict]] = None) -> str:
+    """章节检索语句：本章标题与描述，加上各级上级章节的标题"""
+    parts = [chapter.get('title', ''), chapter.get('description', '')]
+    parts.extend(parent.get('title', '') for parent in parent_chapters or [])
+    return "\n".join(part for part in parts if part)
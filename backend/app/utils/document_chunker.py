@@ -0,0 +1,98 @@
+"""招标文件文本切分工具：按页和表格边界切分为不超过 token 上限的片段"""
+import re
+from typing import List
+
+from .token_util import estimate_tokens
+
+# file_service 提取文本时插入的页标记与表格标记
+_PAGE_MARKER = re.compile(r"^\s*--- 第 \d+ 页 ---\s*$")
+_TABLE_START = re.compile(r"^\s*\[(表格 \d+|表格内容)\]\s*$")
+_TABLE_END = re.compile(r"^\s*\[表格结束\]\s*$")
+
+
+def _split_blocks(text: str) -> List[str]:
+    """
+    将文本切分为不可再分的块：每页一个块，页内的表格单独成块（表格不会被拆到两个块中）
+    """
+    blocks: List[str] = []
+    current: List[str] = []
+    in_table = False
+
+    def flush():
+        if current and "".join(current).strip():
+            blocks.append("\n".join(current))
+        current.clear()
+
+    for line in text.split("\n"):
+        if not in_table and _PAGE_MARKER.match(line):
+            flush()
+            current.append(line)
+        elif not in_table and _TABLE_START.match(line):
+            flush()
+            current.append(line)
+            in_table = True
+        elif in_table and _TABLE_END.match(line):
+            current.append(line)
+            flush()
+            in_table = False
+        else:
+            current.append(line)
+    flush()
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    """单个块超过上限时按行拆分（表格按行拆分，每段重复表头标记），单行仍超限时按字符截断"""
+    lines = block.split("\n")
+    header = lines[0] if _TABLE_START.match(lines[0]) or _PAGE_MARKER.match(lines[0]) else None
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if line_tokens > max_tokens:
+            # 超长单行：按字符数近似截断（留 10% 余量，抵消估算的取整误差）
+            step = max(1, len(line) * max_tokens * 9 // (line_tokens * 10))
+            segments = [line[i:i + step] for i in range(0, len(line), step)]
+        else:
+            segments = [line]
+        for segment in segments:
+            segment_tokens = estimate_tokens(segment)
+            if current and current_tokens + segment_tokens > max_tokens:
+                pieces.append("\n".join(current))
+                current = [f"{header}（续）"] if header else []
+                current_tokens = estimate_tokens(current[0]) if current else 0
+            current.append(segment)
+            current_tokens += segment_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def split_document(text: str, max_tokens: int) -> List[str]:
+    """
+    将文档文本切分为若干片段，每段估算 token 数不超过 max_tokens
+
+    优先在页边界处切分，相邻的页合并到同一片段中直到接近上限；表格作为整体保留，
+    只有单个页或表格本身超过上限时才按行拆分。
+    """
+    max_tokens = max(1, max_tokens)
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for block in _split_blocks(text):
+        block_tokens = estimate_tokens(block)
+        if block_tokens > max_tokens:
+            pieces = _split_oversized(block, max_tokens)
+        else:
+            pieces = [block]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -1,72 +1,566 @@
 import json
-def check_json(json_str: str, schema: str | dict) -> tuple[bool, str]:
-    """
-    根据模板 JSON 校验目标字符串的格式是否符合要求
-    
-    Args:
-        json_str: 要校验的 JSON 字符串
-        schema: 模板 JSON 字符串或字典对象，用于定义预期的数据结构
+import re
+from typing import Any, Optional
+
+
+def _check_structure(target, template, path=""):
+    """递归校验 target 是否符合模板 template 的结构"""
+    # 处理数字类型（int 和 float 可以互换）
+    if isinstance(template, (int, float)) and isinstance(target, (int, float)):
+        return True, ""
+        
+    # 检查基本数据类型
+    if type(template) != type(target) and not (isinstance(template, (int, float)) and isinstance(target, (int, float))):
+        return False, f"路径 '{path}' 的类型不匹配: 期望 {type(template).__name__}, 实际 {type(target).__name__}"
+        
+    # 如果是列表类型
+    if isinstance(template, list):
+        if not template:  # 如果模板列表为空，则允许任何列表
+            return True, ""
+        if not target:  # 如果目标列表为空，但模板不为空
+            return False, f"路径 '{path}' 的列表为空，但期望有内容"
+            
+        # 检查列表中的每个元素是否符合模板中第一个元素的格式
+        template_item = template[0]
+        for i, item in enumerate(target):
+            is_valid, error = _check_structure(item, template_item, f"{path}[{i}]")
+            if not is_valid:
+                return False, error
+        return True, ""
+        
+    # 如果是字典类型
+    elif isinstance(template, dict):
+        # 检查所有必需的键是否存在，并且值的类型是否正确
+        for key in template:
+            if key not in target:
+                return False, f"路径 '{path}' 缺少必需的键 '{key}'"
+            is_valid, error = _check_structure(target[key], template[key], f"{path}.{key}")
+            if not is_valid:
+                return False, error
+        return True, ""
         
+    # 对于其他基本类型，返回 True
+    return True, ""
+
+
+def _load_schema(schema: str | dict) -> Any:
+    """将模板 JSON 字符串解析为对象；模板本身是字典时原样返回"""
+    if isinstance(schema, str):
+        return json.loads(schema)
+    if not isinstance(schema, dict):
+        raise TypeError("schema 必须是 JSON 字符串或字典对象")
+    return schema
+
+
+def parse_and_check_json(json_str: str, schema: str | dict) -> tuple[bool, str, Any]:
+    """
+    解析 JSON 字符串并按模板校验结构
+
     Returns:
-        tuple[bool, str]: (是否验证通过, 错误信息)
-        如果验证通过返回 (True, "")，否则返回 (False, 错误原因)
+        tuple[bool, str, Any]: (是否验证通过, 错误信息, 解析后的数据)
+        解析失败时数据为 None；结构校验失败时仍返回解析后的数据，便于后续修复
     """
     try:
         # 解析输入的 JSON 字符串
         try:
             data = json.loads(json_str)
         except json.JSONDecodeError as e:
-            return False, f"JSON 解析错误: {str(e)}"
+            return False, f"JSON 解析错误: {str(e)}", None
         
         # 处理 schema 参数
         try:
-            if isinstance(schema, str):
-                schema = json.loads(schema)
-            elif not isinstance(schema, dict):
-                return False, "schema 必须是 JSON 字符串或字典对象"
+            template = _load_schema(schema)
+        except TypeError as e:
+            return False, str(e), data
         except json.JSONDecodeError as e:
-            return False, f"schema 解析错误: {str(e)}"
+            return False, f"schema 解析错误: {str(e)}", data
         
-        def check_structure(target, template, path=""):
-            # 处理数字类型（int 和 float 可以互换）
-            if isinstance(template, (int, float)) and isinstance(target, (int, float)):
-                return True, ""
-                
-            # 检查基本数据类型
-            if type(template) != type(target) and not (isinstance(template, (int, float)) and isinstance(target, (int, float))):
-                return False, f"路径 '{path}' 的类型不匹配: 期望 {type(template).__name__}, 实际 {type(target).__name__}"
-                
-            # 如果是列表类型
-            if isinstance(template, list):
-                if not template:  # 如果模板列表为空，则允许任何列表
-                    return True, ""
-                if not target:  # 如果目标列表为空，但模板不为空
-                    return False, f"路径 '{path}' 的列表为空，但期望有内容"
-                    
-                # 检查列表中的每个元素是否符合模板中第一个元素的格式
-                template_item = template[0]
-                for i, item in enumerate(target):
-                    is_valid, error = check_structure(item, template_item, f"{path}[{i}]")
-                    if not is_valid:
-                        return False, error
-                return True, ""
-                
-            # 如果是字典类型
-            elif isinstance(template, dict):
-                # 检查所有必需的键是否存在，并且值的类型是否正确
-                for key in template:
-                    if key not in target:
-                        return False, f"路径 '{path}' 缺少必需的键 '{key}'"
-                    is_valid, error = check_structure(target[key], template[key], f"{path}.{key}")
-                    if not is_valid:
-                        return False, error
-                return True, ""
-                
-            # 对于其他基本类型，返回 True
-            return True, ""
-                
-        is_valid, error = check_structure(data, schema)
-        return is_valid, error if not is_valid else ""
+        is_valid, error = _check_structure(data, template)
+        return is_valid, error if not is_valid else "", data
         
     except Exception as e:
-        return False, f"未预期的错误: {str(e)}"
\ No newline at end of file
+        return False, f"未预期的错误: {str(e)}", None
+
+
+def check_json(json_str: str, schema: str | dict) -> tuple[bool, str]:
+    """
+    根据模板 JSON 校验目标字符串的格式是否符合要求
+    
+    Args:
+        json_str: 要校验的 JSON 字符串
+        schema: 模板 JSON 字符串或字典对象，用于定义预期的数据结构
+        
+    Returns:
+        tuple[bool, str]: (是否验证通过, 错误信息)
+        如果验证通过返回 (True, "")，否则返回 (False, 错误原因)
+    """
+    is_valid, error, _ = parse_and_check_json(json_str, schema)
+    return is_valid, error
+
+
+_FENCE_PATTERN = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """删除字符串之外、紧跟在 } 或 ] 之前的逗号"""
+    result = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            result.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == ",":
+            rest = text[i + 1:].lstrip()
+            if rest[:1] in ("}", "]"):
+                continue
+        result.append(ch)
+    return "".join(result)
+
+
+def _close_truncated(text: str) -> str:
+    """为被截断的 JSON 补齐未闭合的字符串与括号，并去掉末尾悬空的键、冒号或逗号"""
+    stack = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if not stack and not in_string:
+        return text
+
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # 悬空的 "key": 或 "key" 或末尾逗号
+    text = re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*$', "", text)
+    if stack and stack[-1] == "}":
+        text = re.sub(r',\s*"(?:[^"\\]|\\.)*"\s*$', "", text)
+    text = re.sub(r",\s*$", "", text)
+    return text + "".join(reversed(stack))
+
+
+def _unwrap_to_template(data: Any, template: Any) -> Any:
+    """模板期望列表而输出为包裹了列表的对象时（json_object 模式的常见情况），取出其中的列表"""
+    if isinstance(template, list) and isinstance(data, dict):
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return data
+
+
+def repair_json(json_str: str, schema: str | dict) -> tuple[Any, list[str]]:
+    """
+    在本地修复常见的 JSON 输出缺陷，修复后的数据通过模板校验时返回
+
+    依次尝试：去除 markdown 代码块、截取首尾 JSON 括号之间的内容、删除尾随逗号、
+    补齐被截断的括号、把包裹列表的顶层对象展开为列表。
+
+    Returns:
+        tuple[Any, list[str]]: (修复后的数据, 已应用的修复项)；无法修复时数据为 None
+    """
+    try:
+        template = _load_schema(schema)
+    except (TypeError, json.JSONDecodeError):
+        return None, []
+
+    text = json_str.strip()
+    fixes: list[str] = []
+
+    def attempt(candidate: str) -> Any:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        unwrapped = _unwrap_to_template(data, template)
+        if unwrapped is not data:
+            fixes.append("unwrap")
+        if _check_structure(unwrapped, template)[0]:
+            return unwrapped
+        if unwrapped is not data:
+            fixes.pop()
+        return None
+
+    match = _FENCE_PATTERN.match(text)
+    if match:
+        text = match.group(1).strip()
+        fixes.append("markdown_fence")
+    elif text.startswith("```"):
+        # 只有开头的代码块标记（输出被截断）
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        fixes.append("markdown_fence")
+
+    data = attempt(text)
+    if data is not None:
+        return data, fixes
+
+    starts = [pos for pos in (text.find("{"), text.find("[")) if pos >= 0]
+    if starts:
+        start = min(starts)
+        end = max(text.rfind("}"), text.rfind("]"))
+        tail = text[end + 1:] if end > start else ""
+        # 末尾是说明文字时截掉；末尾仍是 JSON 内容（被截断）时保留，交给后续补齐
+        if any(ch in tail for ch in '"{[:,'):
+            end = len(text) - 1
+        if start > 0 or (start < end < len(text) - 1):
+            text = text[start:end + 1] if end > start else text[start:]
+            fixes.append("extract")
+            data = attempt(text)
+            if data is not None:
+                return data, fixes
+
+    stripped = _strip_trailing_commas(text)
+    if stripped != text:
+        text = stripped
+        fixes.append("trailing_comma")
+        data = attempt(text)
+        if data is not None:
+            return data, fixes
+
+    closed = _close_truncated(text)
+    if closed != text:
+        fixes.append("close_truncated")
+        data = attempt(_strip_trailing_commas(closed))
+        if data is not None:
+            return data, fixes
+
+    return None, fixes
+
+
+def build_json_schema(template: Any) -> dict:
+    """
+    将 check_json 使用的模板编译为 JSON Schema（兼容 OpenAI strict 模式：
+    所有键均为必需键且不允许额外键）
+    """
+    if isinstance(template, str):
+        try:
+            template = json.loads(template)
+        except json.JSONDecodeError:
+            return {"type": "string"}
+    if isinstance(template, dict):
+        return {
+            "type": "object",
+            "properties": {key: build_json_schema(value) for key, value in template.items()},
+            "required": list(template.keys()),
+            "additionalProperties": False,
+        }
+    if isinstance(template, list):
+        items = build_json_schema(template[0]) if template else {}
+        return {"type": "array", "items": items}
+    if isinstance(template, bool):
+        return {"type": "boolean"}
+    if isinstance(template, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+def build_response_format(template: Any, name: str = "output") -> dict:
+    """
+    根据模板生成 strict json_schema 类型的 response_format
+
+    strict 模式要求顶层为对象，模板为列表时包裹为 {"items": [...]}，
+    调用方按 wrapped_list_template 返回的模板校验输出后取出 items（与是否开启本地修复无关）。
+    """
+    schema = build_json_schema(template)
+    if schema.get("type") != "object":
+        schema = {
+            "type": "object",
+            "properties": {"items": schema},
+            "required": ["items"],
+            "additionalProperties": False,
+        }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema},
+    }
+
+def wrapped_list_template(schema: str | dict | list, response_format: dict | None) -> Optional[dict]:
+    """
+    response_format 为 build_response_format 由列表模板生成的 strict json_schema 时，
+    返回输出实际对应的模板 {"items": 列表模板}；其他情况返回 None
+    """
+    if not response_format or response_format.get("type") != "json_schema":
+        return None
+    if isinstance(schema, str):
+        try:
+            schema = json.loads(schema)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(schema, list):
+        return None
+    properties = response_format.get("json_schema", {}).get("schema", {}).get("properties", {})
+    if list(properties.keys()) != ["items"]:
+        return None
+    return {"items": schema}
+
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_CHARS = set("0123456789+-.eEtruefalsnNaIiy")
+
+
+def _expected_opening(template) -> Optional[str]:
+    """模板值对应的 JSON 起始字符；无法确定时返回 None（不做校验）"""
+    if isinstance(template, dict):
+        return "{"
+    if isinstance(template, list):
+        return "["
+    if isinstance(template, str):
+        return '"'
+    return None
+
+
+class _ListWrapper:
+    """宽松模式下顶层对象包裹期望列表时使用的占位模板"""
+
+    def __init__(self, template: list):
+        self.template = template
+
+
+class IncrementalJsonValidator:
+    """
+    流式 JSON 结构校验器
+
+    逐个 chunk 消费模型输出，在输出已经不可能通过 check_json 时立即给出错误，
+    以便调用方提前取消上游请求。只报告"确定失败"的情况：
+    - 首个非空白字符不是 JSON 起始字符，或顶层类型与模板不一致
+    - 模板中已知键的值类型与模板不一致（对象/数组/字符串）
+    - 对象闭合时缺少模板中的必需键；非空模板列表闭合时为空
+    - 明显的 JSON 语法错误，或顶层值结束后还有多余内容
+    数字、布尔等标量以及模板之外的键不做类型校验，最终结果仍以 check_json 为准。
+
+    lenient=True 时放过 repair_json 能够在本地修复的缺陷：开头的 markdown 代码块标记、
+    尾随逗号、包裹期望列表的顶层对象，以及顶层值结束后的多余内容。
+    """
+
+    def __init__(self, schema: str | dict | list, lenient: bool = False):
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        self.schema = schema
+        self.lenient = lenient
+        self._in_fence_header = False
+        self.error: Optional[str] = None
+        self.consumed = 0
+        self._stack: list = []        # 每层: {'kind', 'template', 'state', 'keys', 'key', 'count'}
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_buffer: list = []
+        self._in_scalar = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """消费一段输出，返回错误信息（首次出错后始终返回同一错误）"""
+        if self.error:
+            return self.error
+        for ch in chunk:
+            self._feed_char(ch)
+            self.consumed += 1
+            if self.error:
+                break
+        return self.error
+
+    def _fail(self, message: str) -> None:
+        self.error = f"{message}（位置 {self.consumed}）"
+
+    def _feed_char(self, ch: str) -> None:
+        if self._in_string:
+            self._feed_string_char(ch)
+            return
+
+        if self._in_fence_header:
+            # 跳过 ```json 这一行
+            if ch == "\n":
+                self._in_fence_header = False
+            return
+
+        if self._in_scalar:
+            if ch in _SCALAR_CHARS:
+                return
+            self._in_scalar = False
+            self._after_value()
+            if self.error:
+                return
+
+        if ch in _WHITESPACE:
+            return
+
+        if self._finished:
+            if not self.lenient:
+                self._fail("JSON 顶层值结束后存在多余内容")
+            return
+
+        if not self._started:
+            expected = _expected_opening(self.schema)
+            if ch == "`" and self.lenient:
+                self._in_fence_header = True
+                return
+            if ch not in "{[":
+                self._fail(f"输出不是以 JSON 开头: {ch!r}")
+                return
+            self._started = True
+            if ch == "{" and expected == "[" and self.lenient:
+                self._open_container(ch, _ListWrapper(self.schema))
+                return
+            if expected is not None and ch != expected:
+                self._fail(f"顶层类型不匹配: 期望 {type(self.schema).__name__}")
+                return
+            self._open_container(ch, self.schema)
+            return
+
+        top = self._stack[-1]
+        if top["kind"] == "object":
+            self._feed_object_char(top, ch)
+        else:
+            self._feed_array_char(top, ch)
+
+    def _feed_string_char(self, ch: str) -> None:
+        if self._escape:
+            self._escape = False
+            if self._string_is_key:
+                self._key_buffer.append(ch)
+            return
+        if ch == "\\":
+            self._escape = True
+            if self._string_is_key:
+                self._key_buffer.append(ch)
+            return
+        if ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                raw = '"' + "".join(self._key_buffer) + '"'
+                try:
+                    key = json.loads(raw)
+                except json.JSONDecodeError:
+                    key = raw[1:-1]
+                top = self._stack[-1]
+                top["key"] = key
+                top["state"] = "colon"
+                self._string_is_key = False
+            else:
+                self._after_value()
+            return
+        if self._string_is_key:
+            self._key_buffer.append(ch)
+
+    def _feed_object_char(self, top: dict, ch: str) -> None:
+        state = top["state"]
+        if state in ("key_or_end", "key"):
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = True
+                self._key_buffer = []
+            elif ch == "}" and (state == "key_or_end" or self.lenient):
+                self._close_container()
+            else:
+                self._fail(f"对象中出现非法字符 {ch!r}")
+        elif state == "colon":
+            if ch == ":":
+                top["state"] = "value"
+            else:
+                self._fail(f"对象键后缺少冒号: {ch!r}")
+        elif state == "value":
+            template = top["template"]
+            key = top["key"]
+            value_template = template.get(key) if isinstance(template, dict) else None
+            if isinstance(template, _ListWrapper) and ch == "[":
+                value_template = template.template
+            if isinstance(template, dict) and key in template:
+                top["keys"].add(key)
+            self._start_value(ch, value_template, f"键 '{key}'")
+        elif state == "comma_or_end":
+            if ch == ",":
+                top["state"] = "key"
+            elif ch == "}":
+                self._close_container()
+            else:
+                self._fail(f"对象中缺少逗号: {ch!r}")
+
+    def _feed_array_char(self, top: dict, ch: str) -> None:
+        state = top["state"]
+        template = top["template"]
+        item_template = template[0] if isinstance(template, list) and template else None
+        if state in ("value_or_end", "value"):
+            if ch == "]" and (state == "value_or_end" or self.lenient):
+                self._close_container()
+                return
+            top["count"] += 1
+            self._start_value(ch, item_template, f"列表第 {top['count']} 项")
+        elif state == "comma_or_end":
+            if ch == ",":
+                top["state"] = "value"
+            elif ch == "]":
+                self._close_container()
+            else:
+                self._fail(f"列表中缺少逗号: {ch!r}")
+
+    def _start_value(self, ch: str, template, where: str) -> None:
+        expected = _expected_opening(template)
+        if ch in "{[":
+            opening = ch
+        elif ch == '"':
+            opening = '"'
+        elif ch in _SCALAR_CHARS:
+            opening = None
+        else:
+            self._fail(f"{where} 的值非法: {ch!r}")
+            return
+
+        if expected is not None and opening != expected:
+            self._fail(f"{where} 的类型不匹配: 期望 {type(template).__name__}")
+            return
+
+        if ch in "{[":
+            self._open_container(ch, template)
+        elif ch == '"':
+            self._in_string = True
+            self._string_is_key = False
+        else:
+            self._in_scalar = True
+
+    def _open_container(self, ch: str, template) -> None:
+        if ch == "{":
+            self._stack.append({"kind": "object", "template": template, "state": "key_or_end",
+                                "keys": set(), "key": None, "count": 0})
+        else:
+            self._stack.append({"kind": "array", "template": template, "state": "value_or_end",
+                                "keys": None, "key": None, "count": 0})
+
+    def _close_container(self) -> None:
+        top = self._stack.pop()
+        template = top["template"]
+        if top["kind"] == "object" and isinstance(template, dict):
+            missing = [key for key in template if key not in top["keys"]]
+            if missing:
+                self._fail(f"对象缺少必需的键 '{missing[0]}'")
+                return
+        if top["kind"] == "array" and isinstance(template, list) and template and top["count"] == 0:
+            self._fail("列表为空，但期望有内容")
+            return
+        self._after_value()
+
+    def _after_value(self) -> None:
+        if not self._stack:
+            self._finished = True
+            return
+        self._stack[-1]["state"] = "comma_or_end"
@@ -136,4 +136,22 @@ def generate_outline_with_old_prompt(overview, requirements, old_outline):
   {requirements}
 
   请生成完整的技术标目录结构，确保覆盖所有技术评分要点。"""
-  return system_prompt, user_prompt
\ No newline at end of file
+  return system_prompt, user_prompt
+
+def build_project_info_prompt(overview, requirements):
+  '''
+  项目信息提示词（项目概述 + 评分要求）
+
+  作为用户提示词的开头使用：同一项目的多次请求中这段内容逐字节相同，
+  配合相同的系统提示词即可命中模型服务商的自动前缀缓存，随请求变化的内容应放在其后。
+  '''
+  return f"""### 项目信息
+
+<overview>
+{overview}
+</overview>
+
+<requirements>
+{requirements}
+</requirements>
+"""
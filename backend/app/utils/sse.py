@@ -1,8 +1,16 @@
 """SSE (Server-Sent Events) 相关工具"""
-from typing import AsyncGenerator, Any, Dict, Optional
+import asyncio
+import hashlib
+import json
+from contextlib import aclosing
+from typing import AsyncGenerator, Any, Dict, List, Optional
 
+from fastapi import Request
 from fastapi.responses import StreamingResponse
 
+from ..config import settings
+from .metrics import metrics
+
 
 DEFAULT_SSE_HEADERS: Dict[str, str] = {
     "Cache-Control": "no-cache",
@@ -11,10 +19,69 @@ DEFAULT_SSE_HEADERS: Dict[str, str] = {
 }
 
 
+_END = object()
+_ERROR = object()
+
+
+async def cancel_on_disconnect(
+    request: Request,
+    generator: AsyncGenerator[str, Any],
+    endpoint: str = "sse",
+) -> AsyncGenerator[str, Any]:
+    """
+    在独立任务中驱动 SSE 生成器，客户端断开连接时取消该任务
+
+    取消会传递到生成器内部正在等待的操作：生成器中创建的后台任务（需在 finally 中取消）、
+    并发扇出的子任务、重试等待以及上游 LLM 的 HTTP 流都会随之结束，不再为无人接收的结果消耗 token。
+    断开检测按 settings.sse_disconnect_poll_interval 轮询，即使生成器长时间没有输出也能及时发现。
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    disconnected = False
+
+    async def pump():
+        try:
+            async with aclosing(generator) as events:
+                async for event in events:
+                    queue.put_nowait((event, None))
+        except Exception as e:
+            queue.put_nowait((_ERROR, e))
+        else:
+            queue.put_nowait((_END, None))
+
+    producer = asyncio.create_task(pump())
+
+    async def watch():
+        nonlocal disconnected
+        while not await request.is_disconnected():
+            await asyncio.sleep(settings.sse_disconnect_poll_interval)
+        disconnected = True
+        producer.cancel()
+        queue.put_nowait((_END, None))
+
+    watcher = asyncio.create_task(watch())
+    try:
+        while True:
+            event, error = await queue.get()
+            if event is _END:
+                return
+            if event is _ERROR:
+                raise error
+            yield event
+    finally:
+        # 消费方被关闭（如服务器在断开时取消响应）时同样取消生成任务
+        watcher.cancel()
+        if disconnected or not producer.done():
+            metrics.inc("sse_disconnects_total", endpoint=endpoint)
+            print(f"[{endpoint}] 客户端已断开连接，取消生成任务")
+            producer.cancel()
+
+
 def sse_response(
     generator: AsyncGenerator[str, Any],
     media_type: str = "text/event-stream",
     extra_headers: Optional[Dict[str, str]] = None,
+    request: Optional[Request] = None,
+    endpoint: str = "sse",
 ) -> StreamingResponse:
     """
     包装 SSE 异步生成器为 StreamingResponse，统一 headers 和 media_type。
@@ -23,10 +90,14 @@ def sse_response(
         generator: 异步生成器，yield 已经带好 "data: ..." 和 "\n\n" 的字符串
         media_type: 响应的 media_type，默认使用 text/event-stream
         extra_headers: 额外需要添加或覆盖的响应头
+        request: 传入时检测客户端断开并取消生成任务（见 cancel_on_disconnect）
+        endpoint: 断开指标中使用的端点名称
     """
     headers = DEFAULT_SSE_HEADERS.copy()
     if extra_headers:
         headers.update(extra_headers)
+    if request is not None:
+        generator = cancel_on_disconnect(request, generator, endpoint)
 
     return StreamingResponse(
         generator,
@@ -36,3 +107,64 @@ def sse_response(
 
 
 
+
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """将字典编码为一条 SSE data 事件"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class DeltaStreamEncoder:
+    """
+    v2 增量流协议编码器：每个事件只携带新增片段，不再重复发送累计全文
+
+    事件格式（status 字段区分）：
+        started     {"status": "started", "protocol": 2, "message": ...}
+        delta       {"status": "delta", "seq": n, "delta": 新增片段}，seq 从 1 开始连续递增
+        checkpoint  {"status": "checkpoint", "seq": n, "length": 字符数, "sha256": 摘要}，
+                    每 checkpoint_interval 个 delta 发送一次，用于客户端校验已拼接的内容
+        completed   {"status": "completed", "seq": n, "length": 字符数, "sha256": 摘要}
+        error       {"status": "error", "seq": n, "message": ...}
+
+    length 为 Unicode 字符数，sha256 为累计全文 UTF-8 编码的十六进制摘要（增量计算，不重复哈希全文）。
+    服务端使用列表累积片段，需要全文时再一次性拼接。
+    """
+
+    protocol = 2
+
+    def __init__(self, checkpoint_interval: int = 32):
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self.seq = 0
+        self.length = 0
+        self._parts: List[str] = []
+        self._hash = hashlib.sha256()
+
+    @property
+    def text(self) -> str:
+        """已发送的全文"""
+        return "".join(self._parts)
+
+    def digest(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "length": self.length, "sha256": self._hash.hexdigest()}
+
+    def started(self, message: str) -> str:
+        return sse_event({"status": "started", "protocol": self.protocol, "message": message})
+
+    def delta(self, text: str) -> List[str]:
+        """编码一个新增片段，到达检查点间隔时附带一条 checkpoint 事件"""
+        if not text:
+            return []
+        self.seq += 1
+        self.length += len(text)
+        self._parts.append(text)
+        self._hash.update(text.encode("utf-8"))
+        events = [sse_event({"status": "delta", "seq": self.seq, "delta": text})]
+        if self.seq % self.checkpoint_interval == 0:
+            events.append(sse_event({"status": "checkpoint", **self.digest()}))
+        return events
+
+    def completed(self, **extra) -> str:
+        return sse_event({"status": "completed", **self.digest(), **extra})
+
+    def error(self, message: str) -> str:
+        return sse_event({"status": "error", "seq": self.seq, "message": message})
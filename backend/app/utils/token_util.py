@@ -0,0 +1,85 @@
+"""Token 数量估算工具（无需下载分词器，兼顾中英文）"""
+import re
+from typing import List, Dict
+
+# CJK 统一表意文字、扩展 A、兼容表意文字及全角标点
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+# 拉丁字母/数字组成的词
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+# 中文每字 1 个 token：cl100k（gpt-3.5/gpt-4）上常用字约 1 个、生僻字更多，
+# o200k、Qwen、DeepSeek 等中文词表更大的分词器通常少于 1 个；取 1.0 以免调度时对中文少预留额度
+CJK_TOKENS_PER_CHAR = 1.0
+ASCII_CHARS_PER_TOKEN = 4.0
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 常见模型的上下文长度（按模型名前缀匹配，越具体的前缀越靠前）
+MODEL_CONTEXT_TOKENS = (
+    ("gpt-3.5-turbo", 16385),
+    ("gpt-4o", 128000),
+    ("gpt-4.1", 1047576),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("o4", 200000),
+    ("claude", 200000),
+    ("deepseek", 65536),
+    ("qwen-long", 1000000),
+    ("qwen-turbo", 1000000),
+    ("qwen", 131072),
+    ("glm-4", 128000),
+    ("moonshot-v1-8k", 8192),
+    ("moonshot-v1-32k", 32768),
+    ("moonshot", 131072),
+    ("llama", 131072),
+)
+DEFAULT_CONTEXT_TOKENS = 32768
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算一段文本的 token 数
+
+    中文每字计 CJK_TOKENS_PER_CHAR 个，英文按词的字符数 / 4 计数（每个词至少 1 个），其余符号每个计 0.5。
+    用于调度前预留额度；对 cl100k 的中文接近实际值（含生僻字较多时仍可能偏小），对中文词表更大的分词器偏大。
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    word_tokens = 0.0
+    word_chars = 0
+    for match in _WORD_PATTERN.finditer(text):
+        length = match.end() - match.start()
+        word_chars += length
+        word_tokens += max(1.0, length / ASCII_CHARS_PER_TOKEN)
+    # 空白字符基本会与相邻 token 合并，不单独计数
+    whitespace = len(text) - len("".join(text.split()))
+    other_count = max(0, len(text) - cjk_count - word_chars - whitespace)
+    tokens = cjk_count * CJK_TOKENS_PER_CHAR + word_tokens + other_count * 0.5
+    return int(tokens) + 1
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    """估算一组对话消息的 prompt token 数"""
+    total = 3  # 回复的起始标记
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(message.get("content", "")))
+    return total
+
+
+def get_model_context_tokens(model: str, override: int = 0) -> int:
+    """
+    获取模型的上下文长度
+
+    override 为用户配置的值（大于 0 时优先使用），未知模型返回保守的默认值。
+    """
+    if override and override > 0:
+        return int(override)
+    name = (model or "").lower().split("/")[-1]
+    for prefix, tokens in MODEL_CONTEXT_TOKENS:
+        if name.startswith(prefix):
+            return tokens
+    return DEFAULT_CONTEXT_TOKENS
@@ -0,0 +1 @@
+"""压测工具：本地 OpenAI 兼容桩服务与端到端压测驱动"""
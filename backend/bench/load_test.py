@@ -0,0 +1,212 @@
+"""
+端到端压测驱动：N 个并发用户各自走完 上传 → 分析 → 提纲 → 内容 → 导出 的完整流程
+
+用法（在 backend 目录下，应用与桩服务均已启动）：
+    python -m bench.load_test --base-url http://127.0.0.1:8000 --users 10 --chapters 3
+
+加上 --configure 时会先把应用的模型配置指向桩服务（--stub-url），注意这会覆盖当前用户配置，
+建议用独立的 HOME 目录启动应用后再使用。
+结束后输出每个接口的 p50/p95/p99 延迟、错误数以及整体吞吐量。
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import docx
+import httpx
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def build_tender_docx(pages: int = 5) -> bytes:
+    """生成一份用于压测的招标文件（Word）"""
+    document = docx.Document()
+    document.add_heading("某市智慧城市综合管理平台建设项目招标文件", level=1)
+    for i in range(pages):
+        document.add_heading(f"第{i + 1}章 项目需求", level=2)
+        for j in range(8):
+            document.add_paragraph(
+                f"{i + 1}.{j + 1} 投标人应提供完整的系统建设方案，包括总体架构、功能设计、数据治理、"
+                f"安全保障、实施计划与运维服务，满足采购需求中的各项技术指标。"
+            )
+    table = document.add_table(rows=4, cols=3)
+    for row, cells in enumerate([("评分项", "分值", "评分标准"), ("技术方案", "30", "方案完整合理"),
+                                 ("实施计划", "20", "计划可行"), ("售后服务", "10", "响应及时")]):
+        for col, text in enumerate(cells):
+            table.cell(row, col).text = text
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class Recorder:
+    """按接口记录请求延迟与错误"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def timed(self, name: str, coro):
+        started = time.monotonic()
+        try:
+            result = await coro
+        except Exception:
+            self.errors[name] += 1
+            raise
+        self.latencies[name].append(time.monotonic() - started)
+        return result
+
+    def report(self, elapsed: float, workflows: int, failed_workflows: int) -> str:
+        lines = [f"{'endpoint':<44}{'count':>7}{'errors':>8}{'p50(s)':>10}{'p95(s)':>10}{'p99(s)':>10}"]
+        total_requests = 0
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(name, [])
+            total_requests += len(values) + self.errors.get(name, 0)
+            cells = [_percentile(values, q) for q in (0.5, 0.95, 0.99)]
+            lines.append(f"{name:<44}{len(values):>7}{self.errors.get(name, 0):>8}" +
+                         "".join(f"{c:>10.3f}" if c is not None else f"{'-':>10}" for c in cells))
+        lines.append("")
+        lines.append(f"总耗时 {elapsed:.1f}s，完成流程 {workflows - failed_workflows}/{workflows}，"
+                     f"吞吐量 {(workflows - failed_workflows) / elapsed:.3f} 流程/s，{total_requests / elapsed:.2f} 请求/s")
+        return "\n".join(lines)
+
+
+async def read_sse(response: httpx.Response) -> List[Any]:
+    """读取 SSE 响应中的全部 data 事件（[DONE] 之前）"""
+    events = []
+    async for line in response.aiter_lines():
+        if not line.startswith("data: "):
+            continue
+        data = line[6:]
+        if data == "[DONE]":
+            break
+        events.append(json.loads(data))
+    return events
+
+
+async def post_sse(client: httpx.AsyncClient, path: str, payload: Dict) -> List[Any]:
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        return await read_sse(response)
+
+
+def _joined_chunks(events: List[Any]) -> str:
+    for event in events:
+        if isinstance(event, dict) and event.get("error"):
+            raise RuntimeError(event.get("message") or "stream error")
+    return "".join(e.get("chunk", "") for e in events if isinstance(e, dict))
+
+
+def _leaves(items: List[Dict]) -> List[Dict]:
+    result = []
+    for item in items:
+        if item.get("children"):
+            result.extend(_leaves(item["children"]))
+        else:
+            result.append(item)
+    return result
+
+
+async def run_user(client: httpx.AsyncClient, recorder: Recorder, tender: bytes, chapters: int) -> None:
+    """一个用户的完整流程"""
+    async def upload():
+        response = await client.post("/api/document/upload", files={"file": ("tender.docx", tender, DOCX_MIME)})
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("success"):
+            raise RuntimeError(data.get("message"))
+        return data["file_content"]
+
+    file_content = await recorder.timed("POST /api/document/upload", upload())
+
+    async def analyze(analysis_type: str):
+        events = await post_sse(client, "/api/document/analyze-stream",
+                                {"file_content": file_content, "analysis_type": analysis_type})
+        return _joined_chunks(events)
+
+    overview, requirements = await asyncio.gather(
+        recorder.timed("POST /api/document/analyze-stream", analyze("overview")),
+        recorder.timed("POST /api/document/analyze-stream", analyze("requirements")),
+    )
+
+    async def outline():
+        events = await post_sse(client, "/api/outline/generate", {"overview": overview, "requirements": requirements})
+        return json.loads(_joined_chunks(events))["outline"]
+
+    items = await recorder.timed("POST /api/outline/generate", outline())
+
+    async def chapter(leaf: Dict):
+        events = await post_sse(client, "/api/content/generate-chapter-stream?protocol=2",
+                                {"chapter": leaf, "project_overview": overview})
+        if events and events[-1].get("status") == "error":
+            raise RuntimeError(events[-1].get("message"))
+        leaf["content"] = "".join(e["delta"] for e in events if e.get("status") == "delta")
+
+    for leaf in _leaves(items)[:chapters]:
+        await recorder.timed("POST /api/content/generate-chapter-stream", chapter(leaf))
+
+    async def export():
+        response = await client.post("/api/document/export-word",
+                                     json={"project_name": "压测项目", "project_overview": overview, "outline": items})
+        response.raise_for_status()
+        return len(response.content)
+
+    await recorder.timed("POST /api/document/export-word", export())
+
+
+async def run(args: argparse.Namespace) -> None:
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    limits = httpx.Limits(max_connections=args.users * 4, max_keepalive_connections=args.users * 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+        if args.configure:
+            response = await client.post("/api/config/save", json={
+                "api_key": "stub-key", "base_url": args.stub_url, "model_name": args.model,
+            })
+            response.raise_for_status()
+
+        tender = build_tender_docx(args.pages)
+        recorder = Recorder()
+        failed = 0
+        started = time.monotonic()
+
+        async def user(index: int):
+            nonlocal failed
+            await asyncio.sleep(index * args.ramp_up / max(1, args.users))
+            try:
+                await run_user(client, recorder, tender, args.chapters)
+            except Exception as e:
+                failed += 1
+                print(f"用户 {index + 1} 流程失败: {type(e).__name__}: {e}")
+
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+        print(recorder.report(time.monotonic() - started, args.users, failed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="端到端压测：上传 → 分析 → 提纲 → 内容 → 导出")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="应用地址")
+    parser.add_argument("--users", type=int, default=5, help="并发用户数")
+    parser.add_argument("--chapters", type=int, default=3, help="每个用户生成内容的章节数")
+    parser.add_argument("--pages", type=int, default=5, help="压测招标文件的章节数（控制文档长度）")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="用户在多少秒内逐个启动")
+    parser.add_argument("--timeout", type=float, default=600.0, help="单个请求超时（秒）")
+    parser.add_argument("--configure", action="store_true", help="先把应用的模型配置指向桩服务（会覆盖用户配置）")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9100/v1", help="桩服务地址（配合 --configure）")
+    parser.add_argument("--model", default="stub-large", help="桩服务模型名（配合 --configure）")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
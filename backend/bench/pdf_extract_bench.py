@@ -0,0 +1,128 @@
+"""
+PDF 提取基准：对比原来的逐页串行提取与按页分片的进程池提取
+
+用法（在 backend 目录下）：
+    python -m bench.pdf_extract_bench --pages 300 --workers 4 --shard-pages 20
+
+不指定 --pdf 时生成一份带中文正文与表格的测试 PDF。输出两种方式的耗时、页/秒、加速比，
+以及提取期间事件循环的最大停顿（原方式在事件循环中直接执行，期间其他请求全部被阻塞）。
+两种方式的提取结果逐页比对，不一致时以非零状态退出。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from app.config import settings
+from app.services.pdf_extractor import PdfExtractor, extract_page_range
+
+_PARAGRAPH = (
+    "投标人应提供完整的系统建设方案，包括总体架构、功能设计、数据治理、安全保障、实施计划与运维服务，"
+    "满足采购需求中的各项技术指标。"
+)
+
+
+def build_pdf(path: str, pages: int) -> None:
+    """生成测试 PDF：每页若干段中文正文和一个 4×3 的表格"""
+    import fitz
+
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        y = 60
+        page.insert_text((50, y), f"第{number + 1}章 项目需求", fontname="china-s", fontsize=14)
+        for line in range(12):
+            y += 22
+            page.insert_text((50, y), f"{number + 1}.{line + 1} {_PARAGRAPH[:30]}", fontname="china-s", fontsize=10)
+        top, row_height, col_width = y + 30, 24, 150
+        for row in range(5):
+            page.draw_line((50, top + row * row_height), (50 + 3 * col_width, top + row * row_height))
+        for col in range(4):
+            page.draw_line((50 + col * col_width, top), (50 + col * col_width, top + 4 * row_height))
+        cells = [("评分项", "分值", "评分标准"), ("技术方案", "30", "方案完整"),
+                 ("实施计划", "20", "计划可行"), ("售后服务", "10", "响应及时")]
+        for row, values in enumerate(cells):
+            for col, value in enumerate(values):
+                page.insert_text((56 + col * col_width, top + row * row_height + 16), value,
+                                 fontname="china-s", fontsize=10)
+    document.save(path)
+    document.close()
+
+
+async def _measure(coro_factory):
+    """执行提取，同时用一个 10ms 的定时协程测量事件循环的最大停顿"""
+    max_lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_lag
+        while running:
+            started = time.monotonic()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.monotonic() - started - 0.01)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    started = time.monotonic()
+    result = await coro_factory()
+    elapsed = time.monotonic() - started
+    running = False
+    await tick_task
+    return result, elapsed, max_lag
+
+
+async def run(args: argparse.Namespace) -> int:
+    path = args.pdf
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="pdf_bench_"), "tender.pdf")
+        build_pdf(path, args.pages)
+        print(f"已生成测试 PDF：{path}（{args.pages} 页）")
+
+    async def serial():
+        # 原方式：在事件循环中逐页执行 extract_text() 与 extract_tables()
+        return extract_page_range(path, 0, sys.maxsize)
+
+    settings.pdf_extract_workers = args.workers
+    settings.pdf_extract_shard_pages = args.shard_pages
+    extractor = PdfExtractor()
+
+    async def sharded():
+        return await extractor.extract_pages(path)
+
+    try:
+        # 预热进程池，避免把子进程启动时间计入
+        if extractor.worker_count() > 1:
+            await asyncio.get_running_loop().run_in_executor(extractor._get_pool(), extract_page_range, path, 0, 1)
+
+        baseline, baseline_seconds, baseline_lag = await _measure(serial)
+        pooled, pooled_seconds, pooled_lag = await _measure(sharded)
+    finally:
+        extractor.shutdown()
+
+    pages = len(baseline)
+    print(f"{'方式':<16}{'耗时(s)':>10}{'页/秒':>10}{'事件循环最大停顿(s)':>22}")
+    print(f"{'串行（原方式）':<14}{baseline_seconds:>10.2f}{pages / baseline_seconds:>10.1f}{baseline_lag:>22.3f}")
+    print(f"{'分片进程池':<15}{pooled_seconds:>10.2f}{pages / pooled_seconds:>10.1f}{pooled_lag:>22.3f}")
+    print(f"加速比 {baseline_seconds / pooled_seconds:.2f}x（进程数 {extractor.worker_count()}，"
+          f"每片 {args.shard_pages} 页，CPU 核数 {os.cpu_count()}）")
+
+    if pooled != baseline:
+        print("提取结果不一致！")
+        return 1
+    print("两种方式的提取结果逐页一致")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PDF 提取基准：串行 vs 按页分片的进程池")
+    parser.add_argument("--pdf", default=None, help="待提取的 PDF，留空时生成测试 PDF")
+    parser.add_argument("--pages", type=int, default=120, help="生成测试 PDF 的页数")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)), help="进程池大小")
+    parser.add_argument("--shard-pages", type=int, default=20, help="每个分片的页数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
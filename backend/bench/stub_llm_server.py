@@ -0,0 +1,206 @@
+"""
+本地 OpenAI 兼容桩服务：不消耗真实 API 额度地压测整条生成链路
+
+支持 /v1/models 与 /v1/chat/completions（流式与非流式），可配置首 token 延迟、生成速度、
+错误与 429 注入比例；对提纲类提示词返回符合模板的 JSON，其余请求返回指定长度的正文。
+
+用法（在 backend 目录下）：
+    python -m bench.stub_llm_server --port 9100 --ttft 0.5 --tokens-per-second 60 --rate-limit-rate 0.05
+
+然后将应用的 base_url 配置为 http://127.0.0.1:9100/v1（API Key 任意）。
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_OUTLINE_JSON = re.compile(r"<outline_json>\s*(.*?)\s*</outline_json>", re.S)
+_OUTPUT_FORMAT = re.compile(r"### Output Format in JSON\s*\n(.+?)(?:\n\s*\n|\Z)", re.S)
+
+_FILLER = (
+    "本项目将严格按照招标文件要求组织实施，建立完善的质量保障体系与进度控制机制，"
+    "通过标准化流程、专业化团队与信息化手段，确保各项技术指标全面满足采购需求。"
+)
+
+
+@dataclass
+class StubConfig:
+    """桩服务行为配置"""
+    ttft: float = 0.3  # 首 token 延迟（秒）
+    ttft_jitter: float = 0.1  # 首 token 延迟的随机抖动（秒）
+    tokens_per_second: float = 50.0  # 生成速度，0 表示不限速
+    completion_tokens: int = 600  # 正文类回复的 token 数
+    error_rate: float = 0.0  # 返回 500 的比例
+    rate_limit_rate: float = 0.0  # 返回 429 的比例
+    retry_after: float = 1.0  # 429 响应的 Retry-After（秒）
+    models: tuple = ("stub-small", "stub-large")
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _fill(value: Any, path: str = "") -> Any:
+    """将模板中的空字符串填充为占位内容，保持结构不变"""
+    if isinstance(value, dict):
+        return {k: _fill(v, f"{path}.{k}" if path else k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, f"{path}[{i}]") for i, v in enumerate(value)]
+    if isinstance(value, str) and not value:
+        return f"{path.rsplit('.', 1)[-1]}（桩服务生成）"
+    return value
+
+
+def _json_answer(messages: List[Dict[str, Any]], json_mode: bool) -> Optional[str]:
+    """提纲类提示词：按 outline_json 模板或 Output Format 示例返回合法 JSON，无法识别时返回 None"""
+    text = "\n".join(str(m.get("content") or "") for m in messages)
+    match = _OUTLINE_JSON.search(text)
+    if match:
+        try:
+            return json.dumps(_fill(json.loads(match.group(1))), ensure_ascii=False)
+        except ValueError:
+            pass
+    match = _OUTPUT_FORMAT.search(text)
+    if match:
+        try:
+            example = json.loads(match.group(1).strip())
+        except ValueError:
+            example = None
+        if isinstance(example, list) and example:
+            items = []
+            for i in range(random.randint(3, 6)):
+                item = {k: f"{v}{i + 1}" if isinstance(v, str) else v for k, v in example[0].items()}
+                items.append(item)
+            return json.dumps(items, ensure_ascii=False)
+        if isinstance(example, dict):
+            return json.dumps(_fill(example), ensure_ascii=False)
+    if json_mode:
+        return json.dumps({"outline": [
+            {"id": str(i + 1), "title": f"章节{i + 1}", "description": "桩服务生成", "children": []}
+            for i in range(3)
+        ]}, ensure_ascii=False)
+    return None
+
+
+def _prose(tokens: int) -> str:
+    text = _FILLER * (tokens * 2 // len(_FILLER) + 1)
+    return text[:tokens * 2]
+
+
+def _split_tokens(text: str) -> List[str]:
+    """按约 2 个字符一个 token 切分输出"""
+    return [text[i:i + 2] for i in range(0, len(text), 2)] or [""]
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Stub OpenAI-compatible server")
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "completion_tokens": 0}
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "stub"} for model in config.models
+        ]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit_error"}},
+                status_code=429, headers={"Retry-After": str(config.retry_after)},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Internal error (stub)", "type": "server_error"}}, status_code=500)
+
+        messages = body.get("messages") or []
+        json_mode = (body.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+        answer = _json_answer(messages, json_mode) or _prose(config.completion_tokens)
+        model = body.get("model") or config.models[0]
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content") or "")) for m in messages)
+        completion_tokens = _estimate_tokens(answer)
+        stats["completion_tokens"] += completion_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        ttft = max(0.0, config.ttft + random.uniform(-config.ttft_jitter, config.ttft_jitter))
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + (completion_tokens / config.tokens_per_second if config.tokens_per_second else 0))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def event(choices, **extra) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(ttft)
+            interval = 1 / config.tokens_per_second if config.tokens_per_second else 0
+            for piece in _split_tokens(answer):
+                yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                if interval:
+                    await asyncio.sleep(interval)
+            yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield event([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=StubConfig.ttft, help="首 token 延迟（秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=StubConfig.ttft_jitter, help="首 token 延迟抖动（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=StubConfig.tokens_per_second, help="生成速度，0 表示不限速")
+    parser.add_argument("--completion-tokens", type=int, default=StubConfig.completion_tokens, help="正文类回复的 token 数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=StubConfig.retry_after, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    config = StubConfig(
+        ttft=args.ttft,
+        ttft_jitter=args.ttft_jitter,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""测试公共配置：把 backend 加入导入路径，并把用户配置目录指向临时目录"""
+import os
+import sys
+import tempfile
+
+# 必须在导入 app 之前设置：config_manager 在导入时创建 ~/.ai_write_helper
+os.environ["HOME"] = tempfile.mkdtemp(prefix="bidmaster-test-home-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,244 @@
+"""可恢复的全文内容生成任务：章节检查点、恢复与租约接管"""
+import asyncio
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.content_jobs import (
+    ContentJobManager, ContentJobStore, CHAPTER_COMPLETED, JOB_CANCELLED, JOB_COMPLETED, JOB_RUNNING,
+)
+from app.services.openai_service import OpenAIService
+
+OUTLINE = {"outline": [
+    {"id": "1", "title": "技术方案", "description": "", "children": [
+        {"id": "1.1", "title": "总体设计", "description": ""},
+        {"id": "1.2", "title": "实施计划", "description": ""},
+    ]},
+    {"id": "2", "title": "售后服务", "description": ""},
+]}
+
+
+class FakeGenerator:
+    """替代 generate_content_for_outline_stream：只生成 completed_contents 之外的章节，gate 未打开时停在章节之前"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    def install(self, monkeypatch):
+        fake = self
+
+        async def generate(service, outline, project_overview="", concurrency=None, draft=False,
+                           requirements="", tender_text="", completed_contents=None):
+            completed_contents = completed_contents or {}
+            leaves = OpenAIService._collect_leaf_chapters(outline['outline'])
+            fake.calls.append(sorted(completed_contents))
+            for index, leaf in enumerate(leaves):
+                if index in completed_contents:
+                    continue
+                await fake.gate.wait()
+                yield {'status': 'chapter_completed', 'index': index,
+                       'chapter_id': leaf['chapter']['id'], 'content': f"内容{index}"}
+            yield {'status': 'completed', 'outline': outline, 'failed': []}
+
+        monkeypatch.setattr(OpenAIService, "generate_content_for_outline_stream", generate)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ContentJobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(settings, "content_job_lease_seconds", 0.3)
+    monkeypatch.setattr(settings, "content_job_poll_interval", 0.05)
+    generator = FakeGenerator()
+    generator.install(monkeypatch)
+    return generator
+
+
+async def _wait_status(manager, job_id, status, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await manager.get_job(job_id)
+        if job['status'] == status:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"任务状态未变为 {status}: {job['status']}")
+
+
+def _seed_job(store, job_id="20260101000000-aaaaaaaa", completed=(0,), owner=None, lease_until=None):
+    """写入一个生成到一半的任务（模拟进程中途退出）"""
+    leaves = OpenAIService._collect_leaf_chapters(OUTLINE['outline'])
+    store.create({'job_id': job_id, 'outline': OUTLINE, 'project_overview': "", 'requirements': "",
+                  'tender_text': "", 'concurrency': None}, leaves)
+    for index in completed:
+        store.save_chapter(job_id, index, CHAPTER_COMPLETED, f"内容{index}")
+    store.set_status(job_id, JOB_RUNNING)
+    if owner is not None:
+        conn = store._get_conn()
+        conn.execute("UPDATE content_jobs SET owner = ?, lease_until = ? WHERE job_id = ?",
+                     (owner, lease_until, job_id))
+        conn.commit()
+    return job_id
+
+
+def test_job_runs_to_completion(store, fake):
+    async def run():
+        manager = ContentJobManager(store)
+        job = await manager.create_job(OUTLINE)
+        assert job['total'] == 3
+        job = await _wait_status(manager, job['job_id'], JOB_COMPLETED)
+        assert job['completed'] == 3 and job['failed'] == 0
+        await asyncio.sleep(0.01)
+        # 结束后释放租约，也不再持有 Task
+        assert (await manager.get_job(job['job_id']))['owner'] is None
+        assert manager._tasks == {}
+        result = await manager.get_result(job['job_id'])
+        leaves = OpenAIService._collect_leaf_chapters(result['outline'])
+        assert [leaf['chapter']['content'] for leaf in leaves] == ["内容0", "内容1", "内容2"]
+        events = [event async for event in manager.events(job['job_id'])]
+        assert [event['status'] for event in events] == ['snapshot']
+    asyncio.run(run())
+
+
+def test_resume_generates_only_unfinished_chapters(store, fake):
+    async def run():
+        job_id = _seed_job(store, completed=(0,))
+        manager = ContentJobManager(store)
+        assert await manager.resume() == 1
+        await _wait_status(manager, job_id, JOB_COMPLETED)
+        assert fake.calls == [[0]]
+        chapters = store.chapters(job_id)
+        assert [chapter['content'] for chapter in chapters] == ["内容0", "内容1", "内容2"]
+    asyncio.run(run())
+
+
+def test_resume_skips_job_with_live_lease_and_takes_over_expired(store, fake):
+    async def run():
+        job_id = _seed_job(store, owner="other-process", lease_until=time.time() + 60)
+        manager = ContentJobManager(store)
+        assert await manager.resume() == 0
+        assert fake.calls == []
+
+        # 持有者异常退出，租约过期后可以接管
+        _expire_lease(store, job_id)
+        assert await manager.resume() == 1
+        await _wait_status(manager, job_id, JOB_COMPLETED)
+        assert fake.calls == [[0]]
+    asyncio.run(run())
+
+
+def _expire_lease(store, job_id):
+    conn = store._get_conn()
+    conn.execute("UPDATE content_jobs SET lease_until = ? WHERE job_id = ?", (time.time() - 1, job_id))
+    conn.commit()
+
+
+def test_claim_is_exclusive(store):
+    job_id = _seed_job(store)
+    assert store.claim(job_id, "a", 60)
+    assert not store.claim(job_id, "b", 60)
+    assert store.claim(job_id, "a", 60)
+    store.release(job_id, "a")
+    assert store.claim(job_id, "b", 60)
+    assert not store.renew(job_id, "a", 60)
+    assert store.renew(job_id, "b", 60)
+
+
+def test_lease_renewed_while_running_and_lost_on_takeover(store, fake):
+    async def run():
+        fake.gate.clear()
+        job_id = _seed_job(store)
+        manager = ContentJobManager(store)
+        await manager.resume()
+        await asyncio.sleep(settings.content_job_lease_seconds * 1.5)
+        # 生成期间持续续约
+        job = await manager.get_job(job_id)
+        assert job['owner'] == manager.owner and job['lease_until'] > time.time()
+
+        # 其他进程接管后，本进程续约失败并停止生成
+        conn = store._get_conn()
+        conn.execute("UPDATE content_jobs SET owner = 'other-process' WHERE job_id = ?", (job_id,))
+        conn.commit()
+        await asyncio.sleep(settings.content_job_lease_seconds)
+        assert not manager._running(job_id)
+        assert store.get(job_id)['owner'] == 'other-process'
+        await manager.aclose()
+    asyncio.run(run())
+
+
+def test_events_take_over_expired_job(store, fake):
+    async def run():
+        job_id = _seed_job(store, owner="dead-process", lease_until=time.time() + 0.2)
+        manager = ContentJobManager(store)
+        events = [event async for event in manager.events(job_id)]
+        statuses = [event['status'] for event in events]
+        assert statuses[0] == 'snapshot'
+        assert statuses[1:] == ['chapter_completed', 'chapter_completed', 'completed']
+        assert [event['index'] for event in events[1:3]] == [1, 2]
+        assert store.get(job_id)['status'] == JOB_COMPLETED
+    asyncio.run(run())
+
+
+def test_events_poll_job_running_elsewhere(store, fake):
+    async def run():
+        job_id = _seed_job(store, completed=(), owner="other-process", lease_until=time.time() + 60)
+        manager = ContentJobManager(store)
+
+        async def other_process():
+            await asyncio.sleep(0.1)
+            store.save_chapter(job_id, 0, CHAPTER_COMPLETED, "内容0")
+            await asyncio.sleep(0.1)
+            store.save_chapter(job_id, 1, CHAPTER_COMPLETED, "内容1")
+            store.save_chapter(job_id, 2, CHAPTER_COMPLETED, "内容2")
+            store.set_status(job_id, JOB_COMPLETED)
+
+        writer = asyncio.create_task(other_process())
+        events = [event async for event in manager.events(job_id)]
+        await writer
+        assert [event['status'] for event in events] == ['snapshot'] + ['chapter_completed'] * 3 + [JOB_COMPLETED]
+        assert fake.calls == []
+    asyncio.run(run())
+
+
+def test_cancel_then_retry_continues(store, fake):
+    async def run():
+        fake.gate.clear()
+        manager = ContentJobManager(store)
+        job = await manager.create_job(OUTLINE)
+        job_id = job['job_id']
+        await asyncio.sleep(0.05)
+        job = await manager.cancel(job_id)
+        assert job['status'] == JOB_CANCELLED
+        assert not manager._running(job_id)
+        assert store.get(job_id)['owner'] is None
+
+        fake.gate.set()
+        await manager.retry(job_id)
+        await _wait_status(manager, job_id, JOB_COMPLETED)
+    asyncio.run(run())
+
+
+def test_retry_rejects_job_leased_elsewhere(store, fake):
+    async def run():
+        job_id = _seed_job(store, owner="other-process", lease_until=time.time() + 60)
+        manager = ContentJobManager(store)
+        with pytest.raises(Exception, match="任务正在运行"):
+            await manager.retry(job_id)
+    asyncio.run(run())
+
+
+def test_unknown_job(store, fake):
+    async def run():
+        manager = ContentJobManager(store)
+        assert await manager.get_job("missing") is None
+        assert await manager.get_result("missing") is None
+        assert await manager.cancel("missing") is None
+        assert [event async for event in manager.events("missing")] == []
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+"""章节上下文检索（BM25）"""
+from app.utils.context_retriever import (
+    BM25Index, ProjectContext, chapter_query, split_passages, tokenize,
+)
+from app.utils.token_util import estimate_tokens
+
+OVERVIEW = "\n".join([
+    "本项目为某市智慧交通管理平台建设项目，建设周期十二个月。",
+    "系统包括信号控制子系统、视频监控子系统与数据中心。",
+    "信号控制子系统需要支持区域协调控制与绿波带优化。",
+    "视频监控子系统覆盖全市主要路口，接入高清摄像机两千路。",
+    "数据中心采用双活架构，满足等级保护三级要求。",
+])
+REQUIREMENTS = "\n".join([
+    "售后服务方案：响应时间、备品备件与培训计划。",
+    "信号控制方案的先进性与可实施性。",
+])
+TENDER = "投标人须提供信号机的检测报告。\n付款方式为按进度付款。"
+
+
+def _context(passage_tokens=20):
+    return ProjectContext(OVERVIEW, REQUIREMENTS, TENDER, passage_tokens=passage_tokens)
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize("信号控制") == ["信号", "号控", "控制"]
+    assert tokenize("主 GPU v2") == ["主", "gpu", "v2"]
+
+
+def test_split_passages_respects_max_tokens():
+    passages = split_passages(OVERVIEW, 30)
+    assert len(passages) > 1
+    assert all(estimate_tokens(p) <= 30 or "\n" not in p for p in passages)
+    assert "".join(p.replace("\n", "") for p in passages) == OVERVIEW.replace("\n", "")
+
+
+def test_bm25_ranks_relevant_document_first():
+    index = BM25Index(["信号控制与绿波带", "视频监控摄像机", "付款方式"])
+    scores = index.scores("信号控制方案")
+    assert scores[0] > 0 and scores[1] == 0 and scores[2] == 0
+
+
+def test_overview_within_budget_kept_whole():
+    context = _context()
+    selection = context.select("信号控制方案", budget_tokens=context.full_tokens + context.supplement_tokens)
+    assert selection.overview == OVERVIEW
+    # 检索的只有补充资料中的相关段落
+    assert "【项目概述】" not in selection.text
+    assert "信号控制方案的先进性" in selection.text
+    assert "信号机的检测报告" in selection.text
+    assert "付款方式" not in selection.text
+    assert selection.tokens <= context.full_tokens + context.supplement_tokens
+
+
+def test_overview_exactly_at_budget_kept_without_supplements():
+    context = _context()
+    selection = context.select("信号控制方案", budget_tokens=context.full_tokens)
+    assert selection.overview == OVERVIEW
+    assert selection.text == ""
+    assert selection.tokens == context.full_tokens
+    assert selection.passages == 0
+    assert selection.saved_tokens == 0 and selection.added_tokens == 0
+
+
+def test_overview_over_budget_retrieves_passages():
+    context = _context()
+    budget = context.full_tokens - 1
+    selection = context.select("信号控制子系统", budget_tokens=budget)
+    assert selection.overview == ""
+    assert selection.tokens <= budget
+    # 概述第一段始终保留，其余按相关性选取
+    assert selection.text.startswith("【项目概述】\n本项目为某市智慧交通管理平台")
+    assert "信号控制" in selection.text
+    assert selection.saved_tokens > 0
+
+
+def test_irrelevant_query_does_not_pad_budget():
+    context = _context()
+    selection = context.select("量子计算", budget_tokens=context.full_tokens - 1)
+    assert selection.passages == 1
+    assert selection.text == "【项目概述】\n" + context.passages[0][1]
+
+    selection = context.select("量子计算", budget_tokens=10 ** 6)
+    assert selection.overview == OVERVIEW
+    assert selection.text == ""
+
+
+def test_budget_smaller_than_first_passage_selects_nothing():
+    context = _context()
+    selection = context.select("信号控制", budget_tokens=1)
+    assert selection.overview == "" and selection.text == ""
+    assert selection.tokens == 0 and selection.passages == 0
+
+
+def test_passages_ordered_by_source_then_position():
+    context = _context()
+    selection = context.select("信号控制 视频监控 售后服务 检测报告", budget_tokens=context.full_tokens - 1)
+    text = selection.text
+    positions = [text.find(label) for label in ("【项目概述】", "【评分要求】", "【招标文件】")]
+    assert positions == sorted(positions) and positions[0] == 0
+
+
+def test_chapter_query_includes_parents():
+    query = chapter_query({"title": "绿波带优化", "description": "协调控制"}, [{"title": "信号控制方案"}])
+    assert query.split("\n") == ["绿波带优化", "协调控制", "信号控制方案"]
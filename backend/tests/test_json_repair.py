@@ -0,0 +1,89 @@
+"""本地 JSON 修复与 strict json_schema 输出格式"""
+import json
+
+from app.utils.json_util import (
+    build_json_schema, build_response_format, parse_and_check_json, repair_json, wrapped_list_template,
+)
+
+OUTLINE_SCHEMA = json.dumps([{"rating_item": "", "new_title": ""}])
+ITEM = {"rating_item": "技术方案", "new_title": "总体技术方案"}
+
+
+def test_valid_json_needs_no_fixes():
+    data, fixes = repair_json(json.dumps([ITEM], ensure_ascii=False), OUTLINE_SCHEMA)
+    assert data == [ITEM]
+    assert fixes == []
+
+
+def test_markdown_fence_and_surrounding_text():
+    text = "以下是结果：\n```json\n" + json.dumps([ITEM], ensure_ascii=False) + "\n```"
+    data, fixes = repair_json(text, OUTLINE_SCHEMA)
+    assert data == [ITEM]
+    assert "extract" in fixes
+
+    data, fixes = repair_json("```json\n" + json.dumps([ITEM], ensure_ascii=False) + "\n```", OUTLINE_SCHEMA)
+    assert data == [ITEM]
+    assert fixes == ["markdown_fence"]
+
+
+def test_trailing_commas():
+    data, fixes = repair_json('[{"rating_item": "技术方案", "new_title": "总体技术方案",},]', OUTLINE_SCHEMA)
+    assert data == [ITEM]
+    assert "trailing_comma" in fixes
+
+
+def test_truncated_output_is_closed():
+    text = '[{"rating_item": "技术方案", "new_title": "总体技术方案"}, {"rating_item": "质量'
+    data, fixes = repair_json(text, OUTLINE_SCHEMA)
+    assert "close_truncated" in fixes
+    # 截断的最后一项缺少必需键，补齐后校验失败
+    assert data is None
+
+    text = '[{"rating_item": "技术方案", "new_title": "总体技术方案"}, {"rating_'
+    data, fixes = repair_json(text, OUTLINE_SCHEMA)
+    assert data is None
+
+    data, fixes = repair_json('{"outline": [{"id": "1", "title": "概述"', {"outline": [{"id": "", "title": ""}]})
+    assert data == {"outline": [{"id": "1", "title": "概述"}]}
+    assert fixes == ["close_truncated"]
+
+
+def test_wrapped_list_is_unwrapped():
+    data, fixes = repair_json(json.dumps({"items": [ITEM]}, ensure_ascii=False), OUTLINE_SCHEMA)
+    assert data == [ITEM]
+    assert fixes == ["unwrap"]
+
+
+def test_unrepairable_returns_none():
+    assert repair_json("完全不是 JSON", OUTLINE_SCHEMA)[0] is None
+    assert repair_json(json.dumps([{"rating_item": "a"}]), OUTLINE_SCHEMA)[0] is None
+    assert repair_json("[]", "not a schema")[0] is None
+
+
+def test_build_json_schema_is_strict():
+    schema = build_json_schema({"a": "", "b": [{"c": 0}], "d": True})
+    assert schema["required"] == ["a", "b", "d"]
+    assert schema["additionalProperties"] is False
+    assert schema["properties"]["b"]["items"]["properties"]["c"] == {"type": "number"}
+    assert schema["properties"]["d"] == {"type": "boolean"}
+
+
+def test_list_template_wrapped_in_items():
+    response_format = build_response_format(json.loads(OUTLINE_SCHEMA))
+    schema = response_format["json_schema"]["schema"]
+    assert response_format["json_schema"]["strict"] is True
+    assert schema["required"] == ["items"]
+    assert schema["properties"]["items"]["type"] == "array"
+
+
+def test_wrapped_list_template():
+    response_format = build_response_format(json.loads(OUTLINE_SCHEMA))
+    wrapped = wrapped_list_template(OUTLINE_SCHEMA, response_format)
+    assert wrapped == {"items": json.loads(OUTLINE_SCHEMA)}
+    # 按包裹后的模板校验 strict 输出，再取出 items
+    is_valid, _, data = parse_and_check_json(json.dumps({"items": [ITEM]}, ensure_ascii=False), wrapped)
+    assert is_valid and data["items"] == [ITEM]
+
+    assert wrapped_list_template(OUTLINE_SCHEMA, None) is None
+    assert wrapped_list_template(OUTLINE_SCHEMA, {"type": "json_object"}) is None
+    assert wrapped_list_template({"outline": []}, build_response_format({"outline": []})) is None
@@ -0,0 +1,81 @@
+"""流式 JSON 结构校验器"""
+import json
+
+from app.utils.json_util import IncrementalJsonValidator, check_json
+
+OUTLINE_SCHEMA = [{"rating_item": "", "new_title": ""}]
+NESTED_SCHEMA = {"outline": [{"id": "", "title": "", "children": [{"id": "", "title": ""}]}]}
+
+
+def _feed_chunks(validator, text, size=3):
+    for i in range(0, len(text), size):
+        error = validator.feed(text[i:i + size])
+        if error:
+            return error
+    return None
+
+
+def test_valid_stream_passes_in_any_chunking():
+    text = json.dumps({"outline": [{"id": "1", "title": "概述", "children": [{"id": "1.1", "title": "背景"}]}]},
+                      ensure_ascii=False)
+    assert check_json(text, NESTED_SCHEMA)[0]
+    for size in (1, 2, 7, len(text)):
+        assert _feed_chunks(IncrementalJsonValidator(NESTED_SCHEMA), text, size) is None
+
+
+def test_truncated_stream_is_not_reported():
+    # 截断本身不是"确定失败"，交给最终的 check_json / repair_json
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    assert validator.feed('[{"rating_item": "技术方案", "new_ti') is None
+
+
+def test_non_json_prefix_fails_immediately():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    assert validator.feed("好的，以下是目录：") is not None
+    assert validator.consumed == 1
+
+
+def test_top_level_type_mismatch():
+    assert IncrementalJsonValidator(OUTLINE_SCHEMA).feed('{"items": []}') is not None
+    assert IncrementalJsonValidator(NESTED_SCHEMA).feed("[") is not None
+
+
+def test_known_key_type_mismatch():
+    validator = IncrementalJsonValidator(NESTED_SCHEMA)
+    assert validator.feed('{"outline": "目录"') is not None
+
+
+def test_missing_required_key_on_close():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    assert validator.feed('[{"rating_item": "技术方案"}') is not None
+
+
+def test_empty_list_for_non_empty_template():
+    assert IncrementalJsonValidator(NESTED_SCHEMA).feed('{"outline": []') is not None
+
+
+def test_trailing_content_after_value():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    assert validator.feed('[{"rating_item": "a", "new_title": "b"}] 以上') is not None
+    lenient = IncrementalJsonValidator(OUTLINE_SCHEMA, lenient=True)
+    assert lenient.feed('[{"rating_item": "a", "new_title": "b"}] 以上') is None
+
+
+def test_error_is_sticky():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    error = validator.feed("x")
+    assert validator.feed('[{"rating_item": "a", "new_title": "b"}]') == error
+
+
+def test_lenient_allows_repairable_defects():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA, lenient=True)
+    text = '```json\n{"items": [{"rating_item": "a", "new_title": "b",},]}\n```'
+    assert _feed_chunks(validator, text) is None
+    strict = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    assert _feed_chunks(strict, text) is not None
+
+
+def test_escaped_quotes_inside_strings():
+    validator = IncrementalJsonValidator(OUTLINE_SCHEMA)
+    text = r'[{"rating_item": "含\"引号\"与\\反斜杠", "new_title": "b"}]'
+    assert _feed_chunks(validator, text, 1) is None
@@ -0,0 +1,150 @@
+"""离线批量生成：Batch 输出解析、任务目录与本地后端"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services import llm_batch
+from app.services.llm_batch import (
+    BatchJobManager, JOB_COMPLETED, _truncate_partial_line, parse_batch_output, read_jsonl,
+)
+from app.services.openai_service import OpenAIService
+
+OUTLINE = {"outline": [
+    {"id": "1", "title": "技术方案", "description": "", "children": [
+        {"id": "1.1", "title": "总体设计", "description": ""},
+    ]},
+    {"id": "2", "title": "售后服务", "description": ""},
+]}
+
+
+def _success(custom_id, content):
+    return {"custom_id": custom_id, "error": None, "response": {
+        "status_code": 200, "body": {"choices": [{"message": {"role": "assistant", "content": content}}]}}}
+
+
+def test_parse_batch_output():
+    lines = [
+        _success("chapter-0", "内容"),
+        {"custom_id": "chapter-1", "response": None, "error": {"message": "超时"}},
+        {"custom_id": "chapter-2", "error": None,
+         "response": {"status_code": 429, "body": {"error": {"message": "rate limited"}}}},
+        {"custom_id": "chapter-3", "error": None, "response": {"status_code": 500, "body": None}},
+        {"custom_id": "chapter-4", "error": None, "response": {"status_code": 200, "body": {"choices": []}}},
+        {"response": {"status_code": 200}},
+    ]
+    assert parse_batch_output(lines) == {
+        "chapter-0": ("内容", None),
+        "chapter-1": (None, "超时"),
+        "chapter-2": (None, "rate limited"),
+        "chapter-3": (None, "HTTP 500"),
+        "chapter-4": (None, "响应格式无效"),
+    }
+
+
+def test_read_jsonl_skips_blank_and_partial_lines(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"a": 1}\n\n{"b": 2}\n{"c": ', encoding="utf-8")
+    assert read_jsonl(str(path)) == [{"a": 1}, {"b": 2}]
+    assert read_jsonl(str(tmp_path / "missing.jsonl")) == []
+
+    _truncate_partial_line(str(path))
+    assert path.read_text(encoding="utf-8") == '{"a": 1}\n\n{"b": 2}\n'
+
+
+def test_job_id_validation(tmp_path):
+    manager = BatchJobManager(str(tmp_path))
+    assert manager.is_valid_job_id("20260101120000-0123abcd")
+    for job_id in ("../etc", "20260101120000-0123abcd\n", "20260101120000-0123ABCD", "", None):
+        assert not manager.is_valid_job_id(job_id)
+    with pytest.raises(ValueError):
+        manager._job_dir("..")
+
+    async def run():
+        assert await manager.get_job("../../x") is None
+        assert await manager.get_result("../../x") is None
+    asyncio.run(run())
+
+
+def test_apply_chapter_batch_results():
+    results = {"chapter-0": ("设计内容", None), "chapter-1": (None, "超时")}
+    outline, failed = OpenAIService.apply_chapter_batch_results(OUTLINE, results)
+    leaves = OpenAIService._collect_leaf_chapters(outline['outline'])
+    assert leaves[0]['chapter']['content'] == "设计内容"
+    assert 'content' not in leaves[1]['chapter']
+    assert failed == ["2"]
+    assert 'content' not in OUTLINE['outline'][0]['children'][0]
+
+
+def test_local_backend_job_end_to_end(tmp_path, monkeypatch):
+    async def fake_collect(self, messages, temperature=0.7, call_site="default"):
+        await asyncio.sleep(0.01)
+        return "生成的内容"
+
+    monkeypatch.setattr(OpenAIService, "_collect_stream_text", fake_collect)
+    monkeypatch.setattr(OpenAIService, "_route_model", lambda self, call_site: "routed-chapter-model")
+
+    async def run():
+        manager = BatchJobManager(str(tmp_path))
+        job = await manager.create_content_job(OUTLINE, "项目概述", backend="local")
+        job_id = job['job_id']
+        # 记录请求体中实际使用的（路由后的）模型
+        assert job['model'] == "routed-chapter-model"
+        requests = read_jsonl(str(tmp_path / job_id / "input.jsonl"))
+        assert [request['custom_id'] for request in requests] == ["chapter-0", "chapter-1"]
+        assert {request['body']['model'] for request in requests} == {"routed-chapter-model"}
+
+        deadline = time.monotonic() + 5
+        while (await manager.get_job(job_id))['status'] != JOB_COMPLETED:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        job = await manager.get_job(job_id)
+        assert 'leaves' not in job and job['failed'] == []
+        assert [item['job_id'] for item in await manager.list_jobs()] == [job_id]
+
+        result = await manager.get_result(job_id)
+        leaves = OpenAIService._collect_leaf_chapters(result['outline'])
+        assert [leaf['chapter']['content'] for leaf in leaves] == ["生成的内容", "生成的内容"]
+        manifest = json.loads((tmp_path / job_id / "manifest.json").read_text(encoding="utf-8"))
+        assert manifest['leaves'] and manifest['batch_status'] == "completed"
+        await manager.aclose()
+    asyncio.run(run())
+
+
+def test_resume_continues_unfinished_local_batch(tmp_path, monkeypatch):
+    calls = []
+
+    async def fake_collect(self, messages, temperature=0.7, call_site="default"):
+        calls.append(messages[-1]['content'])
+        return "续写内容"
+
+    monkeypatch.setattr(OpenAIService, "_collect_stream_text", fake_collect)
+    monkeypatch.setattr(llm_batch.LocalBatchBackend, "poll_interval", 0.05)
+
+    async def run():
+        manager = BatchJobManager(str(tmp_path))
+        service = OpenAIService()
+        requests, leaves = service.compile_chapter_batch(OUTLINE, "项目概述")
+        job_id = "20260101120000-0123abcd"
+        manifest = {'job_id': job_id, 'backend': "local", 'model': "m", 'status': llm_batch.JOB_SUBMITTED,
+                    'batch_id': job_id, 'batch_status': "in_progress", 'total': len(requests),
+                    'leaves': leaves, 'failed': [], 'error': None, 'created_at': time.time()}
+        manager._write_job_files(manifest, OUTLINE, requests)
+        # 上次运行完成了第一个请求，第二个请求只写了一半
+        with open(tmp_path / job_id / "local_output.jsonl", "w", encoding="utf-8") as f:
+            f.write(json.dumps(_success("chapter-0", "已有内容"), ensure_ascii=False) + "\n")
+            f.write('{"custom_id": "chapter-1", "resp')
+
+        assert await manager.resume() == 1
+        deadline = time.monotonic() + 5
+        while (await manager.get_job(job_id))['status'] != JOB_COMPLETED:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        assert len(calls) == 1
+        result = await manager.get_result(job_id)
+        leaves = OpenAIService._collect_leaf_chapters(result['outline'])
+        assert [leaf['chapter']['content'] for leaf in leaves] == ["已有内容", "续写内容"]
+        assert await manager.resume() == 0
+        await manager.aclose()
+    asyncio.run(run())
@@ -0,0 +1,152 @@
+"""按模型的 RPM / TPM 令牌桶调度"""
+import asyncio
+import time
+
+from app.services import openai_service
+from app.services.llm_budget import ModelBudget, TokenBucket
+from app.services.llm_call import LLMCall
+from app.services.llm_endpoints import Endpoint, EndpointPool
+from app.services.llm_limiter import AdaptiveLimiter
+from app.utils.token_util import estimate_tokens, estimate_messages_tokens
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(60) == 0
+    bucket.tokens = 0
+    bucket._updated = time.monotonic()
+    assert 9.0 < bucket.wait_time(10) <= 10.0
+
+
+def test_reserve_takes_request_and_tokens():
+    async def run():
+        budget = ModelBudget("m", rpm=10, tpm=1000)
+        reservation = await budget.reserve(300)
+        assert reservation.tokens == 300
+        assert round(budget.request_bucket.tokens) == 9
+        assert round(budget.token_bucket.tokens) == 700
+    asyncio.run(run())
+
+
+def test_settle_refunds_and_charges_difference():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=1000)
+        reservation = await budget.reserve(500)
+        reservation.settle(200)
+        assert round(budget.token_bucket.tokens) == 800
+        # 重复结算无效
+        reservation.settle(0)
+        assert round(budget.token_bucket.tokens) == 800
+
+        reservation = await budget.reserve(100)
+        reservation.settle(400)
+        assert round(budget.token_bucket.tokens) == 400
+    asyncio.run(run())
+
+
+def test_settle_none_keeps_reservation():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=1000)
+        reservation = await budget.reserve(500)
+        reservation.settle(None)
+        assert round(budget.token_bucket.tokens) == 500
+    asyncio.run(run())
+
+
+def test_oversized_request_clamped_to_capacity():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=1000)
+        reservation = await asyncio.wait_for(budget.reserve(5000), 1)
+        assert reservation.tokens == 1000
+    asyncio.run(run())
+
+
+def test_unlimited_budget_never_waits():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=0)
+        assert budget.unlimited
+        for _ in range(100):
+            await budget.reserve(10 ** 6)
+    asyncio.run(run())
+
+
+def test_waiter_admitted_after_refund():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=1000)
+        first = await budget.reserve(1000)
+        waiter = asyncio.create_task(budget.reserve(500))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        first.settle(0)
+        await asyncio.wait_for(waiter, 1)
+    asyncio.run(run())
+
+
+def test_call_sites_served_round_robin():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=100)
+        blocker = await budget.reserve(100)
+        order = []
+
+        async def request(site):
+            await budget.reserve(50, call_site=site)
+            order.append(site)
+
+        tasks = [asyncio.create_task(request(site)) for site in ("big", "big", "big", "small")]
+        await asyncio.sleep(0)
+        blocker.settle(0)
+        await asyncio.sleep(0)
+        # 额度只够两个请求：big 放行一个后轮到 small
+        assert order == ["big", "small"]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_refunds_nothing_taken():
+    async def run():
+        budget = ModelBudget("m", rpm=0, tpm=1000)
+        await budget.reserve(1000)
+        waiter = asyncio.create_task(budget.reserve(500))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert not any(budget._queues.values())
+        assert budget.token_bucket.tokens < 1
+    asyncio.run(run())
+
+
+def test_stream_cancelled_in_limiter_queue_settles_reservation(monkeypatch):
+    """在限制器排队期间被取消时，预留的额度全部退还"""
+    async def run():
+        endpoint = Endpoint("default", "sk-test", "http://upstream.invalid/v1", "m")
+        limiter = AdaptiveLimiter("t", initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire()  # 占满并发窗口
+        budget = ModelBudget("m", rpm=0, tpm=100000)
+        monkeypatch.setattr(Endpoint, "limiter", property(lambda self: limiter))
+        monkeypatch.setattr(openai_service, "get_endpoint_pool", lambda: EndpointPool([endpoint]))
+        monkeypatch.setattr(openai_service, "get_budget", lambda *args, **kwargs: budget)
+        monkeypatch.setattr(openai_service, "resolve_route", lambda call_site: None)
+
+        service = openai_service.OpenAIService()
+        call = LLMCall(call_site="test", model="m", prompt_tokens_estimate=1000)
+        stream = service._stream_upstream([{"role": "user", "content": "hi"}], 0.0, None, call)
+        task = asyncio.create_task(stream.__anext__())
+        await asyncio.sleep(0.01)
+        assert limiter.queue_depth == 1
+        assert budget.token_bucket.tokens < 100000 - 1000
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert budget.token_bucket.tokens > 100000 - 1
+        assert limiter.queue_depth == 0
+    asyncio.run(run())
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    # 中文每字至少 1 个 token，避免调度时对中文少预留额度
+    assert estimate_tokens("投标文件" * 100) >= 400
+    assert estimate_tokens("hello world " * 100) < estimate_tokens("投标文件" * 100)
+    messages = [{"role": "user", "content": "投标文件"}]
+    assert estimate_messages_tokens(messages) > estimate_tokens("投标文件")
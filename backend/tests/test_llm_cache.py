@@ -0,0 +1,87 @@
+"""补全缓存：内存 LRU、SQLite 磁盘层与过期"""
+import asyncio
+import time
+
+from app.services.llm_cache import CompletionCache
+
+
+def _cache(tmp_path, **kwargs):
+    kwargs.setdefault("max_memory_entries", 8)
+    kwargs.setdefault("ttl", 3600)
+    kwargs.setdefault("max_disk_entries", 100)
+    kwargs.setdefault("disk_enabled", True)
+    return CompletionCache(db_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_make_key_normalizes_request():
+    messages = [{"role": "user", "content": "你好", "name": "ignored"}]
+    key = CompletionCache.make_key("m", messages, 0.0, base_url="http://host/v1/")
+    assert key == CompletionCache.make_key("m", [{"role": "user", "content": "你好"}], 0, base_url="http://host/v1")
+    assert key != CompletionCache.make_key("m", messages, 0.7, base_url="http://host/v1")
+    assert key != CompletionCache.make_key("other", messages, 0.0, base_url="http://host/v1")
+
+
+def test_memory_hit_and_miss(tmp_path):
+    async def run():
+        cache = _cache(tmp_path, disk_enabled=False)
+        assert await cache.get("k") is None
+        await cache.set("k", ["a", "b"])
+        assert await cache.get("k") == ["a", "b"]
+    asyncio.run(run())
+
+
+def test_memory_lru_evicts_least_recently_used(tmp_path):
+    async def run():
+        cache = _cache(tmp_path, max_memory_entries=2, disk_enabled=False)
+        await cache.set("a", ["1"])
+        await cache.set("b", ["2"])
+        assert await cache.get("a") == ["1"]  # a 变为最近使用
+        await cache.set("c", ["3"])
+        assert await cache.get("b") is None
+        assert await cache.get("a") == ["1"]
+        assert await cache.get("c") == ["3"]
+    asyncio.run(run())
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    async def run():
+        writer = _cache(tmp_path)
+        await writer.set("k", ["x", "y"])
+        reader = _cache(tmp_path)
+        assert await reader.get("k") == ["x", "y"]
+        # 磁盘命中后回填内存层
+        assert "k" in reader._memory
+    asyncio.run(run())
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    async def run():
+        cache = _cache(tmp_path, ttl=60)
+        await cache.set("k", ["old"])
+        stale = time.time() - 120
+        cache._memory["k"] = (stale, ["old"])
+        cache._disk_set("k", stale, ["old"])
+        assert await cache.get("k") is None
+        assert "k" not in cache._memory
+    asyncio.run(run())
+
+
+def test_invalidate_removes_both_tiers(tmp_path):
+    async def run():
+        cache = _cache(tmp_path)
+        await cache.set("k", ["v"])
+        await cache.invalidate("k")
+        assert await cache.get("k") is None
+        assert _cache(tmp_path)._disk_get("k") is None
+    asyncio.run(run())
+
+
+def test_disk_purge_keeps_newest_entries(tmp_path):
+    cache = _cache(tmp_path, max_disk_entries=3)
+    cache.PURGE_EVERY = 5
+    now = time.time()
+    for i in range(5):
+        cache._disk_set(f"k{i}", now + i, [str(i)])
+    assert cache._disk_get("k0") is None
+    assert cache._disk_get("k1") is None
+    assert cache._disk_get("k4") == (now + 4, ["4"])
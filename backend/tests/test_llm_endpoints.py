@@ -0,0 +1,103 @@
+"""LLM 上游端点池：选择、摘除与恢复"""
+import httpx
+import openai
+
+from app.config import settings
+from app.services.llm_endpoints import Endpoint, EndpointPool, is_endpoint_failure
+from app.services.llm_limiter import OUTCOME_ERROR, OUTCOME_OVERLOAD
+
+
+def _pool(count=2):
+    return EndpointPool([Endpoint(f"ep{i}", f"sk-{i}", f"http://ep{i}/v1", "m") for i in range(count)])
+
+
+def _status_error(status: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    return openai.APIStatusError("error", response=httpx.Response(status, request=request), body=None)
+
+
+def test_select_prefers_fewer_outstanding_and_lower_latency():
+    pool = _pool(2)
+    a, b = pool.endpoints
+    a.outstanding = 3
+    assert pool.select() is b
+    a.outstanding = b.outstanding = 0
+    a.latency_ewma, b.latency_ewma = 2.0, 0.5
+    assert pool.select() is b
+
+
+def test_select_respects_weight():
+    pool = _pool(2)
+    a, b = pool.endpoints
+    a.latency_ewma = b.latency_ewma = 1.0
+    a.weight = 4.0
+    a.outstanding = 1
+    assert pool.select() is a
+
+
+def test_select_excludes_failed_and_honours_pin():
+    pool = _pool(3)
+    assert pool.select(exclude={"ep0", "ep1"}).name == "ep2"
+    assert pool.select(only="ep1").name == "ep1"
+    # 路由规则指定的端点不存在时退回全部端点
+    assert pool.select(only="missing").name in {"ep0", "ep1", "ep2"}
+    # 全部排除时仍返回一个端点
+    assert pool.select(exclude={"ep0", "ep1", "ep2"}) is not None
+
+
+def test_consecutive_failures_eject_endpoint():
+    pool = _pool(2)
+    a, b = pool.endpoints
+    for _ in range(settings.llm_endpoint_eject_failures - 1):
+        pool.record_failure(a)
+    assert not a.ejected
+    pool.record_failure(a)
+    assert a.ejected
+    for _ in range(10):
+        assert pool.select() is b
+    assert not pool.has_alternative({"ep1"})
+
+
+def test_ejection_cooldown_grows_and_success_resets():
+    pool = _pool(2)
+    a = pool.endpoints[0]
+    for _ in range(settings.llm_endpoint_eject_failures):
+        pool.record_failure(a)
+    first = a.ejected_until
+    a.ejected_until = 0.0
+    pool.record_failure(a)
+    assert a.ejections == 2
+    assert a.ejected_until - first > settings.llm_endpoint_eject_cooldown / 2
+
+    pool.record_success(a, ttft=0.5)
+    assert a.consecutive_failures == 0 and a.ejections == 0
+    assert a.latency_ewma == 0.5
+
+
+def test_retry_after_ejects_immediately():
+    pool = _pool(2)
+    a = pool.endpoints[0]
+    pool.record_failure(a, retry_after=5)
+    assert a.ejected
+
+
+def test_all_ejected_picks_earliest_recovery():
+    pool = _pool(2)
+    a, b = pool.endpoints
+    pool.record_failure(a, retry_after=50)
+    pool.record_failure(b, retry_after=5)
+    assert pool.select() is b
+
+
+def test_single_endpoint_never_ejected():
+    pool = _pool(1)
+    for _ in range(10):
+        pool.record_failure(pool.primary, retry_after=5)
+    assert not pool.primary.ejected
+
+
+def test_is_endpoint_failure():
+    assert is_endpoint_failure(ValueError(), OUTCOME_OVERLOAD)
+    assert is_endpoint_failure(_status_error(401), OUTCOME_ERROR)
+    assert not is_endpoint_failure(_status_error(400), OUTCOME_ERROR)
+    assert is_endpoint_failure(httpx.ReadError("reset"), OUTCOME_ERROR)
@@ -0,0 +1,106 @@
+"""对冲请求"""
+import asyncio
+
+from app.config import settings
+from app.services import llm_hedge
+from app.services.llm_hedge import HedgePolicy, _percentile, run_hedged
+
+
+def _warm_policy(monkeypatch, call_site, ttft=0.05, duration=0.1, requests=100):
+    monkeypatch.setattr(llm_hedge, "_policies", {})
+    policy = llm_hedge.get_hedge_policy(call_site)
+    for _ in range(settings.llm_hedge_min_samples):
+        policy.observe(ttft, duration)
+    policy.requests = requests
+    return policy
+
+
+def test_percentile():
+    assert _percentile([], 0.9) is None
+    assert _percentile(list(range(1, 11)), 0.9) == 9
+    assert _percentile([3.0], 0.5) == 3.0
+
+
+def test_no_delays_before_min_samples():
+    policy = HedgePolicy("t")
+    for _ in range(settings.llm_hedge_min_samples - 1):
+        policy.observe(0.1, 1.0)
+    assert policy.delays() == (None, None)
+    policy.observe(0.1, 1.0)
+    assert policy.delays() == (0.1, 1.0)
+
+
+def test_budget_limits_hedges():
+    policy = HedgePolicy("t")
+    policy.requests = 10
+    assert policy.try_acquire()
+    assert not policy.try_acquire()
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    async def run():
+        policy = _warm_policy(monkeypatch, "fast", ttft=1.0, duration=1.0)
+        calls = []
+
+        async def attempt(probe):
+            calls.append(probe.hedge)
+            probe.mark_first_token()
+            return True, "primary"
+
+        assert await run_hedged("fast", attempt) == (True, "primary")
+        assert calls == [False]
+        assert policy.hedges == 0
+    asyncio.run(run())
+
+
+def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    async def run():
+        _warm_policy(monkeypatch, "slow")
+        cancelled = []
+
+        async def attempt(probe):
+            if not probe.hedge:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append("primary")
+                    raise
+            probe.mark_first_token()
+            return True, "hedge" if probe.hedge else "primary"
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await run_hedged("slow", attempt) == (True, "hedge")
+        assert loop.time() - started < 1
+        assert cancelled == ["primary"]
+    asyncio.run(run())
+
+
+def test_invalid_hedge_falls_back_to_primary(monkeypatch):
+    async def run():
+        _warm_policy(monkeypatch, "invalid")
+
+        async def attempt(probe):
+            if probe.hedge:
+                return False, "bad"
+            await asyncio.sleep(0.2)
+            return True, "primary"
+
+        assert await run_hedged("invalid", attempt) == (True, "primary")
+    asyncio.run(run())
+
+
+def test_exhausted_budget_waits_for_primary(monkeypatch):
+    async def run():
+        policy = _warm_policy(monkeypatch, "budget", requests=0)
+        calls = []
+
+        async def attempt(probe):
+            calls.append(probe.hedge)
+            await asyncio.sleep(0.2)
+            return True, "primary"
+
+        assert await run_hedged("budget", attempt) == (True, "primary")
+        assert calls == [False]
+        assert policy.hedges == 0
+    asyncio.run(run())
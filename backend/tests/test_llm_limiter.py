@@ -0,0 +1,138 @@
+"""AIMD 自适应并发限制器"""
+import asyncio
+
+import httpx
+import openai
+
+from app.config import settings
+from app.services import llm_limiter
+from app.services.llm_limiter import (
+    AdaptiveLimiter, classify_error, get_limiter, parse_retry_after,
+    OUTCOME_SUCCESS, OUTCOME_OVERLOAD, OUTCOME_ERROR, OUTCOME_CANCELLED,
+)
+
+
+def _status_error(status: int, headers=None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def test_success_increases_window_additively():
+    limiter = AdaptiveLimiter("t", initial=4, min_limit=1, max_limit=32)
+    for _ in range(4):
+        limiter.in_flight += 1
+        limiter.release(OUTCOME_SUCCESS, ttft=0.1)
+    # 每次 +1/窗口，一整轮约 +1
+    assert 4.9 < limiter.limit < 5.0
+    assert limiter.window == 4
+
+
+def test_window_capped_at_max():
+    limiter = AdaptiveLimiter("t", initial=31.99, min_limit=1, max_limit=32)
+    limiter.release(OUTCOME_SUCCESS)
+    limiter.release(OUTCOME_SUCCESS)
+    assert limiter.limit == 32
+
+
+def test_slow_ttft_does_not_increase_window():
+    limiter = AdaptiveLimiter("t", initial=4, min_limit=1, max_limit=32)
+    limiter.release(OUTCOME_SUCCESS, ttft=settings.llm_limiter_slow_ttft + 1)
+    assert limiter.limit == 4
+
+
+def test_overload_halves_once_per_cooldown():
+    limiter = AdaptiveLimiter("t", initial=16, min_limit=1, max_limit=32)
+    limiter.release(OUTCOME_OVERLOAD)
+    assert limiter.limit == 8
+    # 同一波过载不再减半
+    limiter.release(OUTCOME_OVERLOAD)
+    assert limiter.limit == 8
+    limiter._last_decrease -= settings.llm_limiter_decrease_cooldown
+    limiter.release(OUTCOME_OVERLOAD)
+    assert limiter.limit == 4
+
+
+def test_overload_respects_min_limit():
+    limiter = AdaptiveLimiter("t", initial=1, min_limit=1, max_limit=32)
+    limiter.release(OUTCOME_OVERLOAD)
+    assert limiter.limit == 1
+
+
+def test_error_and_cancel_keep_window():
+    limiter = AdaptiveLimiter("t", initial=4, min_limit=1, max_limit=32)
+    limiter.release(OUTCOME_ERROR)
+    limiter.release(OUTCOME_CANCELLED)
+    assert limiter.limit == 4
+
+
+def test_waiters_admitted_in_fifo_order():
+    async def run():
+        limiter = AdaptiveLimiter("t", initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire()
+        order = []
+
+        async def worker(i):
+            await limiter.acquire()
+            order.append(i)
+            limiter.release(OUTCOME_SUCCESS)
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 3
+        limiter.release(OUTCOME_SUCCESS)
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2]
+        assert limiter.in_flight == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        limiter = AdaptiveLimiter("t", initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queue_depth == 0
+        limiter.release(OUTCOME_SUCCESS)
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire(), 1)
+    asyncio.run(run())
+
+
+def test_retry_after_blocks_admission():
+    async def run():
+        limiter = AdaptiveLimiter("t", initial=4, min_limit=1, max_limit=32)
+        await limiter.acquire()
+        limiter.release(OUTCOME_OVERLOAD, retry_after=0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.wait_for(limiter.acquire(), 2)
+        assert loop.time() - started >= 0.15
+    asyncio.run(run())
+
+
+def test_classify_error():
+    assert classify_error(_status_error(429, {"retry-after": "3"})) == (OUTCOME_OVERLOAD, 3.0)
+    assert classify_error(_status_error(503)) == (OUTCOME_OVERLOAD, None)
+    assert classify_error(_status_error(400)) == (OUTCOME_ERROR, None)
+    assert classify_error(ValueError("x")) == (OUTCOME_ERROR, None)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert parse_retry_after(None) is None
+
+
+def test_limiter_keyed_by_full_api_key(monkeypatch):
+    monkeypatch.setattr(llm_limiter, "_limiters", {})
+    a = get_limiter("http://host/v1/", "sk-aaaa-1234")
+    b = get_limiter("http://host/v1", "sk-bbbb-1234")
+    assert a is not b
+    assert a is get_limiter("http://host/v1", "sk-aaaa-1234")
+    snapshots = llm_limiter.limiter_snapshots()
+    assert set(snapshots) == {"http://host/v1#1234", "http://host/v1#1234(2)"}
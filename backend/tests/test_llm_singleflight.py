@@ -0,0 +1,108 @@
+"""相同 LLM 请求的合并（single-flight）"""
+import asyncio
+from contextlib import aclosing
+
+from app.services.llm_singleflight import SingleFlight
+
+
+def _upstream(chunks, started, closed, delay=0.01, error=None):
+    async def gen():
+        started.append(1)
+        try:
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+            if error is not None:
+                raise error
+        finally:
+            closed.append(1)
+    return gen
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_concurrent_subscribers_share_one_upstream():
+    async def run():
+        flights = SingleFlight()
+        started, closed, joined = [], [], []
+        factory = _upstream(["a", "b", "c"], started, closed)
+        first = asyncio.create_task(_collect(flights.stream("k", factory)))
+        await asyncio.sleep(0.015)  # 第一个 chunk 已产出
+        second = asyncio.create_task(_collect(flights.stream("k", factory, on_join=lambda: joined.append(1))))
+        assert await first == ["a", "b", "c"]
+        # 后加入的订阅者先回放已产出的 chunk
+        assert await second == ["a", "b", "c"]
+        assert started == [1] and joined == [1]
+        assert flights.in_flight() == 0
+    asyncio.run(run())
+
+
+def test_different_keys_do_not_coalesce():
+    async def run():
+        flights = SingleFlight()
+        started, closed = [], []
+        factory = _upstream(["a"], started, closed)
+        await asyncio.gather(_collect(flights.stream("k1", factory)), _collect(flights.stream("k2", factory)))
+        assert len(started) == 2
+    asyncio.run(run())
+
+
+def test_new_request_after_completion_starts_new_upstream():
+    async def run():
+        flights = SingleFlight()
+        started, closed = [], []
+        factory = _upstream(["a"], started, closed)
+        await _collect(flights.stream("k", factory))
+        await _collect(flights.stream("k", factory))
+        assert len(started) == 2
+    asyncio.run(run())
+
+
+def test_upstream_error_fans_out_to_all_subscribers():
+    async def run():
+        flights = SingleFlight()
+        started, closed = [], []
+        factory = _upstream(["a"], started, closed, error=RuntimeError("boom"))
+        results = await asyncio.gather(
+            _collect(flights.stream("k", factory)), _collect(flights.stream("k", factory)), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(started) == 1
+    asyncio.run(run())
+
+
+def test_upstream_cancelled_when_last_subscriber_leaves():
+    async def run():
+        flights = SingleFlight()
+        started, closed = [], []
+        factory = _upstream(["a"] * 100, started, closed)
+        first = asyncio.create_task(_collect(flights.stream("k", factory)))
+        second = asyncio.create_task(_collect(flights.stream("k", factory)))
+        await asyncio.sleep(0.03)
+        first.cancel()
+        await asyncio.sleep(0.02)
+        # 仍有订阅者时上游继续
+        assert closed == []
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert closed == [1]
+        assert flights.in_flight() == 0
+    asyncio.run(run())
+
+
+def test_subscriber_closing_early_keeps_others_streaming():
+    async def run():
+        flights = SingleFlight()
+        started, closed = [], []
+        factory = _upstream(["a", "b", "c"], started, closed)
+
+        async def first_only():
+            async with aclosing(flights.stream("k", factory)) as stream:
+                async for chunk in stream:
+                    return chunk
+
+        assert await asyncio.gather(first_only(), _collect(flights.stream("k", factory))) == ["a", ["a", "b", "c"]]
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+"""PDF 逐页提取与进程池分片"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.pdf_extractor import PdfExtractor, count_pages, extract_page_range, iter_page_range
+
+fitz = pytest.importorskip("pymupdf")
+pytest.importorskip("pdfplumber")
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "sample.pdf"
+    doc = fitz.open()
+    for i in range(7):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} of sample")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_shards_cover_all_pages():
+    assert PdfExtractor.shards(0, 20) == []
+    assert PdfExtractor.shards(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert PdfExtractor.shards(6, 3) == [(0, 3), (3, 6)]
+    assert PdfExtractor.shards(5, 0) == [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+
+
+def test_page_range_extraction(pdf_path):
+    assert count_pages(pdf_path) == 7
+    pages = extract_page_range(pdf_path, 2, 5)
+    assert [page[0] for page in pages] == [3, 4, 5]
+    assert "Page 3 of sample" in pages[0][1]
+    assert all(images == [] for _, _, _, images in pages)
+    # 区间超出页数时截断
+    assert [page[0] for page in iter_page_range(pdf_path, 5, 100)] == [6, 7]
+
+
+def _extract(monkeypatch, pdf_path, shard_pages, workers):
+    monkeypatch.setattr(settings, "pdf_extract_shard_pages", shard_pages)
+    monkeypatch.setattr(settings, "pdf_extract_workers", workers)
+    extractor = PdfExtractor()
+    try:
+        return asyncio.run(extractor.extract_pages(pdf_path))
+    finally:
+        extractor.shutdown()
+
+
+def test_thread_and_process_modes_match(monkeypatch, pdf_path):
+    thread_pages = _extract(monkeypatch, pdf_path, shard_pages=100, workers=2)
+    process_pages = _extract(monkeypatch, pdf_path, shard_pages=2, workers=2)
+    assert [page[0] for page in process_pages] == list(range(1, 8))
+    assert process_pages == thread_pages
+
+
+def test_single_worker_does_not_use_process_pool(monkeypatch, pdf_path):
+    monkeypatch.setattr(PdfExtractor, "_get_pool", lambda self: pytest.fail("不应创建进程池"))
+    pages = _extract(monkeypatch, pdf_path, shard_pages=2, workers=1)
+    assert [page[0] for page in pages] == list(range(1, 8))
+
+
+def test_consumer_stopping_early_releases_iterator(monkeypatch, pdf_path):
+    monkeypatch.setattr(settings, "pdf_extract_shard_pages", 2)
+    monkeypatch.setattr(settings, "pdf_extract_workers", 2)
+    extractor = PdfExtractor()
+
+    async def first_page():
+        pages = extractor.iter_pages(pdf_path)
+        try:
+            return await pages.__anext__()
+        finally:
+            await pages.aclose()
+
+    try:
+        assert asyncio.run(first_page())[0] == 1
+    finally:
+        extractor.shutdown()